@@ -0,0 +1,92 @@
+"""Measure the import/init time of the Lambda runtimes in fresh interpreters.
+
+Each run imports lambda_function in a new Python process, then creates the
+AWS clients the handler needs (when they are created lazily). Passing --ref
+measures the runtimes of another commit as well, for a before/after report.
+
+Usage:
+    python -m benchmarks.cold_start [--ref a49f73d] [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from .runtime import DEFAULT_ENVIRONMENT, ROOT
+
+# AWS clients used by each runtime's handler
+RUNTIME_SERVICES = {
+    'api': ['sqs'],
+    'mailing': ['ses', 'dynamodb'],
+}
+
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import lambda_function
+init = time.perf_counter() - start
+first_use = 0.0
+try:
+    from notification_common.clients import get_client
+except ImportError:
+    pass  # Clients created at import time
+else:
+    start = time.perf_counter()
+    for service_name in {services!r}:
+        get_client(service_name)
+    first_use = time.perf_counter() - start
+print(json.dumps({{'init': init, 'first_use': first_use}}))
+"""
+
+
+def measure(tree, runtime, runs):
+    """Median init and first-use times (seconds) of a runtime in the given source tree"""
+    paths = [
+        os.path.join(tree, 'notification_service', runtime, 'runtime'),
+        os.path.join(tree, 'notification_service', 'shared', 'runtime', 'python'),
+    ]
+    script = CHILD_SCRIPT.format(paths=paths, services=RUNTIME_SERVICES[runtime])
+    environment = dict(DEFAULT_ENVIRONMENT, **os.environ)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', script], env=environment, cwd=tree)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {
+        'init': statistics.median(sample['init'] for sample in samples),
+        'first_use': statistics.median(sample['first_use'] for sample in samples),
+    }
+
+
+def export_tree(ref, directory):
+    """Extract the runtimes of a git ref into a directory"""
+    archive = subprocess.check_output(['git', 'archive', ref, '--', 'notification_service'], cwd=ROOT)
+    subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ref', help="Git ref to compare the working tree with")
+    parser.add_argument('--runs', type=int, default=10, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        trees = [('working tree', ROOT)]
+        if args.ref:
+            trees.insert(0, (args.ref, export_tree(args.ref, directory)))
+        
+        print(f"{'runtime':<10} {'source':<14} {'init ms':>9} {'clients ms':>11} {'total ms':>9}")
+        for runtime in RUNTIME_SERVICES:
+            for label, tree in trees:
+                result = measure(tree, runtime, args.runs)
+                print(f"{runtime:<10} {label:<14} {result['init'] * 1000:>9.1f} "
+                      f"{result['first_use'] * 1000:>11.1f} "
+                      f"{(result['init'] + result['first_use']) * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,470 @@
+"""In-memory stand-ins for the AWS clients used by the Lambda runtimes.
+
+Each fake models a network round-trip with a configurable latency (plus
+optional random jitter), fails a configurable fraction of calls, and counts
+calls per operation so benchmarks can run without an AWS account.
+"""
+import io
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+
+class FakeService:
+    """Latency, error injection and call counting shared by the stand-ins"""
+    
+    # Error code raised for injected failures
+    error_code = 'InternalFailure'
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def _call(self, operation, inject_errors=True):
+        """Count a call, wait for the simulated round-trip and maybe fail it"""
+        with self._lock:
+            self.calls[operation] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = inject_errors and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise ClientError(
+                {'Error': {'Code': self.error_code, 'Message': 'Injected failure'}},
+                operation
+            )
+
+    def _entry_failed(self):
+        """Whether one entry of a batch operation fails (called with the lock held)"""
+        return self._random.random() < self.error_rate
+
+
+class FakeSES(FakeService):
+    """Stand-in for the low-level SES client"""
+    
+    error_code = 'Throttling'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = []
+        self.templates = {}
+
+    def send_email(self, **kwargs):
+        self._call('SendEmail')
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self.sent.append(dict(kwargs, MessageId=message_id))
+        return {'MessageId': message_id}
+
+    def send_raw_email(self, **kwargs):
+        self._call('SendRawEmail')
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self.sent.append(dict(kwargs, MessageId=message_id))
+        return {'MessageId': message_id}
+
+    def create_template(self, Template):
+        self._call('CreateTemplate', inject_errors=False)
+        with self._lock:
+            if Template['TemplateName'] in self.templates:
+                raise ClientError(
+                    {'Error': {'Code': 'AlreadyExists', 'Message': 'Template already exists'}},
+                    'CreateTemplate'
+                )
+            self.templates[Template['TemplateName']] = dict(Template)
+        return {}
+
+    def send_bulk_templated_email(self, Source, Template, Destinations, **kwargs):
+        assert len(Destinations) <= 50, "SendBulkTemplatedEmail accepts at most 50 destinations"
+        self._call('SendBulkTemplatedEmail')
+        statuses = []
+        with self._lock:
+            assert Template in self.templates, f"Unknown template {Template}"
+            for destination in Destinations:
+                if self._entry_failed():
+                    statuses.append({'Status': 'Failed', 'Error': 'Injected failure'})
+                    continue
+                message_id = str(uuid.uuid4())
+                self.sent.append(dict(kwargs, Source=Source, Template=Template,
+                                      Destination=destination, MessageId=message_id))
+                statuses.append({'Status': 'Success', 'MessageId': message_id})
+        return {'Status': statuses}
+
+
+class FakeSQS(FakeService):
+    """Stand-in for the low-level SQS client.
+    
+    Every message sent is listed in messages; each queue also keeps its
+    messages with a visibility deadline, so they can be received, hidden
+    for a visibility timeout, made visible again and deleted.
+    """
+    
+    error_code = 'ServiceUnavailable'
+    
+    # Interval at which an empty long-polling receive checks for new messages
+    poll_interval = 0.01
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = []
+        self.queues = {}
+
+    def _enqueue(self, queue_url, entry):
+        """Add a message to a queue (called with the lock held)"""
+        message_id = str(uuid.uuid4())
+        self.messages.append(dict(entry, MessageId=message_id))
+        self.queues.setdefault(queue_url, []).append({
+            'MessageId': message_id,
+            'Body': entry['MessageBody'],
+            'MessageAttributes': entry.get('MessageAttributes') or {},
+            'Attributes': {
+                'SentTimestamp': str(int(time.time() * 1000)),
+                'ApproximateReceiveCount': '0'
+            },
+            'VisibleAt': time.time() + entry.get('DelaySeconds', 0),
+            'ReceiptHandle': None
+        })
+        return message_id
+
+    def add_message(self, QueueUrl, MessageBody, Attributes=None, MessageAttributes=None):
+        """Put a message in a queue with given system attributes, e.g. a dead-lettered one"""
+        with self._lock:
+            message_id = self._enqueue(QueueUrl, {'MessageBody': MessageBody, 'MessageAttributes': MessageAttributes})
+            self.queues[QueueUrl][-1]['Attributes'].update(Attributes or {})
+        return message_id
+
+    def get_queue_url(self, QueueName, **kwargs):
+        self._call('GetQueueUrl', inject_errors=False)
+        return {'QueueUrl': f"https://sqs.eu-west-1.amazonaws.com/123456789012/{QueueName}"}
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call('SendMessage')
+        with self._lock:
+            message_id = self._enqueue(QueueUrl, dict(kwargs, MessageBody=MessageBody))
+        return {'MessageId': message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10, "SendMessageBatch accepts at most 10 entries"
+        self._call('SendMessageBatch', inject_errors=False)
+        successful = []
+        failed = []
+        with self._lock:
+            for entry in Entries:
+                if self._entry_failed():
+                    failed.append({'Id': entry['Id'], 'SenderFault': False,
+                                   'Code': self.error_code, 'Message': 'Injected failure'})
+                else:
+                    successful.append({'Id': entry['Id'], 'MessageId': self._enqueue(QueueUrl, entry)})
+        return {'Successful': successful, 'Failed': failed}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=30, **kwargs):
+        assert MaxNumberOfMessages <= 10, "ReceiveMessage returns at most 10 messages"
+        self._call('ReceiveMessage')
+        deadline = time.time() + WaitTimeSeconds
+        while True:
+            with self._lock:
+                now = time.time()
+                received = []
+                for message in self.queues.get(QueueUrl, []):
+                    if len(received) == MaxNumberOfMessages:
+                        break
+                    if message['VisibleAt'] > now:
+                        continue
+                    attributes = message['Attributes']
+                    attributes['ApproximateReceiveCount'] = str(int(attributes['ApproximateReceiveCount']) + 1)
+                    message['VisibleAt'] = now + VisibilityTimeout
+                    message['ReceiptHandle'] = str(uuid.uuid4())
+                    received.append({
+                        'MessageId': message['MessageId'],
+                        'ReceiptHandle': message['ReceiptHandle'],
+                        'Body': message['Body'],
+                        'Attributes': dict(attributes),
+                        'MessageAttributes': dict(message['MessageAttributes'])
+                    })
+            if received or now >= deadline:
+                return {'Messages': received} if received else {}
+            time.sleep(self.poll_interval)
+
+    def _find(self, queue_url, receipt_handle):
+        """Message of a queue currently held with a receipt handle (called with the lock held)"""
+        for message in self.queues.get(queue_url, []):
+            if message['ReceiptHandle'] == receipt_handle:
+                return message
+        return None
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10, "DeleteMessageBatch accepts at most 10 entries"
+        self._call('DeleteMessageBatch', inject_errors=False)
+        successful = []
+        failed = []
+        with self._lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry['ReceiptHandle'])
+                if message is None or self._entry_failed():
+                    failed.append({'Id': entry['Id'], 'SenderFault': message is None,
+                                   'Code': 'ReceiptHandleIsInvalid' if message is None else self.error_code})
+                    continue
+                self.queues[QueueUrl].remove(message)
+                successful.append({'Id': entry['Id']})
+        return {'Successful': successful, 'Failed': failed}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10, "ChangeMessageVisibilityBatch accepts at most 10 entries"
+        self._call('ChangeMessageVisibilityBatch', inject_errors=False)
+        successful = []
+        failed = []
+        with self._lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry['ReceiptHandle'])
+                if message is None:
+                    failed.append({'Id': entry['Id'], 'SenderFault': True, 'Code': 'ReceiptHandleIsInvalid'})
+                    continue
+                message['VisibleAt'] = time.time() + entry['VisibilityTimeout']
+                successful.append({'Id': entry['Id']})
+        return {'Successful': successful, 'Failed': failed}
+
+    def queue_length(self, queue_url):
+        """Number of messages in a queue, visible or not"""
+        with self._lock:
+            return len(self.queues.get(queue_url, []))
+
+
+class FakeDynamoDB(FakeService):
+    """Stand-in for the low-level DynamoDB client (typed attribute values)"""
+    
+    error_code = 'ProvisionedThroughputExceededException'
+    
+    _assignment = re.compile(r'\s*([#\w]+)\s*=\s*(:\w+)\s*')
+    _condition = re.compile(r'attribute_not_exists\(([#\w]+)\)|([#\w]+)\s*(=|<>|<)\s*(:\w+)')
+    
+    # Key schema of the table and of its global secondary indexes (partition, sort)
+    key_schema = ('id', 'timestamp')
+    index_schemas = {
+        'RecipientIndex': ('to', 'updatedAt'),
+        'StatusIndex': ('status', 'updatedAt'),
+        'ScheduleIndex': ('scheduleBucket', 'sendAt'),
+    }
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tables = {}
+
+    def _item_key(self, key):
+        return tuple(sorted((name, value['S']) for name, value in key.items()))
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._call('GetItem')
+        with self._lock:
+            item = self.tables.get(TableName, {}).get(self._item_key(Key))
+            return {'Item': dict(item)} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None,
+                 ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self._call('PutItem')
+        key = {name: Item[name] for name in self.key_schema}
+        with self._lock:
+            table = self.tables.setdefault(TableName, {})
+            existing = table.get(self._item_key(key))
+            if ConditionExpression and not self._evaluate(
+                    ConditionExpression, existing or {},
+                    ExpressionAttributeNames or {}, ExpressionAttributeValues or {}):
+                raise self._condition_failed('PutItem', existing, kwargs)
+            table[self._item_key(key)] = dict(Item)
+        return {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._call('DeleteItem')
+        with self._lock:
+            self.tables.get(TableName, {}).pop(self._item_key(Key), None)
+        return {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._call('BatchGetItem', inject_errors=False)
+        responses = {}
+        unprocessed = {}
+        with self._lock:
+            for table_name, request in RequestItems.items():
+                assert len(request['Keys']) <= 100, "BatchGetItem accepts at most 100 keys"
+                table = self.tables.get(table_name, {})
+                for key in request['Keys']:
+                    if self._entry_failed():
+                        unprocessed.setdefault(table_name, dict(request, Keys=[]))['Keys'].append(key)
+                        continue
+                    item = table.get(self._item_key(key))
+                    if item:
+                        responses.setdefault(table_name, []).append(dict(item))
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues,
+              ExpressionAttributeNames=None, IndexName=None, FilterExpression=None,
+              ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, **kwargs):
+        """Query on a partition key equality (sort key conditions are not supported)"""
+        self._call('Query')
+        names = ExpressionAttributeNames or {}
+        attribute, placeholder = self._assignment.fullmatch(KeyConditionExpression).groups()
+        attribute = names.get(attribute, attribute)
+        partition, sort = self.index_schemas[IndexName] if IndexName else self.key_schema
+        assert attribute == partition, f"{attribute} is not the partition key of {IndexName or TableName}"
+        
+        with self._lock:
+            items = [
+                dict(item) for item in self.tables.get(TableName, {}).values()
+                if item.get(partition) == ExpressionAttributeValues[placeholder] and sort in item
+            ]
+        # Ties on the index sort key are broken by the table key, as in DynamoDB
+        items.sort(
+            key=lambda item: (item[sort]['S'], item['id']['S'], item['timestamp']['S']),
+            reverse=not ScanIndexForward
+        )
+        key_names = {partition, sort, *self.key_schema}
+        if ExclusiveStartKey:
+            start = [index for index, item in enumerate(items)
+                     if all(item.get(name) == ExclusiveStartKey.get(name) for name in key_names)]
+            items = items[start[0] + 1:] if start else []
+        
+        page = items[:Limit] if Limit else items
+        last_evaluated_key = None
+        if Limit and len(items) > Limit:
+            last_evaluated_key = {name: page[-1][name] for name in key_names}
+        if FilterExpression:
+            page = [item for item in page
+                    if self._evaluate(FilterExpression, item, names, ExpressionAttributeValues)]
+        response = {'Items': page, 'Count': len(page)}
+        if last_evaluated_key:
+            response['LastEvaluatedKey'] = last_evaluated_key
+        return response
+
+    def update_item(self, TableName, Key, UpdateExpression,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self._call('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        assignments, _, removals = UpdateExpression.strip()[len('SET'):].partition(' REMOVE ')
+        condition = kwargs.get('ConditionExpression')
+        with self._lock:
+            table = self.tables.setdefault(TableName, {})
+            existing = table.get(self._item_key(Key))
+            if condition and not self._evaluate(condition, existing or {}, names, values):
+                raise self._condition_failed('UpdateItem', existing, kwargs)
+            item = table.setdefault(self._item_key(Key), dict(Key))
+            for assignment in assignments.split(','):
+                attribute, placeholder = self._assignment.fullmatch(assignment).groups()
+                item[names.get(attribute, attribute)] = values[placeholder]
+            for attribute in filter(None, (name.strip() for name in removals.split(','))):
+                item.pop(names.get(attribute, attribute), None)
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._call('BatchWriteItem', inject_errors=False)
+        unprocessed = {}
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                table = self.tables.setdefault(table_name, {})
+                for request in requests:
+                    if self._entry_failed():
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    if 'DeleteRequest' in request:
+                        table.pop(self._item_key(request['DeleteRequest']['Key']), None)
+                        continue
+                    item = request['PutRequest']['Item']
+                    key = {name: item[name] for name in ('id', 'timestamp')}
+                    table[self._item_key(key)] = dict(item)
+        return {'UnprocessedItems': unprocessed}
+
+    @staticmethod
+    def _condition_failed(operation, existing, kwargs):
+        """ConditionalCheckFailedException, with the item if ReturnValuesOnConditionCheckFailure asks for it"""
+        response = {'Error': {'Code': 'ConditionalCheckFailedException',
+                              'Message': 'The conditional request failed'}}
+        if existing and kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+            response['Item'] = dict(existing)
+        return ClientError(response, operation)
+
+    def _evaluate(self, condition, item, names, values):
+        """Evaluate OR-ed terms, each a comparison, attribute_not_exists() or a (... AND ...) group"""
+        groups = (group.strip() for group in condition.split(' OR '))
+        return any(
+            all(
+                self._holds(term, item, names, values)
+                for term in (group[1:-1] if group.startswith('(') else group).split(' AND ')
+            )
+            for group in groups
+        )
+
+    def _holds(self, term, item, names, values):
+        """Evaluate a single comparison or attribute_not_exists()"""
+        missing, attribute, operator, placeholder = self._condition.fullmatch(term.strip()).groups()
+        if missing:
+            return names.get(missing, missing) not in item
+        current = item.get(names.get(attribute, attribute))
+        if operator == '<':
+            return current is not None and self._scalar(current) < self._scalar(values[placeholder])
+        return (current == values[placeholder]) == (operator == '=')
+
+    @staticmethod
+    def _scalar(value):
+        (kind, data), = value.items()
+        return float(data) if kind == 'N' else data
+
+    def get(self, table_name, key):
+        """Return a stored item by its typed key (benchmark helper)"""
+        return self.tables.get(table_name, {}).get(self._item_key(key))
+
+
+class FakeS3(FakeService):
+    """Stand-in for the low-level S3 client (objects kept in memory)"""
+    
+    error_code = 'SlowDown'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call('PutObject')
+        body = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        etag = f'"{uuid.uuid4().hex}"'
+        with self._lock:
+            self.objects[(Bucket, Key)] = dict(kwargs, Body=body, ETag=etag)
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self._call('GetObject')
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not found'}}, 'GetObject')
+        if IfNoneMatch is not None and IfNoneMatch == stored['ETag']:
+            # botocore raises the bodiless 304 response as an error
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        # A file-like body, read in blocks like the botocore StreamingBody
+        return {'Body': io.BytesIO(stored['Body']), 'ContentLength': len(stored['Body']), 'ETag': stored['ETag']}
+
+
+class FakeSecretsManager(FakeService):
+    """Stand-in for the low-level Secrets Manager client (secrets kept in memory)"""
+    
+    error_code = 'ThrottlingException'
+
+    def __init__(self, secrets=None, **kwargs):
+        super().__init__(**kwargs)
+        self.secrets = dict(secrets or {})
+
+    def get_secret_value(self, SecretId, **kwargs):
+        self._call('GetSecretValue')
+        if SecretId not in self.secrets:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': 'Not found'}}, 'GetSecretValue')
+        return {'ARN': SecretId, 'SecretString': self.secrets[SecretId]}
@@ -0,0 +1,209 @@
+"""Offline benchmark suite for the API and mailing runtimes.
+
+Drives both Lambda handlers with synthetic events against the in-memory AWS
+stand-ins and reports throughput, p50/p95/p99 latency and AWS calls per
+message for every scenario. Results are written as JSON so runs on different
+commits can be compared with --baseline.
+
+Usage:
+    python -m benchmarks.harness --output results.json [--baseline previous.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+from .fakes import FakeDynamoDB, FakeSES, FakeSQS
+from .runtime import load_runtime, make_notification, make_sqs_event, use_clients, ROOT
+
+# Message lengths (in characters) exercised by the scenarios
+MESSAGE_LENGTHS = {'short': 200, 'long': 20000}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def make_message(length, seed):
+    """Synthetic message of roughly the given length with a link, unique per seed"""
+    sentence = f"Reminder {seed}: the project deadline is approaching, please submit your work. "
+    lines = []
+    while sum(len(line) + 1 for line in lines) < length:
+        lines.append(sentence)
+    lines.insert(len(lines) // 2, "Open https://edulor.fr/projects to continue.")
+    return "\n".join(lines)[:max(length, 60)]
+
+
+def summarize(name, latencies, messages, elapsed, fakes, errors):
+    """Aggregate the measurements of one scenario"""
+    calls = sum(fake.total_calls for fake in fakes)
+    return {
+        'scenario': name,
+        'invocations': len(latencies),
+        'messages': messages,
+        'errors': errors,
+        'throughput_msg_per_s': messages / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+        },
+        'calls_per_message': calls / messages if messages else 0.0,
+        'calls': {
+            operation: count
+            for fake in fakes
+            for operation, count in sorted(fake.calls.items())
+        },
+    }
+
+
+def run_api(api, name, batch_size, message_length, iterations, fake_options):
+    """Measure the API handler, single requests (batch_size=None) or the batch endpoint"""
+    sqs = FakeSQS(**fake_options)
+    use_clients(sqs=sqs)
+    latencies = []
+    errors = 0
+    messages = 0
+    start = time.perf_counter()
+    for iteration in range(iterations):
+        notifications = [
+            {'to': 'student@example.com', 'subject': 'Benchmark',
+             'message': make_message(message_length, f"{iteration}-{i}")}
+            for i in range(batch_size or 1)
+        ]
+        if batch_size is None:
+            event = {'resource': '/notify/email', 'body': json.dumps(notifications[0])}
+        else:
+            event = {'resource': api.BATCH_RESOURCE, 'body': json.dumps({'notifications': notifications})}
+        
+        call_start = time.perf_counter()
+        response = api.handler(event, None)
+        latencies.append(time.perf_counter() - call_start)
+        
+        messages += len(notifications)
+        if response['statusCode'] != 200:
+            errors += len(notifications)
+        elif batch_size is not None:
+            errors += json.loads(response['body'])['failed']
+    elapsed = time.perf_counter() - start
+    return summarize(name, latencies, messages, elapsed, [sqs], errors)
+
+
+def run_mailing(mailing, name, batch_size, message_length, iterations, fake_options):
+    """Measure the mailing handler with SQS events of batch_size records"""
+    ses = FakeSES(**fake_options)
+    dynamodb = FakeDynamoDB(**fake_options)
+    use_clients(ses=ses, dynamodb=dynamodb, sqs=FakeSQS(**fake_options))  # Retry delays of failed records
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for iteration in range(iterations):
+        event = make_sqs_event([
+            make_notification(make_message(message_length, f"{iteration}-{i}"))
+            for i in range(batch_size)
+        ])
+        
+        call_start = time.perf_counter()
+        response = mailing.handler(event, None)
+        latencies.append(time.perf_counter() - call_start)
+        errors += len(response['batchItemFailures'])
+    elapsed = time.perf_counter() - start
+    return summarize(name, latencies, batch_size * iterations, elapsed, [ses, dynamodb], errors)
+
+
+def git_commit():
+    """Short hash of the benchmarked commit, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    fake_options = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+    }
+    api = load_runtime('api')
+    mailing = load_runtime('mailing')
+    mailing.DELIVERY_CONCURRENCY = args.delivery_concurrency
+    
+    results = []
+    for length_name, length in MESSAGE_LENGTHS.items():
+        results.append(run_api(
+            api, f"api/single/{length_name}", None, length, args.iterations, fake_options))
+        for batch_size in args.api_batch_sizes:
+            results.append(run_api(
+                api, f"api/batch-{batch_size}/{length_name}", batch_size, length,
+                max(1, args.iterations // batch_size), fake_options))
+        for batch_size in args.mailing_batch_sizes:
+            results.append(run_mailing(
+                mailing, f"mailing/batch-{batch_size}/{length_name}", batch_size, length,
+                max(1, args.iterations // batch_size), fake_options))
+    
+    return {
+        'commit': git_commit(),
+        'created': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': dict(
+            fake_options,
+            iterations=args.iterations,
+            delivery_concurrency=args.delivery_concurrency
+        ),
+        'results': results,
+    }
+
+
+def print_report(report, baseline=None):
+    previous = {result['scenario']: result for result in (baseline or {}).get('results', [])}
+    print(f"{'scenario':<28} {'msg/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'calls/msg':>9} {'errors':>6} {'vs base':>8}")
+    for result in report['results']:
+        latency = result['latency_ms']
+        change = ""
+        if result['scenario'] in previous:
+            before = previous[result['scenario']]['throughput_msg_per_s']
+            if before:
+                change = f"{(result['throughput_msg_per_s'] / before - 1) * 100:+.0f}%"
+        print(f"{result['scenario']:<28} {result['throughput_msg_per_s']:>9.1f} "
+              f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+              f"{result['calls_per_message']:>9.2f} {result['errors']:>6} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.01, help="Seconds per AWS call")
+    parser.add_argument('--jitter', type=float, default=0.005, help="Extra random seconds per AWS call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of AWS calls that fail")
+    parser.add_argument('--iterations', type=int, default=100, help="Messages per scenario")
+    parser.add_argument('--api-batch-sizes', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--mailing-batch-sizes', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--delivery-concurrency', type=int, default=5, help="Mailing DELIVERY_CONCURRENCY")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark-results.json', help="JSON results file")
+    parser.add_argument('--baseline', help="Results file of a previous run to compare throughput with")
+    args = parser.parse_args()
+    
+    report = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Open-loop load generator for the notification API.
+
+Requests are sent on a schedule fixed in advance by an arrival pattern
+(constant, ramp or spike), whether or not earlier requests have completed,
+so a slow server cannot slow the load down. Latency is measured from the
+time each request was due to be sent, not from when a worker got to it,
+which avoids coordinated omission: queueing in the generator counts as
+latency. By default the target is a local HTTP shim running the API
+handler against the stand-in SQS; --url points it at a deployed stage.
+
+Usage:
+    python -m benchmarks.load_generator --pattern constant --rate 50 --duration 30
+    python -m benchmarks.load_generator --pattern ramp --rate 5 --peak-rate 200 --duration 60
+    python -m benchmarks.load_generator --pattern spike --rate 10 --peak-rate 100 --throttle-rate 10 --throttle-burst 20
+    python -m benchmarks.load_generator --url https://xxx.execute-api.eu-west-1.amazonaws.com/prod --api-key KEY
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from .fakes import FakeSQS
+from .harness import git_commit, percentile
+from .runtime import load_runtime, use_clients
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches everything slower
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf'))
+
+# Lowest rate used to step over the idle parts of a pattern (e.g. a ramp starting at 0)
+MIN_RATE = 0.1
+
+
+def rate_function(pattern, rate, peak_rate, duration, spike_start, spike_length):
+    """Offered requests per second at each second of the run"""
+    if pattern == 'constant':
+        return lambda t: rate
+    if pattern == 'ramp':
+        return lambda t: rate + (peak_rate - rate) * t / duration
+    if pattern == 'spike':
+        return lambda t: peak_rate if spike_start <= t < spike_start + spike_length else rate
+    raise ValueError(f"Unknown pattern: {pattern}")
+
+
+def arrival_times(rate_at, duration, poisson=False, seed=None):
+    """Offsets (seconds from the start) at which the requests are due, fixed before the run"""
+    rng = random.Random(seed)
+    times = []
+    t = 0.0
+    while True:
+        rate = max(MIN_RATE, rate_at(t))
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+        if t >= duration:
+            return times
+        if rate_at(t) > 0:
+            times.append(t)
+
+
+class TokenBucket:
+    """Stage throttling as applied by API Gateway: rate per second with a burst capacity"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def start_shim(sqs_latency, sqs_jitter, sqs_error_rate, throttle_rate, throttle_burst, concurrency, seed):
+    """Serve the API handler over HTTP on a free local port, returning (server, base_url).
+    
+    Requests become API Gateway proxy events. Optional stage throttling and a
+    concurrency limit answer 429 like API Gateway and Lambda do when exceeded.
+    """
+    api = load_runtime('api')
+    use_clients(sqs=FakeSQS(latency=sqs_latency, jitter=sqs_jitter, error_rate=sqs_error_rate, seed=seed))
+    bucket = TokenBucket(throttle_rate, throttle_burst) if throttle_rate > 0 else None
+    slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, as clients of API Gateway do
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            path = urlsplit(self.path).path
+            if bucket and not bucket.take():
+                return self.respond(429, {'message': 'Too Many Requests'})
+            if slots and not slots.acquire(blocking=False):
+                return self.respond(429, {'message': 'Rate Exceeded.'})
+            try:
+                result = api.handler({
+                    'resource': path,
+                    'path': path,
+                    'httpMethod': 'POST',
+                    'headers': dict(self.headers),
+                    'requestContext': {'identity': {'sourceIp': self.client_address[0]}},
+                    'body': body
+                }, None)
+            finally:
+                if slots:
+                    slots.release()
+            self.respond(result['statusCode'], json.loads(result['body']))
+
+        def respond(self, status_code, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # One line per request would drown the report
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class Client:
+    """Keep-alive HTTP connection per worker thread"""
+
+    def __init__(self, base_url, api_key=None, timeout=30.0):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.headers = {'Content-Type': 'application/json'}
+        if api_key:
+            self.headers['X-Api-Key'] = api_key
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def post(self, path, body):
+        """Send a request and return its status code (0 for a connection error)"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.connection_class(self.host, timeout=self.timeout)
+        try:
+            connection.request('POST', self.prefix + path, body=json.dumps(body), headers=self.headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            return 0
+
+
+def make_request(index, batch_size):
+    """Path and body of the index-th request"""
+    notification = {
+        'to': f'student{index % 1000}@example.com',
+        'subject': 'Load test',
+        'message': f"Load test notification {index}: https://edulor.fr/projects"
+    }
+    if batch_size:
+        return '/notify/email/batch', {'notifications': [notification] * batch_size}
+    return '/notify/email', notification
+
+
+def run_load(client, schedule, batch_size, max_workers):
+    """Send the requests at their scheduled offsets, returning one (due, sent, done, status) per request"""
+    results = [None] * len(schedule)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load")
+    start = time.perf_counter() + 0.1
+
+    def send(index):
+        sent = time.perf_counter()
+        path, body = make_request(index, batch_size)
+        status = client.post(path, body)
+        results[index] = (start + schedule[index], sent, time.perf_counter(), status)
+    
+    # The dispatcher never waits for responses: a request whose worker is busy waits in
+    # the executor queue, and that wait is part of its latency (measured from when it was due)
+    for index, offset in enumerate(schedule):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        executor.submit(send, index)
+    executor.shutdown(wait=True)
+    return results, start
+
+
+def histogram(latencies_ms):
+    """Number of requests per latency bucket, keyed by the bucket upper bound"""
+    counts = dict.fromkeys(HISTOGRAM_BOUNDS_MS, 0)
+    for latency in latencies_ms:
+        counts[next(bound for bound in HISTOGRAM_BOUNDS_MS if latency <= bound)] += 1
+    return {('inf' if bound == float('inf') else f'{bound:g}'): count for bound, count in counts.items()}
+
+
+def latency_summary(latencies_ms):
+    if not latencies_ms:
+        return {}
+    return {
+        'p50': percentile(latencies_ms, 0.50),
+        'p90': percentile(latencies_ms, 0.90),
+        'p99': percentile(latencies_ms, 0.99),
+        'p99.9': percentile(latencies_ms, 0.999),
+        'max': max(latencies_ms),
+    }
+
+
+def summarize(results, start, duration):
+    """Throughput, errors and latency of a run, overall and per second"""
+    ok = [result for result in results if 200 <= result[3] < 300]
+    statuses = {}
+    for result in results:
+        statuses[str(result[3])] = statuses.get(str(result[3]), 0) + 1
+    elapsed = max(result[2] for result in results) - start if results else duration
+    
+    # Response time counts from when the request was due; service time only from when it was sent
+    response_ms = [(done - due) * 1000 for due, _, done, _ in ok]
+    service_ms = [(done - sent) * 1000 for _, sent, done, _ in ok]
+    
+    timeline = []
+    for second in range(int(duration + 0.999)):
+        due_now = [result for result in results if second <= result[0] - start < second + 1]
+        ok_now = [result for result in due_now if 200 <= result[3] < 300]
+        timeline.append({
+            'second': second,
+            'offered': len(due_now),
+            'ok': len(ok_now),
+            'errors': len(due_now) - len(ok_now),
+            'p99_ms': percentile([(done - due) * 1000 for due, _, done, _ in ok_now], 0.99) if ok_now else None,
+        })
+    
+    return {
+        'requests': len(results),
+        'ok': len(ok),
+        'error_rate': (len(results) - len(ok)) / len(results) if results else 0.0,
+        'statuses': statuses,
+        'offered_rps': len(results) / duration,
+        'throughput_rps': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'response_time_ms': latency_summary(response_ms),
+        'service_time_ms': latency_summary(service_ms),
+        'histogram_ms': histogram(response_ms),
+        'timeline': timeline,
+    }
+
+
+def print_report(summary):
+    print(f"requests: {summary['requests']}  ok: {summary['ok']}  "
+          f"error rate: {summary['error_rate'] * 100:.2f}%  statuses: {summary['statuses']}")
+    print(f"offered: {summary['offered_rps']:.1f} req/s  throughput: {summary['throughput_rps']:.1f} req/s")
+    for name in ('response_time_ms', 'service_time_ms'):
+        latency = summary[name]
+        if latency:
+            print(f"{name:<17} " + "  ".join(f"{key} {value:.1f}" for key, value in latency.items()))
+    print("latency histogram (response time, ms):")
+    total = max(1, summary['ok'])
+    for bound, count in summary['histogram_ms'].items():
+        if count:
+            print(f"  <= {bound:>6}  {count:>7}  {'#' * max(1, round(40 * count / total))}")
+    print(f"{'second':>6} {'offered':>8} {'ok':>6} {'errors':>6} {'p99 ms':>8}")
+    for row in summary['timeline']:
+        p99 = f"{row['p99_ms']:.1f}" if row['p99_ms'] is not None else '-'
+        print(f"{row['second']:>6} {row['offered']:>8} {row['ok']:>6} {row['errors']:>6} {p99:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pattern', choices=['constant', 'ramp', 'spike'], default='constant')
+    parser.add_argument('--rate', type=float, default=10.0, help="Requests per second (start rate of a ramp)")
+    parser.add_argument('--peak-rate', type=float, default=100.0, help="End rate of a ramp, rate during a spike")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds of load")
+    parser.add_argument('--spike-start', type=float, default=5.0, help="Second at which the spike starts")
+    parser.add_argument('--spike-length', type=float, default=5.0, help="Seconds the spike lasts")
+    parser.add_argument('--poisson', action='store_true', help="Exponential inter-arrival times instead of even ones")
+    parser.add_argument('--batch-size', type=int, default=0, help="Notifications per request on the batch endpoint (0 = single)")
+    parser.add_argument('--max-workers', type=int, default=256, help="Requests in flight at most")
+    parser.add_argument('--url', help="Base URL of a deployed stage instead of the local shim")
+    parser.add_argument('--api-key', help="X-Api-Key value for --url")
+    parser.add_argument('--sqs-latency', type=float, default=0.01, help="Seconds per stand-in SQS call (shim)")
+    parser.add_argument('--sqs-jitter', type=float, default=0.005, help="Extra random seconds per SQS call (shim)")
+    parser.add_argument('--sqs-error-rate', type=float, default=0.0, help="Fraction of SQS calls that fail (shim)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Stage rate limit of the shim, 0 = none (deployed: 10)")
+    parser.add_argument('--throttle-burst', type=int, default=20, help="Stage burst limit of the shim (deployed: 20)")
+    parser.add_argument('--concurrency', type=int, default=0, help="Concurrent handler executions of the shim, 0 = unlimited")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON results file")
+    args = parser.parse_args()
+    
+    rate_at = rate_function(args.pattern, args.rate, args.peak_rate, args.duration,
+                            args.spike_start, args.spike_length)
+    schedule = arrival_times(rate_at, args.duration, poisson=args.poisson, seed=args.seed)
+    
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_shim(args.sqs_latency, args.sqs_jitter, args.sqs_error_rate,
+                                      args.throttle_rate, args.throttle_burst, args.concurrency, args.seed)
+    print(f"{args.pattern} load against {base_url}: {len(schedule)} requests over {args.duration:g}s")
+    try:
+        results, start = run_load(Client(base_url, args.api_key), schedule, args.batch_size, args.max_workers)
+    finally:
+        if server:
+            server.shutdown()
+    
+    summary = summarize(results, start, args.duration)
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': git_commit(), 'parameters': vars(args), **summary}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark: mailing batch wall-clock time against delivery pool size.
+
+Usage:
+    python -m benchmarks.mailing_concurrency [--batch-size 10] [--latency 0.05]
+"""
+import argparse
+import time
+
+from .fakes import FakeDynamoDB, FakeSES
+from .runtime import load_runtime, make_notification, make_sqs_event, use_clients
+
+
+def run(batch_size, latency, pool_sizes, repeats):
+    mailing = load_runtime('mailing')
+    use_clients(ses=FakeSES(latency=latency), dynamodb=FakeDynamoDB(latency=latency))
+
+    print(f"batch_size={batch_size} latency={latency * 1000:.0f}ms per call")
+    print(f"{'pool':>6} {'batch (ms)':>12} {'speedup':>8}")
+    baseline = None
+    for pool_size in pool_sizes:
+        mailing.DELIVERY_CONCURRENCY = pool_size
+        timings = []
+        for _ in range(repeats):
+            event = make_sqs_event([make_notification() for _ in range(batch_size)])
+            start = time.perf_counter()
+            result = mailing.handler(event, None)
+            timings.append(time.perf_counter() - start)
+            assert not result['batchItemFailures'], result
+        best = min(timings)
+        baseline = baseline or best
+        print(f"{pool_size:>6} {best * 1000:>12.1f} {baseline / best:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per AWS call")
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 5, 10])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    run(args.batch_size, args.latency, args.pool_sizes, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
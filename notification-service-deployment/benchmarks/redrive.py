@@ -0,0 +1,142 @@
+"""Benchmark: DLQ redrive throughput and rate ceiling against the stand-ins.
+
+Fills a stand-in dead-letter queue with failed notifications from both
+lanes (throttled, rejected and unknown failures, recorded as ERROR statuses
+in the DynamoDB stand-in), runs the redrive tool on it and checks that only
+matching messages were moved, to the queue they failed from, without
+exceeding the rate ceiling.
+
+Usage:
+    python -m benchmarks.redrive [--messages 2000] [--rate 500] [--workers 8] [--latency 0.02]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from tools.redrive import Redriver, print_summary
+
+from .fakes import FakeDynamoDB, FakeSQS
+from .runtime import DEFAULT_ENVIRONMENT, load_runtime
+
+DLQ_URL = 'https://sqs.eu-west-1.amazonaws.com/123456789012/NotificationDLQ'
+SOURCE_ARNS = {
+    'normal': 'arn:aws:sqs:eu-west-1:123456789012:NotificationQueue',
+    'high': 'arn:aws:sqs:eu-west-1:123456789012:PriorityNotificationQueue',
+}
+
+# Status error messages of the failed notifications, as written by the mailing function
+ERRORS = (
+    'An error occurred (Throttling) when calling the SendEmail operation: Maximum sending rate exceeded.',
+    'An error occurred (MessageRejected) when calling the SendEmail operation: Email address is not verified.',
+    None,
+)
+
+
+def fill_dlq(sqs, dynamodb, count, seed):
+    """Put count failed notifications in the DLQ, returning the number of throttled ones"""
+    load_runtime('api')
+    from notification_common.wire import encode
+    
+    rng = random.Random(seed)
+    table_name = DEFAULT_ENVIRONMENT['NOTIFICATION_TABLE']
+    now = datetime.utcnow()
+    throttled = 0
+    for index in range(count):
+        priority = 'high' if index % 5 == 0 else 'normal'
+        enqueued = now - timedelta(minutes=rng.randint(0, 24 * 60))
+        payload = {
+            'id': str(uuid.uuid4()),
+            'timestamp': enqueued.isoformat(),
+            'type': 'email',
+            'to': f'student{index}@example.com',
+            'subject': 'Redrive benchmark',
+            'message': 'Hello,\n\nThis notification failed during an SES outage.',
+            'priority': priority,
+            'status': 'QUEUED'
+        }
+        error = ERRORS[index % len(ERRORS)]
+        throttled += error is ERRORS[0]
+        if error:
+            dynamodb.put_item(TableName=table_name, Item={
+                'id': {'S': payload['id']},
+                'timestamp': {'S': payload['timestamp']},
+                'status': {'S': 'ERROR'},
+                'errorMessage': {'S': error}
+            })
+        sqs.add_message(
+            DLQ_URL,
+            encode(payload),
+            Attributes={
+                'SentTimestamp': str(int(enqueued.timestamp() * 1000)),
+                'DeadLetterQueueSourceArn': SOURCE_ARNS[priority]
+            },
+            MessageAttributes={
+                'NotificationType': {'DataType': 'String', 'StringValue': 'email'},
+                'Priority': {'DataType': 'String', 'StringValue': priority}
+            }
+        )
+    return throttled
+
+
+def run(messages, rate, workers, latency, seed):
+    sqs = FakeSQS(seed=seed)
+    dynamodb = FakeDynamoDB(seed=seed)
+    throttled = fill_dlq(sqs, dynamodb, messages, seed)
+    sqs.latency = dynamodb.latency = latency
+    sqs.calls.clear()
+    
+    # Dry run first: nothing may move, and every message must be visible again afterwards
+    dry_run = Redriver(
+        sqs, DLQ_URL, dynamodb=dynamodb, table_name=DEFAULT_ENVIRONMENT['NOTIFICATION_TABLE'],
+        error='Throttling', dry_run=True, workers=workers, wait_time=0, empty_receives=2
+    ).run()
+    assert dry_run['matched'] == throttled and sqs.queue_length(DLQ_URL) == messages, dry_run
+    print(f"Dry run: {dry_run['matched']} of {dry_run['received']} messages would be redriven "
+          f"in {dry_run['elapsed']:.2f}s")
+    
+    redriver = Redriver(
+        sqs, DLQ_URL, dynamodb=dynamodb, table_name=DEFAULT_ENVIRONMENT['NOTIFICATION_TABLE'],
+        error='Throttling', rate=rate, workers=workers, wait_time=0, empty_receives=2
+    )
+    summary = redriver.run()
+    print_summary(summary)
+    
+    # Only throttled notifications were moved, each back to the queue of its lane
+    moved = [message for url, queue in sqs.queues.items() if url != DLQ_URL for message in queue]
+    assert len(moved) == summary['redriven'] == throttled, (len(moved), summary)
+    assert sqs.queue_length(DLQ_URL) == messages - throttled
+    for url, queue in sqs.queues.items():
+        for message in queue:
+            if url != DLQ_URL:
+                lane = message['MessageAttributes']['Priority']['StringValue']
+                assert url.endswith(SOURCE_ARNS[lane].rsplit(':', 1)[-1]), (url, lane)
+    
+    # The ceiling allows one batch of burst on top of the rate
+    ceiling = rate * summary['elapsed'] + 10
+    print(f"Rate ceiling {rate:.0f} msg/s: {summary['rate']:.1f} msg/s achieved "
+          f"({summary['redriven']} sent, at most {ceiling:.0f} allowed)")
+    print("SQS calls: " + json.dumps(dict(sqs.calls)))
+    if summary['redriven'] > ceiling:
+        print("Rate ceiling exceeded", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000, help="Messages in the dead-letter queue")
+    parser.add_argument('--rate', type=float, default=500, help="Rate ceiling of the redrive, messages per second")
+    parser.add_argument('--workers', type=int, default=8, help="Parallel receivers")
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated latency of each AWS call, in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    run(args.messages, args.rate, args.workers, args.latency, args.seed)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
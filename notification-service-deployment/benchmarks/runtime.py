@@ -0,0 +1,101 @@
+"""Helpers to load the Lambda runtime modules outside of AWS"""
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_RUNTIME_DIR = os.path.join(ROOT, 'notification_service', 'shared', 'runtime', 'python')
+RUNTIME_DIRS = {
+    'api': os.path.join(ROOT, 'notification_service', 'api', 'runtime'),
+    'mailing': os.path.join(ROOT, 'notification_service', 'mailing', 'runtime'),
+    'archive': os.path.join(ROOT, 'notification_service', 'archive', 'runtime'),
+    'scheduler': os.path.join(ROOT, 'notification_service', 'scheduler', 'runtime'),
+    'webhook': os.path.join(ROOT, 'notification_service', 'webhook', 'runtime'),
+}
+
+# Environment expected by the runtimes; the values only need to be well-formed
+DEFAULT_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'eu-west-1',
+    'QUEUE_URL': 'https://sqs.eu-west-1.amazonaws.com/123456789012/NotificationQueue',
+    'PRIORITY_QUEUE_URL': 'https://sqs.eu-west-1.amazonaws.com/123456789012/PriorityNotificationQueue',
+    'NOTIFICATION_TABLE': 'NotificationTable',
+    'ARCHIVE_BUCKET': 'notification-archive',
+    'PAYLOAD_BUCKET': 'notification-payloads',
+}
+
+
+def load_runtime(name, environment=None, module_name='lambda_function'):
+    """Import a handler module (lambda_function by default) of a runtime under a unique name"""
+    for key, value in dict(DEFAULT_ENVIRONMENT, **(environment or {})).items():
+        os.environ.setdefault(key, value)
+
+    # The runtimes log through the root logger; keep their output out of reports
+    if not logging.getLogger().handlers:
+        logging.getLogger().addHandler(logging.NullHandler())
+
+    # The shared layer is mounted under /opt/python in Lambda
+    runtime_dir = RUNTIME_DIRS[name]
+    for path in (SHARED_RUNTIME_DIR, runtime_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    # Metrics records would interleave with the reports
+    from notification_common.metrics import set_sink
+    set_sink(lambda record: None)
+
+    spec = importlib.util.spec_from_file_location(
+        f"{name}_{module_name}",
+        os.path.join(runtime_dir, f'{module_name}.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def use_clients(**clients):
+    """Make the runtimes use the given clients (e.g. stand-ins), keyed by service name"""
+    from notification_common.clients import set_client
+    for service_name, client in clients.items():
+        set_client(service_name, client)
+
+
+def make_notification(message="Hello,\n\nThis is a benchmark notification: https://edulor.fr/verify"):
+    """Build a notification payload as enqueued by the API runtime"""
+    return {
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'email',
+        'to': 'student@example.com',
+        'subject': 'Benchmark notification',
+        'message': message,
+        'from': 'noreply@edulor.fr',
+        'status': 'QUEUED'
+    }
+
+
+def make_sqs_event(payloads):
+    """Wrap notification payloads into an SQS event, received now"""
+    now = str(int(time.time() * 1000))
+    return {
+        'Records': [
+            {
+                'messageId': str(uuid.uuid4()),
+                'receiptHandle': str(uuid.uuid4()),
+                'body': json.dumps(payload),
+                'attributes': {
+                    'ApproximateReceiveCount': '1',
+                    'SentTimestamp': now,
+                    'ApproximateFirstReceiveTimestamp': now,
+                },
+                'messageAttributes': {},
+                'eventSource': 'aws:sqs',
+                'eventSourceARN': 'arn:aws:sqs:eu-west-1:123456789012:NotificationQueue',
+            }
+            for payload in payloads
+        ]
+    }
@@ -0,0 +1,90 @@
+"""Check the shared SES send-rate limiter with N concurrent consumers.
+
+Each consumer thread stands for one mailing container with its own
+SendRateLimiter; all of them share one stand-in DynamoDB table. The script
+measures the aggregate send rate and fails (exit code 1) if it exceeds what
+the token bucket allows: its burst capacity plus rate x duration.
+
+Usage:
+    python -m benchmarks.send_rate --consumers 8 --rate 14 --duration 5 [--unavailable]
+"""
+import argparse
+import sys
+import threading
+import time
+
+from .fakes import FakeDynamoDB
+from .runtime import load_runtime, DEFAULT_ENVIRONMENT
+
+
+def run(consumers, rate, duration, lease_size, latency, unavailable):
+    load_runtime('mailing')
+    from rate_limiter import RateLimitExceeded, SendRateLimiter
+    
+    # With the bucket unreachable every consumer paces itself at its share of the rate
+    dynamodb = FakeDynamoDB(latency=latency, error_rate=1.0 if unavailable else 0.0)
+    limiters = [
+        SendRateLimiter(
+            lambda: dynamodb,
+            DEFAULT_ENVIRONMENT['NOTIFICATION_TABLE'],
+            rate=rate,
+            lease_size=lease_size,
+            fallback_rate=rate / consumers,
+            max_wait=duration
+        )
+        for _ in range(consumers)
+    ]
+    sends = []
+    lock = threading.Lock()
+    start = time.time()
+    
+    def consume(limiter):
+        while True:
+            try:
+                limiter.acquire()
+            except RateLimitExceeded:
+                return  # Next token only after the end of the run
+            now = time.time()
+            if now - start >= duration:
+                return
+            with lock:
+                sends.append(now)
+    
+    threads = [threading.Thread(target=consume, args=(limiter,)) for limiter in limiters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    capacity = limiters[0].capacity
+    allowed = (rate * duration if unavailable else capacity + rate * duration) + (consumers if unavailable else 0)
+    steady = [sent for sent in sends if sent - start >= 1.0]
+    steady_rate = len(steady) / (duration - 1.0) if duration > 1 else float('nan')
+    
+    print(f"consumers={consumers} rate={rate}/s duration={duration}s lease_size={lease_size} "
+          f"bucket={'unavailable (local pacing)' if unavailable else 'shared'}")
+    print(f"sends:               {len(sends)} (allowed at most {allowed:.0f})")
+    print(f"aggregate rate:      {len(sends) / duration:.2f}/s")
+    print(f"steady-state rate:   {steady_rate:.2f}/s (after the first second)")
+    print(f"DynamoDB calls/send: {dynamodb.total_calls / max(1, len(sends)):.2f}")
+    
+    ok = len(sends) <= allowed
+    print("PASS" if ok else "FAIL: aggregate send rate exceeded the limit")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--consumers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=14.0, help="Allowed sends per second")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds to run")
+    parser.add_argument('--lease-size', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds per DynamoDB call")
+    parser.add_argument('--unavailable', action='store_true', help="Make every DynamoDB call fail")
+    args = parser.parse_args()
+    ok = run(args.consumers, args.rate, args.duration, args.lease_size, args.latency, args.unavailable)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: template registry cache against fetching the template per message.
+
+Renders emails of notifications referencing S3 templates through the
+registry of a warm container, with a simulated S3 latency, and compares the
+time per message and the S3 calls with reading and compiling the template
+for every message. Pinned versions are served from memory; the latest
+version is revalidated by ETag once per interval.
+
+Usage:
+    python -m benchmarks.template_registry [--messages 2000] [--templates 8] [--latency 0.02]
+"""
+import argparse
+import json
+import random
+import time
+
+from .fakes import FakeS3
+from .runtime import load_runtime
+
+
+def make_template(index):
+    """Template document of a course layout"""
+    return {
+        'html': (
+            f'<!DOCTYPE html><html><body style="font-family: Arial;"><img src="{{logo_url}}">'
+            f'<h1 style="color: #{index:06x};">{{subject}}</h1>{{paragraphs}}<table>{{buttons}}</table>'
+            f'<p>Course {index}</p></body></html>'
+        ),
+        'paragraph': '<p style="margin: 0 0 12px 0;">{paragraph}</p>',
+        'logoUrl': f'https://example.com/logos/{index}.png',
+    }
+
+
+def run(messages, templates, latency, revalidate_after, cache_size, seed):
+    load_runtime('mailing')
+    from email_template import create_html_email
+    from template_registry import TemplateRegistry, parse_template, template_key
+    
+    s3 = FakeS3()
+    for index in range(templates):
+        for version in ('latest', '1'):
+            s3.put_object(Bucket='templates', Key=template_key(f'course-{index}', version),
+                          Body=json.dumps(make_template(index)))
+    s3.latency = latency
+    
+    rng = random.Random(seed)
+    references = [
+        (f'course-{rng.randrange(templates)}', rng.choice((None, '1')))
+        for _ in range(messages)
+    ]
+
+    def per_message(template_id, version):
+        response = s3.get_object(Bucket='templates', Key=template_key(template_id, version))
+        return parse_template(response['Body'].read())
+    
+    registry = TemplateRegistry(lambda: s3, 'templates', max_entries=cache_size, revalidate_after=revalidate_after)
+    print(f"{'mode':>12} {'per message (us)':>17} {'GetObject':>10}")
+    for name, get in (('per-message', per_message), ('registry', registry.get)):
+        s3.calls.clear()
+        started = time.perf_counter()
+        for index, (template_id, version) in enumerate(references):
+            create_html_email(f'Update {index}', 'Hello,\n\nNew material: https://example.com/m', layout=get(template_id, version))
+        elapsed = time.perf_counter() - started
+        print(f"{name:>12} {elapsed / messages * 1e6:>17.1f} {s3.calls['GetObject']:>10}")
+    print("Registry counters: " + json.dumps(registry.drain_counters()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000, help="Emails rendered")
+    parser.add_argument('--templates', type=int, default=8, help="Distinct templates referenced")
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated latency of each S3 call, in seconds")
+    parser.add_argument('--revalidate-after', type=float, default=60, help="Seconds between ETag checks of latest")
+    parser.add_argument('--cache-size', type=int, default=32, help="Compiled layouts kept")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    run(args.messages, args.templates, args.latency, args.revalidate_after, args.cache_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
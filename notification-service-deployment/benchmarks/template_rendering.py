@@ -0,0 +1,152 @@
+"""Benchmark: cached template engine against the previous create_html_email.
+
+Usage:
+    python -m benchmarks.template_rendering [--number 2000]
+"""
+import argparse
+import re
+import timeit
+
+from .runtime import load_runtime
+
+# Previous implementation, the comparison baseline (only an unused variable was dropped)
+
+# Email styling constants
+YELLOW_ACCENT = "#F0B100"
+TEXT_COLOR = "#2C2C33"
+PURPLE_ACCENT = "#6751E3"
+
+# Logo URL - replace with your actual logo URL
+LOGO_URL = "https://pamp-clm.s3.eu-west-1.amazonaws.com/PAMP-logo%400%2C3x.png"
+
+
+def legacy_create_html_email(subject, message, logo_url=LOGO_URL, button_text=None):
+    """Create HTML email with styling"""
+    
+    # Check if the message contains any URLs to convert to buttons
+    url_pattern = r'https?://[^\s<>"]+|www\.[^\s<>"]+|http?://[^\s<>"]+'
+    urls = re.findall(url_pattern, message)
+    
+    # Replace URLs in the message with placeholders
+    message_without_urls = message
+    for i, url in enumerate(urls):
+        placeholder = f"[LINK_{i}]"
+        message_without_urls = message_without_urls.replace(url, placeholder)
+    
+    # Create button HTML for each URL
+    buttons_html = ""
+    for i, url in enumerate(urls):
+        if i == 0 and button_text:
+            button_label = button_text
+        else:
+            button_label = "Click here" if i == 0 else f"Link {i+1}"
+        buttons_html += f"""
+        <tr>
+            <td align="center" style="padding: 20px 0;">
+                <a href="{url}" target="_blank" style="background-color: {PURPLE_ACCENT}; 
+                   color: white; padding: 12px 30px; text-decoration: none; 
+                   border-radius: 4px; font-weight: bold; display: inline-block;">
+                    {button_label}
+                </a>
+            </td>
+        </tr>
+        """
+    
+    # Replace placeholders with empty strings
+    for i in range(len(urls)):
+        message_without_urls = message_without_urls.replace(f"[LINK_{i}]", "")
+    
+    # Create paragraphs from the message text
+    paragraphs = ""
+    for paragraph in message_without_urls.split('\n'):
+        if paragraph.strip():
+            paragraphs += f"<p style=\"color: {TEXT_COLOR}; margin: 0 0 15px 0;\">{paragraph}</p>"
+    
+    # Create the HTML email template
+    html_template = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{subject}</title>
+    </head>
+    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f9f9f9;">
+        <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
+            <tr>
+                <td style="padding: 20px 0; text-align: center; background-color: {TEXT_COLOR};">
+                    <img src="{logo_url}" alt="Logo" width="150" style="max-width: 100%; height: auto;">
+                </td>
+            </tr>
+            <tr>
+                <td style="padding: 30px 20px; background-color: white;">
+                    <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
+                        <tr>
+                            <td>
+                                <h1 style="color: {YELLOW_ACCENT}; margin: 0 0 20px 0;">{subject}</h1>
+                                {paragraphs}
+                            </td>
+                        </tr>
+                        {buttons_html}
+                    </table>
+                </td>
+            </tr>
+            <tr>
+                <td style="padding: 20px; text-align: center; background-color: #f0f0f0; color: {TEXT_COLOR}; font-size: 12px;">
+                    <p>&copy; 2025 PAMP. All rights reserved.</p>
+                </td>
+            </tr>
+        </table>
+    </body>
+    </html>
+    """
+    
+    return html_template
+
+
+def make_message(paragraphs, urls):
+    """Build a message with the given number of paragraphs and URLs"""
+    lines = [
+        f"Paragraph {i}: the submission deadline for the project is approaching, please upload your work."
+        for i in range(paragraphs)
+    ]
+    for i in range(urls):
+        lines.insert((i * 7) % (len(lines) + 1), f"Open https://edulor.fr/projects/{i}/submissions to continue.")
+    return "\n".join(lines)
+
+
+def run(number):
+    load_runtime('mailing')
+    import email_template
+
+    cases = {
+        'short': make_message(paragraphs=3, urls=1),
+        'long': make_message(paragraphs=2000, urls=200),
+        'mistyped': "See http://edulor.fr/plain and htt://edulor.fr/typo\nThen www.edulor.fr/help",
+    }
+    print(f"{'message':>8} {'chars':>8} {'legacy (us)':>12} {'engine (us)':>12} {'cached (us)':>12}")
+    for name, message in cases.items():
+        subject = f"Benchmark {name}"
+        expected = legacy_create_html_email(subject, message, button_text="Open")
+        assert email_template.create_html_email(subject, message, button_text="Open") == expected
+
+        runs = number if name == 'short' else max(1, number // 100)
+        legacy = timeit.timeit(
+            lambda: legacy_create_html_email(subject, message, button_text="Open"), number=runs)
+        engine = timeit.timeit(
+            lambda: email_template.create_html_email.__wrapped__(subject, message, button_text="Open"), number=runs)
+        cached = timeit.timeit(
+            lambda: email_template.create_html_email(subject, message, button_text="Open"), number=runs)
+        print(f"{name:>8} {len(message):>8} {legacy / runs * 1e6:>12.1f} "
+              f"{engine / runs * 1e6:>12.1f} {cached / runs * 1e6:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help="Renders per short-message measurement")
+    args = parser.parse_args()
+    run(args.number)
+
+
+if __name__ == '__main__':
+    main()
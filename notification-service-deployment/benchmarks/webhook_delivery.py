@@ -0,0 +1,181 @@
+"""Benchmark: webhook delivery over pooled keep-alive connections.
+
+Runs batches of webhooks through the webhook consumer against a local
+HTTP/1.1 stand-in receiver, which checks every signature and counts the
+connections it accepts and the requests in flight at once. The pooled
+client is compared with the same client closing the connection after every
+request (Connection: close), for several per-host connection limits. The
+receiver delays the first request of each connection by --handshake to
+model the TCP and TLS handshakes a real https receiver costs, since they
+take next to no time on the loopback interface.
+
+Usage:
+    python -m benchmarks.webhook_delivery [--batches 20] [--batch-size 10] [--latency 0.02] [--handshake 0.03]
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .fakes import FakeDynamoDB, FakeSecretsManager, FakeSQS
+from .runtime import load_runtime, make_sqs_event, use_clients
+
+SECRET_ARN = 'arn:aws:secretsmanager:eu-west-1:123456789012:secret:WebhookSigningSecret'
+SECRET = 'benchmark-signing-secret'
+
+
+class Receiver(ThreadingHTTPServer):
+    """Local webhook receiver counting connections, requests and concurrency"""
+    
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, latency, handshake, verify):
+        super().__init__(('127.0.0.1', 0), ReceiverHandler)
+        self.latency = latency
+        self.handshake = handshake
+        self.verify = verify
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.bad_signatures = 0
+            self.in_flight = 0
+            self.peak_in_flight = 0
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    """One instance per connection; HTTP/1.1 keeps it open between requests"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Headers and body go out in one segment, as Nagle's algorithm would otherwise hold the
+    # body back until the client's delayed ACK on a kept-alive connection
+    disable_nagle_algorithm = True
+    wbufsize = 8192
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        self.handshaking = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+            if not server.verify(SECRET, self.headers.get('X-Notification-Signature'), body):
+                server.bad_signatures += 1
+        time.sleep(server.latency + (server.handshake if self.handshaking else 0))
+        self.handshaking = False
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header('Connection', 'close')  # As real servers do, so the client drops the socket
+        self.end_headers()
+        self.wfile.write(b'{}')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_webhook(url):
+    """Build a webhook payload as enqueued by the API runtime"""
+    return {
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'webhook',
+        'url': url,
+        'event': 'course.published',
+        'data': {'courseId': 'c-42', 'title': 'Benchmark course', 'modules': list(range(20))},
+        'priority': 'normal',
+        'status': 'QUEUED'
+    }
+
+
+def run(batches, batch_size, latency, handshake, connection_limits, concurrency):
+    webhook = load_runtime('webhook', {
+        'WEBHOOK_ALLOWED_HOSTS': '127.0.0.1',
+        'WEBHOOK_SCHEMES': 'http',  # The stand-in receiver does not terminate TLS
+        'WEBHOOK_SECRET_ARN': SECRET_ARN,
+        'WEBHOOK_CONCURRENCY': str(concurrency),
+    })
+    from http_client import WebhookClient
+    from notification_common.metrics import set_sink
+    from signing import verify
+    use_clients(
+        sqs=FakeSQS(),
+        dynamodb=FakeDynamoDB(),
+        secretsmanager=FakeSecretsManager(secrets={SECRET_ARN: SECRET})
+    )
+    
+    # The consumer reports the requests it sent and the connections it opened in its EMF records
+    counters = Counter()
+    set_sink(lambda record: counters.update({
+        name: value for name, value in json.loads(record).items() if name.startswith('Webhook')
+    }))
+    
+    receiver = Receiver(latency, handshake, verify)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{receiver.server_address[1]}/hooks/notifications'
+    
+    print(f"{batches} batches of {batch_size}, concurrency {concurrency}, receiver latency "
+          f"{latency * 1000:.0f}ms, handshake {handshake * 1000:.0f}ms")
+    print(f"{'mode':>10} {'per host':>9} {'batch (ms)':>11} {'webhooks/s':>11} {'connections':>12} "
+          f"{'requests':>9} {'peak':>5} {'bad sig':>8}")
+    try:
+        for max_connections in connection_limits:
+            for mode in ('close', 'keep-alive'):
+                client = WebhookClient(max_connections_per_host=max_connections)
+                if mode == 'close':
+                    client.headers['Connection'] = 'close'
+                webhook.webhook_client = client
+                receiver.reset()
+                counters.clear()
+                
+                started = time.perf_counter()
+                for _ in range(batches):
+                    result = webhook.handler(make_sqs_event([make_webhook(url) for _ in range(batch_size)]), None)
+                    assert not result['batchItemFailures'], result
+                elapsed = time.perf_counter() - started
+                
+                assert counters['WebhookRequests'] == receiver.requests, (counters, receiver.requests)
+                assert counters['WebhookConnections'] == receiver.connections, (counters, receiver.connections)
+                print(f"{mode:>10} {max_connections:>9} {elapsed / batches * 1000:>11.1f} "
+                      f"{batches * batch_size / elapsed:>11.1f} {receiver.connections:>12} "
+                      f"{receiver.requests:>9} {receiver.peak_in_flight:>5} {receiver.bad_signatures:>8}")
+                client.pools.clear()
+    finally:
+        receiver.shutdown()
+        receiver.server_close()
+    print("Consumer metrics of the last run: " + json.dumps(counters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=20, help="SQS batches delivered per run")
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds the receiver takes per request")
+    parser.add_argument('--handshake', type=float, default=0.03, help="Seconds added to the first request of a connection")
+    parser.add_argument('--connection-limits', type=int, nargs='+', default=[1, 4, 10], help="Connections per host")
+    parser.add_argument('--concurrency', type=int, default=10, help="Webhooks of a batch delivered in parallel")
+    args = parser.parse_args()
+    run(args.batches, args.batch_size, args.latency, args.handshake, args.connection_limits, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: compact wire format against the plain JSON queue bodies.
+
+Builds batches of notification payloads as the API enqueues them and
+compares, per batch of SQS records, the body bytes, the time the mailing
+function spends decoding the bodies, and that time plus the parsing of the
+whole SQS event by the Lambda runtime, whose size follows the bodies.
+
+Usage:
+    python -m benchmarks.wire_format [--batch-size 10] [--number 2000]
+"""
+import argparse
+import json
+import timeit
+
+from .runtime import load_runtime, make_notification, make_sqs_event
+
+
+def make_cases():
+    """Payloads of typical notifications, by name"""
+    paragraph = "The submission deadline for the project is approaching, please upload your work. "
+    recipients = [
+        {'to': f'student{i}@example.com', 'variables': {'name': f'Student {i}', 'group': 'B12'}}
+        for i in range(50)
+    ]
+    cases = {
+        'short': make_notification(),
+        'medium': make_notification(paragraph * 25),
+        'long': make_notification(paragraph * 100),
+        'recipients': dict(make_notification(paragraph * 5), recipients=recipients),
+    }
+    del cases['recipients']['to']
+    for payload in cases.values():
+        payload.update(buttonText=None, priority='normal')
+    return cases
+
+
+def run(batch_size, number):
+    load_runtime('mailing')
+    from notification_common.wire import decode, encode
+    
+    print(f"{'payload':>10} {'json (B)':>10} {'compact (B)':>12} {'saved':>7} "
+          f"{'decode json (us)':>17} {'compact (us)':>12} {'event json (us)':>16} {'compact (us)':>12}")
+    for name, payload in make_cases().items():
+        batch = [dict(payload, id=f"{payload['id'][:-4]}{i:04d}") for i in range(batch_size)]
+        legacy_bodies = [json.dumps(item) for item in batch]
+        compact_bodies = [encode(item) for item in batch]
+        assert [decode(body) for body in compact_bodies] == [json.loads(body) for body in legacy_bodies]
+        
+        legacy_bytes = sum(len(body.encode('utf-8')) for body in legacy_bodies)
+        compact_bytes = sum(len(body.encode('utf-8')) for body in compact_bodies)
+        
+        # Decode time of a whole batch, as done by one mailing invocation
+        runs = number if name == 'short' else max(1, number // 10)
+        legacy = timeit.timeit(lambda: [json.loads(body) for body in legacy_bodies], number=runs)
+        compact = timeit.timeit(lambda: [decode(body) for body in compact_bodies], number=runs)
+        
+        # The same, starting from the invocation payload the Lambda runtime receives
+        legacy_event = json.dumps(make_sqs_event(batch))
+        compact_event = make_sqs_event([])
+        compact_event['Records'] = [
+            dict(record, body=body)
+            for record, body in zip(json.loads(legacy_event)['Records'], compact_bodies)
+        ]
+        compact_event = json.dumps(compact_event)
+        legacy_total = timeit.timeit(
+            lambda: [json.loads(record['body']) for record in json.loads(legacy_event)['Records']], number=runs)
+        compact_total = timeit.timeit(
+            lambda: [decode(record['body']) for record in json.loads(compact_event)['Records']], number=runs)
+        print(f"{name:>10} {legacy_bytes:>10} {compact_bytes:>12} {1 - compact_bytes / legacy_bytes:>7.0%} "
+              f"{legacy / runs * 1e6:>17.1f} {compact / runs * 1e6:>12.1f} "
+              f"{legacy_total / runs * 1e6:>16.1f} {compact_total / runs * 1e6:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=10, help="Records per SQS batch")
+    parser.add_argument('--number', type=int, default=2000, help="Batches decoded per short-payload measurement")
+    args = parser.parse_args()
+    run(args.batch_size, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+from aws_cdk import (
+    aws_apigateway as apigw,
+    aws_iam as iam,
+    aws_sqs as sqs,
+)
+
+
+# Lambda-free ingestion: API Gateway validates the notification with a request model and a VTL
+# mapping template builds the payload the API Lambda would enqueue (id, timestamp, priority lane)
+# and sends it with the SQS query API. Notifications needing the Lambda logic (recipient lists,
+# sendAt, digests) are rejected by the model; they go through /notify/email/batch instead.
+
+# Body accepted by the direct path; unknown fields are rejected rather than silently dropped
+NOTIFICATION_SCHEMA = apigw.JsonSchema(
+    schema=apigw.JsonSchemaVersion.DRAFT4,
+    title="EmailNotification",
+    type=apigw.JsonSchemaType.OBJECT,
+    required=["to", "subject", "message"],
+    properties={
+        "to": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, pattern="^[^@\\s]+@[^@\\s]+$", max_length=254),
+        "subject": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, min_length=1, max_length=998),
+        "message": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, min_length=1),
+        "from": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, max_length=254),
+        "buttonText": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, max_length=100),
+        "priority": apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=["normal", "high"]),
+    },
+    additional_properties=False,
+)
+
+# The payload is assembled in $payload with $q standing for a double quote; string fields are
+# copied with $input.json, which returns them JSON-encoded. The notification id is the API
+# Gateway request id (a UUID) and the timestamp is derived from requestTime, which has the
+# form dd/MMM/yyyy:HH:mm:ss +0000.
+REQUEST_TEMPLATE = """#set($q = '"')
+#set($months = {"Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04", "May": "05", "Jun": "06", "Jul": "07", "Aug": "08", "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12"})
+#set($t = $context.requestTime)
+#set($month = $months.get($t.substring(3, 6)))
+#set($timestamp = "$t.substring(7, 11)-$month-$t.substring(0, 2)T$t.substring(12, 20)")
+#if($input.path('$.priority') == "high")
+#set($priority = "high")
+#set($queueUrl = "@PRIORITY_QUEUE_URL@")
+#else
+#set($priority = "normal")
+#set($queueUrl = "@QUEUE_URL@")
+#end
+#set($from = "null")
+#if("$!input.path('$.from')" != "")
+#set($from = $input.json('$.from'))
+#end
+#set($buttonText = "null")
+#if("$!input.path('$.buttonText')" != "")
+#set($buttonText = $input.json('$.buttonText'))
+#end
+#set($payload = "{${q}id${q}: ${q}$context.requestId${q}, ${q}timestamp${q}: ${q}$timestamp${q}, ${q}type${q}: ${q}email${q}, ${q}to${q}: $input.json('$.to'), ${q}subject${q}: $input.json('$.subject'), ${q}message${q}: $input.json('$.message'), ${q}from${q}: $from, ${q}buttonText${q}: $buttonText, ${q}priority${q}: ${q}$priority${q}, ${q}status${q}: ${q}QUEUED${q}}")
+Action=SendMessage&QueueUrl=$util.urlEncode($queueUrl)&MessageBody=$util.urlEncode($payload)&MessageAttribute.1.Name=NotificationType&MessageAttribute.1.Value.DataType=String&MessageAttribute.1.Value.StringValue=email&MessageAttribute.2.Name=Priority&MessageAttribute.2.Value.DataType=String&MessageAttribute.2.Value.StringValue=$priority"""
+
+# Same body as the API Lambda response
+RESPONSE_TEMPLATE = """#set($result = $input.path('$.SendMessageResponse.SendMessageResult'))
+{
+  "message": "Notification queued successfully",
+  "notificationId": "$context.requestId",
+  "messageId": "$result.MessageId"
+}"""
+
+ERROR_RESPONSE_TEMPLATE = """{
+  "message": "Error queueing notification: $util.escapeJavaScript($input.path('$.Error.Code'))"
+}"""
+
+# Model validation failures, in the {"message": ...} shape of the Lambda errors
+VALIDATION_ERROR_TEMPLATE = """{
+  "message": "$context.error.validationErrorString"
+}"""
+
+
+def sqs_integration(
+    role: iam.IRole,
+    notification_queue: sqs.IQueue,
+    priority_queue: sqs.IQueue,
+) -> apigw.AwsIntegration:
+    """SQS SendMessage integration routing each notification to the queue of its lane"""
+    request_template = (
+        REQUEST_TEMPLATE
+        .replace("@QUEUE_URL@", notification_queue.queue_url)
+        .replace("@PRIORITY_QUEUE_URL@", priority_queue.queue_url)
+    )
+    return apigw.AwsIntegration(
+        service="sqs",
+        action="SendMessage",
+        integration_http_method="POST",
+        options=apigw.IntegrationOptions(
+            credentials_role=role,
+            passthrough_behavior=apigw.PassthroughBehavior.NEVER,
+            request_parameters={
+                "integration.request.header.Content-Type": "'application/x-www-form-urlencoded'",
+                "integration.request.header.Accept": "'application/json'",  # JSON instead of XML responses
+            },
+            request_templates={"application/json": request_template},
+            integration_responses=[
+                apigw.IntegrationResponse(
+                    status_code="200",
+                    response_templates={"application/json": RESPONSE_TEMPLATE},
+                ),
+                apigw.IntegrationResponse(
+                    status_code="500",
+                    selection_pattern="[45]\\d{2}",  # SQS errors, e.g. throttling or a missing permission
+                    response_templates={"application/json": ERROR_RESPONSE_TEMPLATE},
+                ),
+            ],
+        ),
+    )
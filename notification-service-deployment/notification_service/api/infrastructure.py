@@ -1,30 +1,79 @@
 import os
+from typing import Optional, Sequence
 from aws_cdk import (
     Duration,
     aws_apigateway as apigw,
     aws_lambda as lambda_,
     aws_sqs as sqs,
+    aws_dynamodb as dynamodb,
     aws_iam as iam,
     aws_logs as logs,
+    aws_s3 as s3,
     CfnOutput,
 )
 from constructs import Construct
+from .direct_ingestion import NOTIFICATION_SCHEMA, VALIDATION_ERROR_TEMPLATE, sqs_integration
+
+# Ingestion modes of POST /notify/email
+INGESTION_MODES = ("lambda", "direct")
+
+# Queue body formats written by the API Lambda; the consumers read both
+WIRE_FORMATS = ("compact", "json")
 
 
 class ApiComponent(Construct):
     """API Gateway component for notification service"""
 
-    def __init__(self, scope: Construct, id: str, notification_queue: sqs.Queue, **kwargs) -> None:
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        notification_queue: sqs.Queue, 
+        priority_queue: sqs.Queue, 
+        notification_table: dynamodb.Table, 
+        shared_layer: lambda_.ILayerVersion, 
+        payload_bucket: s3.IBucket, 
+        max_batch_notifications: int = 500,
+        max_schedule_days: int = 365,
+        log_sample_rate: float = 0.01,
+        claim_check_threshold: int = 200000,
+        wire_format: str = "compact",
+        ingestion: str = "lambda",
+        webhook_queue: Optional[sqs.Queue] = None,
+        webhook_allowed_hosts: Sequence[str] = (),
+        recipient_index: Optional[str] = "RecipientIndex",
+        status_index: Optional[str] = "StatusIndex",
+        **kwargs
+    ) -> None:
         super().__init__(scope, id)
         
+        # "lambda" runs the API Lambda for every notification; "direct" has API Gateway validate
+        # and enqueue single notifications itself (see direct_ingestion.py)
+        if ingestion not in INGESTION_MODES:
+            raise ValueError(f"ingestion must be one of: {', '.join(INGESTION_MODES)}")
+        self.ingestion = ingestion
+        
+        # "json" keeps the plain JSON bodies, e.g. while consumers older than the compact format drain
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"wire_format must be one of: {', '.join(WIRE_FORMATS)}")
+        
         # Lambda function to send messages to SQS
         self.lambda_function = lambda_.Function(
             self, "ApiHandler",
             runtime=lambda_.Runtime.PYTHON_3_9,
             code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
             handler="lambda_function.handler",
+            layers=[shared_layer],  # notification_common modules
             environment={
                 "QUEUE_URL": notification_queue.queue_url,
+                "PRIORITY_QUEUE_URL": priority_queue.queue_url,  # Lane of "priority": "high" notifications
+                "MAX_BATCH_NOTIFICATIONS": str(max_batch_notifications),
+                "NOTIFICATION_TABLE": notification_table.table_name,  # Notifications scheduled beyond the SQS delay
+                "MAX_SCHEDULE_DAYS": str(max_schedule_days),  # Furthest sendAt accepted
+                "PAYLOAD_BUCKET": payload_bucket.bucket_name,  # Large payloads and attachments
+                "CLAIM_CHECK_THRESHOLD": str(claim_check_threshold),  # Bytes above which a payload goes to S3
+                "WIRE_FORMAT": wire_format,  # Queue body format, see notification_common/wire.py
+                "LOG_SAMPLE_RATE": str(log_sample_rate),  # Requests logged with their verbose fields
             },
             timeout=Duration.seconds(10),
             memory_size=128,
@@ -33,6 +82,40 @@ class ApiComponent(Construct):
         
         # Grant permission to send messages to SQS
         notification_queue.grant_send_messages(self.lambda_function)
+        priority_queue.grant_send_messages(self.lambda_function)
+        
+        # Webhooks are accepted only once a queue and the hosts they may target are configured
+        if webhook_queue:
+            self.lambda_function.add_environment("WEBHOOK_QUEUE_URL", webhook_queue.queue_url)
+            self.lambda_function.add_environment("WEBHOOK_ALLOWED_HOSTS", ",".join(webhook_allowed_hosts))
+            webhook_queue.grant_send_messages(self.lambda_function)
+        
+        # Grant permission to store scheduled notifications
+        notification_table.grant_write_data(self.lambda_function)
+        
+        # Grant permission to store large payloads and attachments
+        payload_bucket.grant_put(self.lambda_function)
+        
+        # Lambda function serving the notification status endpoints
+        self.status_function = lambda_.Function(
+            self, "StatusHandler",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
+            handler="status_function.handler",
+            layers=[shared_layer],  # notification_common modules
+            environment={
+                "NOTIFICATION_TABLE": notification_table.table_name,
+                "RECIPIENT_INDEX": recipient_index or "",  # GSI on to + updatedAt, empty until deployed
+                "STATUS_INDEX": status_index or "",  # GSI on status + updatedAt, empty until deployed
+                "LOG_SAMPLE_RATE": str(log_sample_rate),  # Requests logged with their verbose fields
+            },
+            timeout=Duration.seconds(10),
+            memory_size=128,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        # Grant read access to the table and its indexes
+        notification_table.grant_read_data(self.status_function)
         
         # Create REST API
         self.api = apigw.RestApi(
@@ -79,36 +162,124 @@ class ApiComponent(Construct):
         notifications_resource = self.api.root.add_resource("notify")
         email_resource = notifications_resource.add_resource("email")
         
+        # Method responses shared by the notification endpoints
+        method_responses = [
+            apigw.MethodResponse(
+                status_code="200",
+                response_models={
+                    "application/json": apigw.Model.EMPTY_MODEL
+                }
+            ),
+            apigw.MethodResponse(
+                status_code="400",
+                response_models={
+                    "application/json": apigw.Model.ERROR_MODEL
+                }
+            ),
+            apigw.MethodResponse(
+                status_code="500",
+                response_models={
+                    "application/json": apigw.Model.ERROR_MODEL
+                }
+            )
+        ]
+        
         # POST method to send an email notification
-        email_resource.add_method(
+        if ingestion == "direct":
+            email_resource.add_method(
+                "POST", 
+                self._direct_integration(notification_queue, priority_queue),
+                api_key_required=True,
+                request_models={
+                    "application/json": self.api.add_model("EmailNotificationModel",
+                        content_type="application/json",
+                        model_name="EmailNotification",
+                        schema=NOTIFICATION_SCHEMA
+                    )
+                },
+                request_validator=self.api.add_request_validator("BodyValidator",
+                    validate_request_body=True
+                ),
+                method_responses=method_responses
+            )
+        else:
+            email_resource.add_method(
+                "POST", 
+                apigw.LambdaIntegration(self.lambda_function),
+                api_key_required=True,
+                method_responses=method_responses
+            )
+        
+        # POST method to send up to MAX_BATCH_NOTIFICATIONS email notifications at once
+        batch_resource = email_resource.add_resource("batch")
+        batch_resource.add_method(
             "POST", 
             apigw.LambdaIntegration(self.lambda_function),
             api_key_required=True,
-            method_responses=[
-                apigw.MethodResponse(
-                    status_code="200",
-                    response_models={
-                        "application/json": apigw.Model.EMPTY_MODEL
-                    }
-                ),
-                apigw.MethodResponse(
-                    status_code="400",
-                    response_models={
-                        "application/json": apigw.Model.ERROR_MODEL
-                    }
-                ),
-                apigw.MethodResponse(
-                    status_code="500",
-                    response_models={
-                        "application/json": apigw.Model.ERROR_MODEL
-                    }
-                )
-            ]
+            method_responses=method_responses
+        )
+        
+        # POST method to send a signed JSON event to a webhook URL (Lambda only, whatever the ingestion mode)
+        webhook_resource = notifications_resource.add_resource("webhook")
+        webhook_resource.add_method(
+            "POST", 
+            apigw.LambdaIntegration(self.lambda_function),
+            api_key_required=True,
+            method_responses=method_responses
+        )
+        
+        # GET methods to read notification status: by id, or by recipient and/or status
+        status_integration = apigw.LambdaIntegration(self.status_function)
+        notifications_resource.add_method(
+            "GET", 
+            status_integration,
+            api_key_required=True,
+            request_parameters={
+                "method.request.querystring.recipient": False,
+                "method.request.querystring.status": False,
+                "method.request.querystring.limit": False,
+                "method.request.querystring.cursor": False,
+            },
+            method_responses=method_responses
+        )
+        notification_resource = notifications_resource.add_resource("{id}")
+        notification_resource.add_method(
+            "GET", 
+            status_integration,
+            api_key_required=True,
+            request_parameters={
+                "method.request.querystring.limit": False,
+                "method.request.querystring.cursor": False,
+            },
+            method_responses=method_responses
         )
         
         # Store the API endpoint for reference
         self.api_endpoint = self.api.url_for_path("/notify/email")
+        self.batch_api_endpoint = self.api.url_for_path("/notify/email/batch")
+        self.status_api_endpoint = self.api.url_for_path("/notify")
+        self.webhook_api_endpoint = self.api.url_for_path("/notify/webhook")
         
         # Outputs
         CfnOutput(self, "ApiEndpoint", value=self.api_endpoint)
+        CfnOutput(self, "BatchApiEndpoint", value=self.batch_api_endpoint)
+        CfnOutput(self, "StatusApiEndpoint", value=self.status_api_endpoint)
+        CfnOutput(self, "WebhookApiEndpoint", value=self.webhook_api_endpoint)
         CfnOutput(self, "ApiKeyId", value=self.api_key.key_id)
+
+    def _direct_integration(self, notification_queue: sqs.Queue, priority_queue: sqs.Queue) -> apigw.AwsIntegration:
+        """SQS integration of the direct ingestion mode, with the role API Gateway sends messages with"""
+        role = iam.Role(
+            self, "DirectIngestionRole",
+            assumed_by=iam.ServicePrincipal("apigateway.amazonaws.com"),
+            description="Lets API Gateway enqueue notifications without the API Lambda"
+        )
+        notification_queue.grant_send_messages(role)
+        priority_queue.grant_send_messages(role)
+        
+        # Validation failures get the {"message": ...} body of the Lambda errors
+        self.api.add_gateway_response("BadRequestBody",
+            type=apigw.ResponseType.BAD_REQUEST_BODY,
+            templates={"application/json": VALIDATION_ERROR_TEMPLATE}
+        )
+        return sqs_integration(role, notification_queue, priority_queue)
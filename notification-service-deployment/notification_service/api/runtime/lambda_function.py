@@ -1,101 +1,700 @@
+from notification_common.coldstart import init_metrics
+import base64
+import binascii
 import json
 import os
-import boto3
+import re
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+import time
 import uuid
+from notification_common.claim_check import DEFAULT_THRESHOLD, store_attachment, store_payload
+from notification_common.clients import get_client
+from notification_common.message_log import MessageLog
+from notification_common.schedule import MAX_DELAY_SECONDS, bucket_of, format_time, parse_send_at
+from notification_common.wire import DEFAULT_COMPRESS_THRESHOLD, encode
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize SQS client
-sqs_client = boto3.client('sqs')
+# Batch endpoint limits
+MAX_BATCH_NOTIFICATIONS = int(os.environ.get('MAX_BATCH_NOTIFICATIONS', '500'))
+BATCH_SEND_CONCURRENCY = int(os.environ.get('BATCH_SEND_CONCURRENCY', '8'))
+SQS_BATCH_LIMIT = 10  # SendMessageBatch accepts at most 10 entries
+
 QUEUE_URL = os.environ['QUEUE_URL']
 
+# High-priority notifications skip the bulk backlog through their own queue
+PRIORITY_QUEUE_URL = os.environ.get('PRIORITY_QUEUE_URL', QUEUE_URL)
+PRIORITIES = ('normal', 'high')
+
+# Webhooks go through their own queue and consumer; they may only target the hosts of
+# WEBHOOK_ALLOWED_HOSTS (comma-separated), over https, with a JSON body of MAX_WEBHOOK_BYTES
+WEBHOOK_QUEUE_URL = os.environ.get('WEBHOOK_QUEUE_URL')
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.environ.get('WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()
+}
+MAX_WEBHOOK_BYTES = int(os.environ.get('MAX_WEBHOOK_BYTES', str(64 * 1024)))
+MAX_EVENT_LENGTH = 128
+
+# Notifications due in more than MAX_DELAY_SECONDS are stored in the table until the
+# scheduler releases them; sendAt may be at most MAX_SCHEDULE_DAYS ahead
+table_name = os.environ.get('NOTIFICATION_TABLE')
+MAX_SCHEDULE_DAYS = int(os.environ.get('MAX_SCHEDULE_DAYS', '365'))
+BATCH_WRITE_LIMIT = 25  # BatchWriteItem accepts at most 25 items
+
+# Notifications with a digestKey are coalesced per recipient over a window of up to
+# 15 minutes (the longest SQS delay of the flush message)
+MAX_DIGEST_KEY_LENGTH = 128
+MIN_DIGEST_WINDOW = 60
+MAX_DIGEST_WINDOW = 900
+
+# Notifications may reference an email template stored in the template bucket by templateId
+# and optional templateVersion (the latest version when omitted); see the mailing runtime
+TEMPLATE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+TEMPLATE_VERSION_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,32}$')
+
+# Payloads larger than CLAIM_CHECK_THRESHOLD bytes are stored in PAYLOAD_BUCKET and enqueued as
+# a reference; entries of a SendMessageBatch call share the SQS limit, so each gets a tenth of it
+PAYLOAD_BUCKET = os.environ.get('PAYLOAD_BUCKET')
+CLAIM_CHECK_THRESHOLD = int(os.environ.get('CLAIM_CHECK_THRESHOLD', str(DEFAULT_THRESHOLD)))
+
+# Attachments are stored in PAYLOAD_BUCKET and sent as a raw MIME email (SES accepts 10 MB
+# per message, of which base64 takes a third)
+MAX_ATTACHMENTS = 10
+MAX_ATTACHMENT_BYTES = int(os.environ.get('MAX_ATTACHMENT_BYTES', str(7 * 1024 * 1024)))
+
+# Queue bodies are written in the compact wire format (short keys, compressed above
+# WIRE_COMPRESS_THRESHOLD bytes) or as plain JSON, which every release can read
+WIRE_FORMAT = os.environ.get('WIRE_FORMAT', 'compact')
+WIRE_COMPRESS_THRESHOLD = int(os.environ.get('WIRE_COMPRESS_THRESHOLD', str(DEFAULT_COMPRESS_THRESHOLD)))
+
+def sqs_client():
+    """SQS client created on first use, with a connection pool sized for parallel batch sends"""
+    return get_client('sqs', max_pool_connections=max(10, BATCH_SEND_CONCURRENCY))
+
+def dynamodb_client():
+    """DynamoDB client created on first use, for scheduled notifications"""
+    return get_client('dynamodb')
+
+def s3_client():
+    """S3 client created on first use, for large payloads and attachments"""
+    return get_client('s3', max_pool_connections=max(10, BATCH_SEND_CONCURRENCY))
+
+# Worker pool used to send the SendMessageBatch chunks of a batch request in parallel
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_SEND_CONCURRENCY, thread_name_prefix="enqueue")
+
+# Routes of the batch and webhook endpoints, as seen in the API Gateway proxy event
+BATCH_RESOURCE = '/notify/email/batch'
+WEBHOOK_RESOURCE = '/notify/webhook'
+
+REQUIRED_FIELDS = ['to', 'subject', 'message']
+
+# Maximum number of recipients of a single notification
+MAX_RECIPIENTS = int(os.environ.get('MAX_RECIPIENTS', '500'))
+
+def parse_body(event):
+    """Parse the JSON request body, returning (body, error_response)"""
+    if not event.get('body'):
+        return None, {
+            'statusCode': 400,
+            'body': json.dumps({
+                'message': 'Missing request body'
+            })
+        }
+    
+    # Handle different content types
+    body = event.get('body')
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError:
+            return None, {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': 'Invalid JSON in request body'
+                })
+            }
+    
+    return body, None
+
+def validate_notification(body):
+    """Return an error message for an invalid notification, None if it is valid"""
+    if not isinstance(body, dict):
+        return 'Notification must be a JSON object'
+    
+    # A recipients list replaces the to field
+    missing_fields = [
+        field for field in REQUIRED_FIELDS
+        if field not in body and not (field == 'to' and 'recipients' in body)
+    ]
+    if missing_fields:
+        return f'Missing required fields: {", ".join(missing_fields)}'
+    
+    if body.get('priority', 'normal') not in PRIORITIES:
+        return f'priority must be one of: {", ".join(PRIORITIES)}'
+    
+    if body.get('sendAt') is not None:
+        try:
+            send_at = parse_send_at(body['sendAt'])
+        except ValueError as e:
+            return str(e)
+        if send_at > datetime.now(timezone.utc) + timedelta(days=MAX_SCHEDULE_DAYS):
+            return f'sendAt must be within {MAX_SCHEDULE_DAYS} days'
+    
+    error = validate_recipients(body) or validate_attachments(body) or validate_template(body)
+    if error or 'digestKey' not in body:
+        return error
+    return validate_digest(body)
+
+def validate_recipients(body):
+    """Return an error message for an invalid multi-recipient notification, None otherwise"""
+    if 'recipients' in body:
+        recipients = body['recipients']
+        if not isinstance(recipients, list) or not recipients:
+            return 'recipients must be a non-empty list'
+        for recipient in recipients:
+            if (not isinstance(recipient, dict) or not isinstance(recipient.get('to'), str)
+                    or not isinstance(recipient.get('variables', {}), dict)):
+                return 'Each recipient must be an object with a "to" address and optional "variables"'
+    elif isinstance(body['to'], list):
+        recipients = body['to']
+        if not recipients or not all(isinstance(address, str) for address in recipients):
+            return 'to must be an address or a non-empty list of addresses'
+    else:
+        return None
+    
+    if len(recipients) > MAX_RECIPIENTS:
+        return f'A notification accepts at most {MAX_RECIPIENTS} recipients'
+    return None
+
+def validate_digest(body):
+    """Return an error message for invalid digest options, None otherwise"""
+    digest_key = body['digestKey']
+    if not isinstance(digest_key, str) or not 0 < len(digest_key) <= MAX_DIGEST_KEY_LENGTH:
+        return f'digestKey must be a string of 1 to {MAX_DIGEST_KEY_LENGTH} characters'
+    if 'recipients' in body or not isinstance(body['to'], str):
+        return 'digestKey requires a single to address'
+    window = body.get('digestWindow', MIN_DIGEST_WINDOW)
+    if isinstance(window, bool) or not isinstance(window, int) or not MIN_DIGEST_WINDOW <= window <= MAX_DIGEST_WINDOW:
+        return f'digestWindow must be between {MIN_DIGEST_WINDOW} and {MAX_DIGEST_WINDOW} seconds'
+    if not isinstance(body.get('digestSubject', ''), str):
+        return 'digestSubject must be a string'
+    return None
+
+def validate_template(body):
+    """Return an error message for an invalid template reference, None otherwise"""
+    if body.get('templateId') is not None:
+        if not isinstance(body['templateId'], str) or not TEMPLATE_ID_PATTERN.match(body['templateId']):
+            return 'templateId must be 1 to 64 letters, digits, "-" or "_"'
+    elif body.get('templateVersion') is not None:
+        return 'templateVersion requires a templateId'
+    version = body.get('templateVersion')
+    if version is not None and (not isinstance(version, str) or not TEMPLATE_VERSION_PATTERN.match(version)):
+        return 'templateVersion must be 1 to 32 letters, digits, ".", "-" or "_"'
+    return None
+
+def validate_attachments(body):
+    """Return an error message for invalid attachments, None otherwise"""
+    if body.get('attachments') is None:
+        return None
+    attachments = body['attachments']
+    if not isinstance(attachments, list) or not 0 < len(attachments) <= MAX_ATTACHMENTS:
+        return f'attachments must be a list of 1 to {MAX_ATTACHMENTS} attachments'
+    if not PAYLOAD_BUCKET:
+        return 'Attachments are not enabled'
+    if 'recipients' in body or not isinstance(body['to'], str) or 'digestKey' in body:
+        return 'attachments require a single to address and no digestKey'
+    
+    size = 0
+    for attachment in attachments:
+        if (not isinstance(attachment, dict) or not isinstance(attachment.get('filename'), str)
+                or not attachment['filename'] or not isinstance(attachment.get('content'), str)
+                or not isinstance(attachment.get('contentType', ''), str)):
+            return 'Each attachment must be an object with a "filename", base64 "content" and optional "contentType"'
+        try:
+            size += len(base64.b64decode(attachment['content'], validate=True))
+        except (binascii.Error, ValueError):
+            return f"Attachment {attachment['filename']} content must be base64"
+    if size > MAX_ATTACHMENT_BYTES:
+        return f'Attachments must total at most {MAX_ATTACHMENT_BYTES} bytes'
+    return None
+
+def validate_webhook(body):
+    """Return an error message for an invalid webhook notification, None if it is valid"""
+    if not isinstance(body, dict):
+        return 'Webhook must be a JSON object'
+    if not WEBHOOK_QUEUE_URL or not WEBHOOK_ALLOWED_HOSTS:
+        return 'Webhooks are not enabled'
+    missing_fields = [field for field in ('url', 'event') if field not in body]
+    if missing_fields:
+        return f'Missing required fields: {", ".join(missing_fields)}'
+    
+    try:
+        parts = urlsplit(body['url']) if isinstance(body['url'], str) else None
+    except ValueError:
+        parts = None
+    if parts is None or parts.scheme != 'https' or not parts.hostname:
+        return 'url must be an absolute https URL'
+    if parts.hostname.lower() not in WEBHOOK_ALLOWED_HOSTS:
+        return f'Webhook host {parts.hostname} is not allowed'
+    if not isinstance(body['event'], str) or not 0 < len(body['event']) <= MAX_EVENT_LENGTH:
+        return f'event must be a string of 1 to {MAX_EVENT_LENGTH} characters'
+    if len(json.dumps(body.get('data')).encode('utf-8')) > MAX_WEBHOOK_BYTES:
+        return f'data must be at most {MAX_WEBHOOK_BYTES} bytes of JSON'
+    return None
+
+def normalize_recipients(body):
+    """Recipients of a multi-recipient notification as {'to', 'variables'} objects, None for a single address"""
+    if 'recipients' in body:
+        return [
+            {'to': recipient['to'], 'variables': recipient['variables']}
+            if recipient.get('variables') else {'to': recipient['to']}
+            for recipient in body['recipients']
+        ]
+    if isinstance(body['to'], list):
+        return [{'to': address} for address in body['to']]
+    return None
+
+def build_payload(body):
+    """Create the notification message payload enqueued for the mailing function"""
+    payload = {
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'email',
+        'to': body.get('to'),
+        'subject': body['subject'],
+        'message': body['message'],
+        'from': body.get('from'),  # Optional field
+        'buttonText': body.get('buttonText'),  # Optional field
+        'priority': body.get('priority', 'normal'),  # Optional field
+        'status': 'QUEUED'
+    }
+    
+    # Multi-recipient notifications carry a recipients list instead of a single address
+    recipients = normalize_recipients(body)
+    if recipients is not None:
+        del payload['to']
+        payload['recipients'] = recipients
+    
+    # Scheduled notifications carry their due time in UTC; past times are sent right away
+    if body.get('sendAt') is not None:
+        payload['sendAt'] = format_time(parse_send_at(body['sendAt']))
+    
+    # Digest options and template reference, only set when the notification opts in
+    for field in ('digestKey', 'digestWindow', 'digestSubject', 'templateId', 'templateVersion'):
+        if body.get(field) is not None:
+            payload[field] = body[field]
+    
+    return payload
+
+def build_webhook_payload(body):
+    """Create the webhook message payload enqueued for the webhook consumer"""
+    return {
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': 'webhook',
+        'url': body['url'],
+        'event': body['event'],
+        'data': body.get('data'),
+        'priority': 'normal',
+        'status': 'QUEUED'
+    }
+
+def store_attachments(payload, attachments, scheduled=False):
+    """Store the attachments of a notification in S3, listing them in its payload"""
+    payload['attachments'] = [
+        store_attachment(
+            s3_client(), PAYLOAD_BUCKET, payload['id'], index, attachment,
+            base64.b64decode(attachment['content']), scheduled
+        )
+        for index, attachment in enumerate(attachments)
+    ]
+
+def serialize(payload):
+    """Queue body of a payload in the configured wire format"""
+    if WIRE_FORMAT == 'json':
+        return json.dumps(payload)
+    return encode(payload, WIRE_COMPRESS_THRESHOLD)
+
+def message_body(payload, limit, scheduled=False):
+    """Enqueued body of a notification: its payload, or a reference to it if larger than limit bytes"""
+    body = serialize(payload)
+    if not PAYLOAD_BUCKET or len(body.encode('utf-8')) <= limit:
+        return body
+    return serialize(store_payload(s3_client(), PAYLOAD_BUCKET, payload, scheduled))
+
+def delay_seconds(payload):
+    """Seconds until a notification is due, 0 when it is not scheduled or already due"""
+    if 'sendAt' not in payload:
+        return 0
+    send_at = datetime.fromisoformat(payload['sendAt']).replace(tzinfo=timezone.utc)
+    return max(0, int((send_at.timestamp() - time.time()) + 0.5))
+
+def schedule_item(payload):
+    """Table item of a notification due later than SQS can delay it.
+    
+    It is indexed by the minute it is due in (ScheduleIndex) until the
+    scheduler enqueues it, and is the notification status item meanwhile.
+    The scheduler sends payloads in batches of 10, so larger ones are
+    stored as a reference.
+    """
+    send_at = datetime.fromisoformat(payload['sendAt']).replace(tzinfo=timezone.utc)
+    item = {
+        'id': {'S': payload['id']},
+        'timestamp': {'S': payload['timestamp']},
+        'status': {'S': 'SCHEDULED'},
+        'updatedAt': {'S': datetime.utcnow().isoformat()},
+        'subject': {'S': payload['subject']},
+        'sendAt': {'S': payload['sendAt']},
+        'scheduleBucket': {'S': bucket_of(send_at)},
+        'payload': {'S': message_body(payload, CLAIM_CHECK_THRESHOLD // SQS_BATCH_LIMIT, scheduled=True)}
+    }
+    if isinstance(payload.get('to'), str):
+        item['to'] = {'S': payload['to']}
+    return item
+
+def schedule_chunk(chunk, max_attempts=3):
+    """Store up to 25 (index, payload) pairs with one BatchWriteItem call.
+    
+    Returns a result per index: the scheduled time or an error message.
+    """
+    payloads = {payload['id']: (index, payload) for index, payload in chunk}
+    requests = [{'PutRequest': {'Item': schedule_item(payload)}} for _, payload in chunk]
+    error = 'Unprocessed'
+    for attempt in range(max_attempts):
+        if attempt:
+            time.sleep(0.05 * (2 ** (attempt - 1)))
+        try:
+            response = dynamodb_client().batch_write_item(RequestItems={table_name: requests})
+        except Exception as e:
+            logger.error("Error storing scheduled notifications: %s", str(e))
+            error = str(e)
+            continue
+        requests = response.get('UnprocessedItems', {}).get(table_name, [])
+        if not requests:
+            break
+    
+    failed = {request['PutRequest']['Item']['id']['S'] for request in requests}
+    return {
+        index: {'error': error} if payload['id'] in failed else {'sendAt': payload['sendAt']}
+        for index, payload in payloads.values()
+    }
+
+def queue_url(payload):
+    """URL of the queue of the lane a notification is routed to"""
+    return PRIORITY_QUEUE_URL if payload['priority'] == 'high' else QUEUE_URL
+
+def message_attributes(payload):
+    """SQS message attributes of a notification payload"""
+    return {
+        'NotificationType': {
+            'DataType': 'String',
+            'StringValue': payload['type']
+        },
+        'Priority': {
+            'DataType': 'String',
+            'StringValue': payload['priority']
+        }
+    }
+
+def request_details(event):
+    """Small request fields logged with sampled records (never headers or bodies)"""
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return {
+        'sourceIp': identity.get('sourceIp'),
+        'userAgent': identity.get('userAgent'),
+        'bodyLength': len(event.get('body') or '')
+    }
+
+@init_metrics.report_cold_start('api')
 def handler(event, context):
     """Lambda handler function for processing API requests"""
+    message_log = MessageLog(
+        'api',
+        requestId=getattr(context, 'aws_request_id', None),
+        resource=event.get('resource')
+    )
+    message_log.verbose(**request_details(event))
+    
+    if event.get('resource') == BATCH_RESOURCE:
+        response = batch_handler(event, context, message_log)
+    elif event.get('resource') == WEBHOOK_RESOURCE:
+        response = webhook_handler(event, context, message_log)
+    else:
+        response = notification_handler(event, context, message_log)
+    
+    # One structured record per request, in place of logging the whole event
+    message_log.emit(statusCode=response['statusCode'])
+    return response
+
+def notification_handler(event, context, message_log):
+    """Lambda handler function for POST /notify/email"""
     try:
-        logger.info("Received event: %s", json.dumps(event))
-        
         # Parse request body
-        if not event.get('body'):
+        with message_log.stage('parse'):
+            body, error_response = parse_body(event)
+        if error_response:
+            return error_response
+        
+        # Validate required fields
+        with message_log.stage('validate'):
+            error = validate_notification(body)
+        if error:
+            message_log.set(error=error)
             return {
                 'statusCode': 400,
                 'body': json.dumps({
-                    'message': 'Missing request body'
+                    'message': error
                 })
             }
         
-        # Handle different content types
-        body = event.get('body')
-        if isinstance(body, str):
-            try:
-                body = json.loads(body)
-            except json.JSONDecodeError:
-                return {
-                    'statusCode': 400,
-                    'body': json.dumps({
-                        'message': 'Invalid JSON in request body'
-                    })
-                }
+        # Create notification message payload
+        payload = build_payload(body)
+        message_log.set(notificationId=payload['id'], priority=payload['priority'])
+        delay = delay_seconds(payload)
         
-        # Validate required fields
-        required_fields = ['to', 'subject', 'message']
-        missing_fields = [field for field in required_fields if field not in body]
-        if missing_fields:
+        # Attachments are stored in S3, the payload only lists them
+        if body.get('attachments'):
+            with message_log.stage('s3'):
+                store_attachments(payload, body['attachments'], scheduled=delay > MAX_DELAY_SECONDS)
+            message_log.set(attachments=len(payload['attachments']))
+        
+        # Notifications due after the longest SQS delay wait in the table for the scheduler
+        if delay > MAX_DELAY_SECONDS:
+            with message_log.stage('dynamodb'):
+                dynamodb_client().put_item(
+                    TableName=table_name,
+                    Item=schedule_item(payload),
+                    ConditionExpression='attribute_not_exists(id)'
+                )
+            message_log.set(scheduled=True)
             return {
-                'statusCode': 400,
+                'statusCode': 200,
                 'body': json.dumps({
-                    'message': f'Missing required fields: {", ".join(missing_fields)}'
+                    'message': 'Notification scheduled successfully',
+                    'notificationId': payload['id'],
+                    'sendAt': payload['sendAt']
                 })
             }
         
-        # Create notification message payload
-        notification_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-        
-        payload = {
-            'id': notification_id,
-            'timestamp': timestamp,
-            'type': 'email',
-            'to': body['to'],
-            'subject': body['subject'],
-            'message': body['message'],
-            'from': body.get('from'),  # Optional field
-            'buttonText': body.get('buttonText'),  # Optional field for custom button text
-            'status': 'QUEUED'
-        }
+        # Payloads too large for SQS are stored in S3 and enqueued as a reference
+        with message_log.stage('claim_check'):
+            enqueued_body = message_body(payload, CLAIM_CHECK_THRESHOLD)
         
-        # Send message to SQS
-        response = sqs_client.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps(payload),
-            MessageAttributes={
-                'NotificationType': {
-                    'DataType': 'String',
-                    'StringValue': 'email'
-                }
-            }
-        )
+        # Send message to SQS, delayed by SQS itself when due within MAX_DELAY_SECONDS
+        with message_log.stage('sqs'):
+            response = sqs_client().send_message(
+                QueueUrl=queue_url(payload),
+                MessageBody=enqueued_body,
+                MessageAttributes=message_attributes(payload),
+                DelaySeconds=delay
+            )
         
-        logger.info("Successfully sent message to SQS: %s", response['MessageId'])
+        message_log.set(sqsMessageId=response['MessageId'])
         
         # Return success response
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'Notification queued successfully',
-                'notificationId': notification_id,
+                'notificationId': payload['id'],
                 'messageId': response['MessageId']
             })
         }
         
     except Exception as e:
-        logger.error("Error processing notification request: %s", str(e))
+        message_log.error(e)
         return {
             'statusCode': 500,
             'body': json.dumps({
                 'message': f'Error processing notification request: {str(e)}'
             })
         }
+
+def webhook_handler(event, context, message_log):
+    """Lambda handler function for POST /notify/webhook"""
+    try:
+        with message_log.stage('parse'):
+            body, error_response = parse_body(event)
+        if error_response:
+            return error_response
+        
+        with message_log.stage('validate'):
+            error = validate_webhook(body)
+        if error:
+            message_log.set(error=error)
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': error
+                })
+            }
+        
+        # Webhook payloads are small enough for SQS, so they are never claim-checked
+        payload = build_webhook_payload(body)
+        message_log.set(notificationId=payload['id'], event=payload['event'])
+        with message_log.stage('sqs'):
+            response = sqs_client().send_message(
+                QueueUrl=WEBHOOK_QUEUE_URL,
+                MessageBody=serialize(payload),
+                MessageAttributes=message_attributes(payload)
+            )
+        message_log.set(sqsMessageId=response['MessageId'])
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Webhook queued successfully',
+                'notificationId': payload['id'],
+                'messageId': response['MessageId']
+            })
+        }
+        
+    except Exception as e:
+        message_log.error(e)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'message': f'Error processing webhook request: {str(e)}'
+            })
+        }
+
+def send_chunk(chunk):
+    """Enqueue up to 10 (index, payload) pairs of the same lane with one SendMessageBatch call.
+    
+    Returns a result per index: the SQS message id or an error message.
+    """
+    try:
+        response = sqs_client().send_message_batch(
+            QueueUrl=queue_url(chunk[0][1]),
+            Entries=[
+                {
+                    'Id': str(index),
+                    'MessageBody': message_body(payload, CLAIM_CHECK_THRESHOLD // SQS_BATCH_LIMIT),
+                    'MessageAttributes': message_attributes(payload),
+                    'DelaySeconds': delay_seconds(payload)
+                }
+                for index, payload in chunk
+            ]
+        )
+    except Exception as e:
+        logger.error("Error sending message batch to SQS: %s", str(e))
+        return {index: {'error': str(e)} for index, _ in chunk}
+    
+    results = {}
+    for entry in response.get('Successful', []):
+        results[int(entry['Id'])] = {'messageId': entry['MessageId']}
+    for entry in response.get('Failed', []):
+        results[int(entry['Id'])] = {'error': entry.get('Message') or entry['Code']}
+    return results
+
+def batch_handler(event, context, message_log):
+    """Lambda handler function for POST /notify/email/batch"""
+    try:
+        # Parse request body
+        with message_log.stage('parse'):
+            body, error_response = parse_body(event)
+        if error_response:
+            return error_response
+        
+        notifications = body.get('notifications') if isinstance(body, dict) else None
+        if not isinstance(notifications, list) or not notifications:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': 'Request body must contain a non-empty notifications list'
+                })
+            }
+        if len(notifications) > MAX_BATCH_NOTIFICATIONS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': f'A batch accepts at most {MAX_BATCH_NOTIFICATIONS} notifications'
+                })
+            }
+        
+        # Validate every notification in one pass, keeping valid ones for enqueueing
+        results = [None] * len(notifications)
+        valid = []
+        with message_log.stage('validate'):
+            for index, notification in enumerate(notifications):
+                error = validate_notification(notification)
+                if error:
+                    results[index] = {'index': index, 'error': error}
+                else:
+                    valid.append((index, build_payload(notification)))
+        
+        # Attachments are stored in S3 before enqueueing; a notification whose
+        # attachments could not be stored fails alone
+        with message_log.stage('s3'):
+            stored = []
+            for index, payload in valid:
+                attachments = notifications[index].get('attachments')
+                if attachments:
+                    try:
+                        store_attachments(payload, attachments, scheduled=delay_seconds(payload) > MAX_DELAY_SECONDS)
+                    except Exception as e:
+                        logger.error("Error storing attachments: %s", str(e))
+                        results[index] = {'index': index, 'error': str(e)}
+                        continue
+                stored.append((index, payload))
+            valid = stored
+        
+        # Send the valid payloads in chunks of 10 per lane, chunks in parallel;
+        # notifications due after the longest SQS delay are stored for the scheduler
+        lanes = {}
+        scheduled = []
+        for index, payload in valid:
+            if delay_seconds(payload) > MAX_DELAY_SECONDS:
+                scheduled.append((index, payload))
+            else:
+                lanes.setdefault(queue_url(payload), []).append((index, payload))
+        chunks = [
+            lane[i:i + SQS_BATCH_LIMIT]
+            for lane in lanes.values()
+            for i in range(0, len(lane), SQS_BATCH_LIMIT)
+        ]
+        payloads = dict(valid)
+        with message_log.stage('sqs'):
+            for chunk_results in batch_executor.map(send_chunk, chunks):
+                for index, result in chunk_results.items():
+                    if 'messageId' in result:
+                        result = {'notificationId': payloads[index]['id'], **result}
+                    results[index] = {'index': index, **result}
+        
+        schedule_chunks = [
+            scheduled[i:i + BATCH_WRITE_LIMIT] for i in range(0, len(scheduled), BATCH_WRITE_LIMIT)
+        ]
+        with message_log.stage('dynamodb'):
+            for chunk_results in batch_executor.map(schedule_chunk, schedule_chunks):
+                for index, result in chunk_results.items():
+                    if 'sendAt' in result:
+                        result = {'notificationId': payloads[index]['id'], **result}
+                    results[index] = {'index': index, **result}
+        
+        accepted = sum(1 for result in results if 'error' not in result)
+        message_log.set(notifications=len(notifications), queued=accepted, scheduled=len(scheduled))
+        
+        # Per-item results: notificationId and messageId (or sendAt when scheduled), or an error
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': f'Queued {accepted} of {len(notifications)} notifications',
+                'queued': accepted,
+                'failed': len(notifications) - accepted,
+                'results': results
+            })
+        }
+        
+    except Exception as e:
+        message_log.error(e)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'message': f'Error processing notification batch request: {str(e)}'
+            })
+        }
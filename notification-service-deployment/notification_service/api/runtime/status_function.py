@@ -0,0 +1,178 @@
+from notification_common.coldstart import init_metrics
+import base64
+import json
+import os
+import logging
+import uuid
+from notification_common.clients import get_client
+from notification_common.message_log import MessageLog
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+table_name = os.environ['NOTIFICATION_TABLE']
+
+# Global secondary indexes: recipient address and status, both sorted by updatedAt;
+# empty while a stack upgrade has not created the index yet
+RECIPIENT_INDEX = os.environ.get('RECIPIENT_INDEX', 'RecipientIndex')
+STATUS_INDEX = os.environ.get('STATUS_INDEX', 'StatusIndex')
+
+# Page size of the query endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+STATUSES = ('SCHEDULED', 'QUEUED', 'BUFFERED', 'PROCESSING', 'SENT', 'ERROR')
+
+# Attributes returned for each status item
+ITEM_ATTRIBUTES = ('id', 'timestamp', 'to', 'status', 'updatedAt', 'subject', 'sendAt', 'messageId', 'errorMessage')
+
+def dynamodb_client():
+    """DynamoDB client created on first use"""
+    return get_client('dynamodb')
+
+def response(status_code, body):
+    """API Gateway proxy response with a JSON body"""
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body)
+    }
+
+def plain_item(item):
+    """Status item without DynamoDB type descriptors"""
+    return {name: item[name]['S'] for name in ITEM_ATTRIBUTES if name in item}
+
+def encode_cursor(last_evaluated_key):
+    """Opaque pagination cursor for the LastEvaluatedKey of a query"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode()).decode()
+
+def decode_cursor(cursor):
+    """ExclusiveStartKey of a cursor returned by encode_cursor, raising ValueError if malformed"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor') from None
+    if not isinstance(key, dict) or not all(
+        isinstance(value, dict) and list(value) == ['S'] and isinstance(value['S'], str)
+        for value in key.values()
+    ):
+        raise ValueError('Invalid cursor')
+    return key
+
+def page_size(parameters):
+    """limit query string parameter, raising ValueError if out of range"""
+    try:
+        limit = int(parameters.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer') from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+def query_page(parameters, message_log, **query):
+    """Run one page of a query, returning the items and the cursor of the next page"""
+    query['Limit'] = page_size(parameters)
+    if parameters.get('cursor'):
+        query['ExclusiveStartKey'] = decode_cursor(parameters['cursor'])
+    
+    with message_log.stage('dynamodb'):
+        result = dynamodb_client().query(TableName=table_name, **query)
+    items = [plain_item(item) for item in result.get('Items', [])]
+    message_log.set(items=len(items))
+    return items, encode_cursor(result.get('LastEvaluatedKey'))
+
+def get_notification(notification_id, parameters, message_log):
+    """GET /notify/{id}: status of a notification, one item per recipient"""
+    # Notification ids are UUIDs generated by the API; this also keeps internal items out of reach
+    try:
+        uuid.UUID(notification_id)
+    except ValueError:
+        return response(400, {'message': 'Invalid notification id'})
+    message_log.set(notificationId=notification_id)
+    
+    items, cursor = query_page(
+        parameters,
+        message_log,
+        KeyConditionExpression='id = :id',
+        ExpressionAttributeValues={':id': {'S': notification_id}}
+    )
+    if not items and not parameters.get('cursor'):
+        # Nothing is written before the mailing function picks the notification up
+        return response(404, {'message': 'Notification not found, it may still be queued'})
+    
+    statuses = {}
+    for item in items:
+        statuses[item['status']] = statuses.get(item['status'], 0) + 1
+    return response(200, {
+        'notificationId': notification_id,
+        'status': items[0]['status'] if len(items) == 1 and not cursor else None,
+        'statusCounts': statuses,
+        'items': items,
+        'nextCursor': cursor
+    })
+
+def list_notifications(parameters, message_log):
+    """GET /notify?recipient=...&status=...: newest notifications first"""
+    recipient = parameters.get('recipient')
+    status = parameters.get('status')
+    if status is not None and status not in STATUSES:
+        return response(400, {'message': f'status must be one of: {", ".join(STATUSES)}'})
+    message_log.set(byRecipient=recipient is not None, status=status)
+    
+    if (recipient or status) and not (RECIPIENT_INDEX if recipient else STATUS_INDEX):
+        return response(400, {'message': 'This query is not available until its index is deployed'})
+    
+    if recipient:
+        # A recipient partition is small, so the status is filtered within it
+        query = {
+            'IndexName': RECIPIENT_INDEX,
+            'KeyConditionExpression': '#to = :to',
+            'ExpressionAttributeNames': {'#to': 'to'},
+            'ExpressionAttributeValues': {':to': {'S': recipient}}
+        }
+        if status:
+            query['FilterExpression'] = '#status = :status'
+            query['ExpressionAttributeNames']['#status'] = 'status'
+            query['ExpressionAttributeValues'][':status'] = {'S': status}
+    elif status:
+        query = {
+            'IndexName': STATUS_INDEX,
+            'KeyConditionExpression': '#status = :status',
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': {':status': {'S': status}}
+        }
+    else:
+        return response(400, {'message': 'recipient or status query string parameter required'})
+    
+    items, cursor = query_page(parameters, message_log, ScanIndexForward=False, **query)
+    return response(200, {
+        'items': items,
+        'nextCursor': cursor
+    })
+
+@init_metrics.report_cold_start('status')
+def handler(event, context):
+    """Lambda handler function for the notification status endpoints"""
+    message_log = MessageLog(
+        'status',
+        requestId=getattr(context, 'aws_request_id', None),
+        resource=event.get('resource')
+    )
+    parameters = event.get('queryStringParameters') or {}
+    notification_id = (event.get('pathParameters') or {}).get('id')
+    
+    try:
+        if notification_id:
+            result = get_notification(notification_id, parameters, message_log)
+        else:
+            result = list_notifications(parameters, message_log)
+    except ValueError as e:
+        result = response(400, {'message': str(e)})
+    except Exception as e:
+        message_log.error(e)
+        result = response(500, {'message': f'Error reading notification status: {str(e)}'})
+    
+    message_log.emit(statusCode=result['statusCode'])
+    return result
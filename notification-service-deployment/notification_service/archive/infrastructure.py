@@ -0,0 +1,104 @@
+import os
+from typing import Optional
+from aws_cdk import (
+    Duration,
+    aws_lambda as lambda_,
+    aws_dynamodb as dynamodb,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_s3 as s3,
+    aws_sqs as sqs,
+    aws_logs as logs,
+    RemovalPolicy,
+    CfnOutput,
+)
+from constructs import Construct
+
+
+class ArchiveComponent(Construct):
+    """S3 archive of the notification statuses expired from the table by TTL"""
+
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        notification_table: dynamodb.Table, 
+        shared_layer: lambda_.ILayerVersion, 
+        archive_retention: Optional[Duration] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(scope, id)
+        
+        # Bucket holding gzip JSON Lines objects partitioned by date (year=/month=/day=),
+        # queryable in place with Athena; objects move to cheaper storage classes as they age
+        lifecycle_rule = s3.LifecycleRule(
+            transitions=[
+                s3.Transition(
+                    storage_class=s3.StorageClass.INFREQUENT_ACCESS,
+                    transition_after=Duration.days(30)
+                ),
+                s3.Transition(
+                    storage_class=s3.StorageClass.GLACIER_INSTANT_RETRIEVAL,
+                    transition_after=Duration.days(180)
+                )
+            ],
+            expiration=archive_retention  # None keeps the history forever
+        )
+        self.bucket = s3.Bucket(
+            self, "NotificationArchive",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            lifecycle_rules=[lifecycle_rule],
+            removal_policy=RemovalPolicy.RETAIN,  # The archive outlives the stack
+        )
+        
+        # Lambda function writing the expired items streamed from the table to the bucket
+        self.lambda_function = lambda_.Function(
+            self, "ArchiveHandler",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
+            handler="lambda_function.handler",
+            layers=[shared_layer],  # notification_common modules
+            environment={
+                "ARCHIVE_BUCKET": self.bucket.bucket_name,
+                "ARCHIVE_PREFIX": "notifications",
+            },
+            timeout=Duration.seconds(60),
+            memory_size=256,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        # Grant permission to write archive objects
+        self.bucket.grant_put(self.lambda_function)
+        
+        # Batches still failing after the retries; a message only locates the records (shard and
+        # sequence numbers), which must be read back from the stream within its 24-hour retention
+        self.failure_queue = sqs.Queue(
+            self, "ArchiveFailureQueue",
+            retention_period=Duration.days(14),  # Keep failed batches for 14 days
+            encryption=sqs.QueueEncryption.SQS_MANAGED,  # Enable encryption
+        )
+        
+        # Only deletions made by the TTL process are archived, in batches of up to 1000 items
+        self.lambda_function.add_event_source(lambda_event_sources.DynamoEventSource(
+            notification_table,
+            starting_position=lambda_.StartingPosition.TRIM_HORIZON,
+            batch_size=1000,
+            max_batching_window=Duration.seconds(60),  # Gather expired items for up to a minute
+            bisect_batch_on_error=True,  # Isolate a failing record instead of blocking the shard
+            retry_attempts=10,
+            on_failure=lambda_event_sources.SqsDlq(self.failure_queue),  # Rather than dropping the batch
+            filters=[
+                lambda_.FilterCriteria.filter({
+                    "eventName": lambda_.FilterRule.is_equal("REMOVE"),
+                    "userIdentity": {
+                        "type": lambda_.FilterRule.is_equal("Service"),
+                        "principalId": lambda_.FilterRule.is_equal("dynamodb.amazonaws.com")
+                    }
+                })
+            ]
+        ))
+        
+        # Outputs
+        CfnOutput(self, "ArchiveBucketName", value=self.bucket.bucket_name)
+        CfnOutput(self, "ArchiveFailureQueueUrl", value=self.failure_queue.queue_url)
@@ -0,0 +1,80 @@
+from notification_common.coldstart import init_metrics
+import gzip
+import json
+import os
+import logging
+from notification_common.clients import get_client
+from notification_common.metrics import emit_metrics
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ARCHIVE_BUCKET = os.environ['ARCHIVE_BUCKET']
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'notifications')
+
+def s3_client():
+    """S3 client created on first use"""
+    return get_client('s3')
+
+def plain_value(value):
+    """Python value of a DynamoDB typed attribute value"""
+    (kind, data), = value.items()
+    if kind == 'N':
+        return float(data) if any(c in data for c in '.eE') else int(data)
+    if kind == 'M':
+        return {name: plain_value(item) for name, item in data.items()}
+    if kind == 'L':
+        return [plain_value(item) for item in data]
+    if kind in ('SS', 'NS', 'BS'):
+        return sorted(data)
+    if kind == 'NULL':
+        return None
+    return data  # S, B (base64 text) and BOOL
+
+def partition(item):
+    """Date partition of an archived item, from the notification timestamp (ISO 8601, UTC)"""
+    timestamp = item.get('timestamp', '')
+    if len(timestamp) < 10 or timestamp[4] != '-' or timestamp[7] != '-':
+        return 'year=unknown'
+    return f'year={timestamp[0:4]}/month={timestamp[5:7]}/day={timestamp[8:10]}'
+
+def archive_key(partition_path, records):
+    """Object key of a batch; derived from the stream sequence numbers so retried batches overwrite it"""
+    first = records[0]['dynamodb']['SequenceNumber']
+    last = records[-1]['dynamodb']['SequenceNumber']
+    return f'{ARCHIVE_PREFIX}/{partition_path}/{first}-{last}.jsonl.gz'
+
+@init_metrics.report_cold_start('archive')
+def handler(event, context):
+    """Write the items expired from the notification table to S3 as gzip JSON Lines, one object per date"""
+    # The event source only passes TTL deletions, which carry the item as OldImage
+    partitions = {}
+    for record in event.get('Records', []):
+        old_image = record.get('dynamodb', {}).get('OldImage')
+        if not old_image:
+            continue
+        item = {name: plain_value(value) for name, value in old_image.items()}
+        partition_path = partition(item)
+        lines, records = partitions.setdefault(partition_path, ([], []))
+        lines.append(json.dumps(item, separators=(',', ':')))
+        records.append(record)
+    
+    # A failure raises so the stream batch is retried; objects already written are overwritten
+    for partition_path, (lines, records) in partitions.items():
+        s3_client().put_object(
+            Bucket=ARCHIVE_BUCKET,
+            Key=archive_key(partition_path, records),
+            Body=gzip.compress(('\n'.join(lines) + '\n').encode('utf-8')),
+            ContentType='application/x-ndjson',
+            ContentEncoding='gzip'
+        )
+    
+    archived = sum(len(lines) for lines, _ in partitions.values())
+    logger.info("Archived %d expired notifications in %d objects", archived, len(partitions))
+    emit_metrics(
+        {'ArchivedItems': archived, 'ArchiveObjects': len(partitions)},
+        dimensions={'Function': 'archive'},
+        units={'ArchivedItems': 'Count', 'ArchiveObjects': 'Count'}
+    )
+    return {'archived': archived}
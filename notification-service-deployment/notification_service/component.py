@@ -1,22 +1,58 @@
+from typing import Optional, Sequence
 from aws_cdk import (
+    Duration,
     Stack,
     aws_dynamodb as dynamodb,
+    aws_s3 as s3,
     RemovalPolicy,
     CfnOutput,
 )
 from constructs import Construct
+from .shared.infrastructure import SharedRuntimeComponent
 from .api.infrastructure import ApiComponent
 from .queue.infrastructure import QueueComponent
 from .mailing.infrastructure import MailingComponent
+from .archive.infrastructure import ArchiveComponent
+from .scheduler.infrastructure import SchedulerComponent
+from .webhook.infrastructure import WebhookComponent
+from .mailing.profiles import get_profile
 from .monitoring.infrastructure import MonitoringComponent
 
+# Global secondary indexes of the notification table, in the order they were introduced.
+# DynamoDB creates one index per table update, so a stack deployed before them must add
+# them one deploy at a time (table_indexes 1, 2, ...); a new table gets them all at once
+TABLE_INDEXES = ("RecipientIndex", "StatusIndex", "ScheduleIndex")
+
 
 class NotificationServiceComponent(Construct):
     """Main component for the notification service"""
 
-    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        delivery_profile: str = "balanced",
+        priority_delivery_profile: str = "latency",
+        ingestion: str = "lambda",
+        max_schedule_days: int = 365,
+        payload_retention: Duration = Duration.days(15),
+        webhook_allowed_hosts: Sequence[str] = (),
+        table_indexes: Optional[int] = None,
+        **kwargs
+    ) -> None:
         super().__init__(scope, id)
         
+        # Indexes of the notification table deployed so far (all of them by default)
+        if table_indexes is None:
+            table_indexes = len(TABLE_INDEXES)
+        if not 0 <= table_indexes <= len(TABLE_INDEXES):
+            raise ValueError(f"table_indexes must be between 0 and {len(TABLE_INDEXES)}")
+        indexes = set(TABLE_INDEXES[:table_indexes])
+        
+        # Delivery profiles of the bulk and priority lanes (see mailing/profiles.py)
+        profile = get_profile(delivery_profile)
+        priority_profile = get_profile(priority_delivery_profile)
+        
         # Create the notification tracking table
         self.notification_table = dynamodb.Table(
             self, "NotificationTable",
@@ -29,20 +65,112 @@ class NotificationServiceComponent(Construct):
                 type=dynamodb.AttributeType.STRING
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,  # Stays within free tier for small volumes
+            time_to_live_attribute="expiresAt",  # Set by the mailing function from the status retention
+            stream=dynamodb.StreamViewType.OLD_IMAGE,  # Expired items are streamed to the archive
             removal_policy=RemovalPolicy.DESTROY,  # Use RETAIN in production
         )
         
+        # Indexes of the status endpoints, so lookups by recipient or status are single-partition
+        # queries; items without the index keys (e.g. the send rate bucket) are left out
+        for index_name, partition_key in (("RecipientIndex", "to"), ("StatusIndex", "status")):
+            if index_name not in indexes:
+                continue
+            self.notification_table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(
+                    name=partition_key,
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="updatedAt",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=[
+                    name for name in ("to", "status", "subject", "messageId", "errorMessage")
+                    if name != partition_key
+                ]
+            )
+        
+        # Index of the notifications scheduled beyond the SQS delay, by the minute they are due in;
+        # the scheduler removes the bucket once a notification is enqueued, which drops it from the index
+        if "ScheduleIndex" in indexes:
+            self.notification_table.add_global_secondary_index(
+                index_name="ScheduleIndex",
+                partition_key=dynamodb.Attribute(
+                    name="scheduleBucket",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="sendAt",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.INCLUDE,
+                non_key_attributes=["status", "payload"]
+            )
+        
+        if payload_retention.to_days() < 14:
+            raise ValueError("payload_retention must cover the 14-day dead-letter queue retention")
+        
+        # Bucket of the payloads too large for SQS and of the attachments (claim check); objects
+        # must outlive the messages referencing them, including in the 14-day dead-letter queue,
+        # and those of scheduled notifications must outlive the furthest sendAt as well
+        self.payload_bucket = s3.Bucket(
+            self, "PayloadBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            lifecycle_rules=[
+                s3.LifecycleRule(prefix="payloads/", expiration=payload_retention),
+                s3.LifecycleRule(prefix="attachments/", expiration=payload_retention),
+                s3.LifecycleRule(
+                    prefix="scheduled/",
+                    expiration=Duration.days(max_schedule_days + payload_retention.to_days())
+                ),
+            ],
+            removal_policy=RemovalPolicy.DESTROY,  # Only holds messages in flight
+        )
+        
+        # Bucket of the email templates referenced by templateId, as templates/<templateId>/<version>.json;
+        # versioned so an overwritten latest.json can be restored
+        self.template_bucket = s3.Bucket(
+            self, "TemplateBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            versioned=True,
+            removal_policy=RemovalPolicy.RETAIN,  # Designs are not derived from anything else
+        )
+        
+        # Create the layer with the runtime modules shared by the Lambda functions
+        self.shared_runtime_component = SharedRuntimeComponent(
+            self, 
+            "SharedRuntimeComponent",
+        )
+        
         # Create the queue component first (other components depend on it)
         self.queue_component = QueueComponent(
             self, 
             "QueueComponent",
+            visibility_timeout=profile.visibility_timeout,
+            priority_visibility_timeout=priority_profile.visibility_timeout
         )
         
         # Create the API component
         self.api_component = ApiComponent(
             self, 
             "ApiComponent", 
-            notification_queue=self.queue_component.notification_queue
+            notification_queue=self.queue_component.notification_queue,
+            priority_queue=self.queue_component.priority_queue,
+            notification_table=self.notification_table,
+            shared_layer=self.shared_runtime_component.layer,
+            payload_bucket=self.payload_bucket,
+            max_schedule_days=max_schedule_days,
+            ingestion=ingestion,
+            webhook_queue=self.queue_component.webhook_queue,
+            webhook_allowed_hosts=webhook_allowed_hosts,
+            recipient_index="RecipientIndex" if "RecipientIndex" in indexes else None,
+            status_index="StatusIndex" if "StatusIndex" in indexes else None
         )
         
         # Create the mailing component
@@ -50,7 +178,44 @@ class NotificationServiceComponent(Construct):
             self, 
             "MailingComponent", 
             notification_queue=self.queue_component.notification_queue,
-            notification_table=self.notification_table
+            priority_queue=self.queue_component.priority_queue,
+            notification_table=self.notification_table,
+            shared_layer=self.shared_runtime_component.layer,
+            payload_bucket=self.payload_bucket,
+            dead_letter_queue=self.queue_component.dlq,
+            template_bucket=self.template_bucket,
+            profile=profile,
+            priority_profile=priority_profile
+        )
+        
+        # Create the webhook consumer, with its own queue, keep-alive connections and signing secret
+        self.webhook_component = WebhookComponent(
+            self, 
+            "WebhookComponent", 
+            webhook_queue=self.queue_component.webhook_queue,
+            notification_table=self.notification_table,
+            shared_layer=self.shared_runtime_component.layer,
+            dead_letter_queue=self.queue_component.dlq,
+            allowed_hosts=webhook_allowed_hosts
+        )
+        
+        # Create the scheduler releasing the notifications stored for later
+        self.scheduler_component = SchedulerComponent(
+            self, 
+            "SchedulerComponent", 
+            notification_queue=self.queue_component.notification_queue,
+            priority_queue=self.queue_component.priority_queue,
+            notification_table=self.notification_table,
+            shared_layer=self.shared_runtime_component.layer,
+            schedule_index="ScheduleIndex" if "ScheduleIndex" in indexes else None
+        )
+        
+        # Create the archive of the statuses expired from the table
+        self.archive_component = ArchiveComponent(
+            self, 
+            "ArchiveComponent", 
+            notification_table=self.notification_table,
+            shared_layer=self.shared_runtime_component.layer
         )
         
         # Create the monitoring component
@@ -60,12 +225,16 @@ class NotificationServiceComponent(Construct):
             api_component=self.api_component,
             queue_component=self.queue_component,
             mailing_component=self.mailing_component,
-            notification_table=self.notification_table
+            archive_component=self.archive_component,
+            scheduler_component=self.scheduler_component,
+            notification_table=self.notification_table,
+            webhook_component=self.webhook_component
         )
         
         # Output important resources
         CfnOutput(self, "ApiEndpoint", value=self.api_component.api_endpoint)
         CfnOutput(self, "ApiKey", value=self.api_component.api_key.key_id)
+        CfnOutput(self, "TemplateBucketName", value=self.template_bucket.bucket_name)
         
 
 class NotificationServiceStack(Stack):
@@ -74,8 +243,21 @@ class NotificationServiceStack(Stack):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
         
+        # Number of TABLE_INDEXES to deploy, e.g. -c tableIndexes=1 for the first step of an upgrade
+        table_indexes = self.node.try_get_context("tableIndexes")
+        
         # Create the notification service component
+        # Delivery profiles can be chosen at synth time, e.g. cdk deploy -c deliveryProfile=throughput,
+        # and so can the ingestion mode of POST /notify/email, e.g. -c ingestion=direct, and the
+        # hosts webhooks may be sent to, e.g. -c webhookAllowedHosts=hooks.example.com,api.example.org
         self.notification_service = NotificationServiceComponent(
             self, 
-            "NotificationService"
+            "NotificationService",
+            delivery_profile=self.node.try_get_context("deliveryProfile") or "balanced",
+            priority_delivery_profile=self.node.try_get_context("priorityDeliveryProfile") or "latency",
+            ingestion=self.node.try_get_context("ingestion") or "lambda",
+            webhook_allowed_hosts=[
+                host for host in (self.node.try_get_context("webhookAllowedHosts") or "").split(",") if host
+            ],
+            table_indexes=None if table_indexes is None else int(table_indexes)
         )
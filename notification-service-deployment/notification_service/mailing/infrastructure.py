@@ -1,4 +1,6 @@
+import json
 import os
+from typing import Dict, Optional, Union
 from aws_cdk import (
     Duration,
     aws_lambda as lambda_,
@@ -8,52 +10,205 @@ from aws_cdk import (
     aws_iam as iam,
     aws_ses as ses,
     aws_logs as logs,
+    aws_s3 as s3,
     CfnOutput,
 )
 from constructs import Construct
+from .profiles import DeliveryProfile, get_profile
+
+# Concurrent executions of an account by default, the most containers a lane without limits can run
+DEFAULT_ACCOUNT_CONCURRENCY = 1000
 
 
 class MailingComponent(Construct):
     """SES mailing component for notification service"""
 
-    def __init__(self, scope: Construct, id: str, notification_queue: sqs.Queue, notification_table: dynamodb.Table, **kwargs) -> None:
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        notification_queue: sqs.Queue, 
+        priority_queue: sqs.Queue, 
+        notification_table: dynamodb.Table, 
+        shared_layer: lambda_.ILayerVersion, 
+        payload_bucket: s3.IBucket, 
+        profile: Union[str, DeliveryProfile] = "balanced",
+        priority_profile: Union[str, DeliveryProfile] = "latency",
+        claim_writes: bool = True,
+        idempotency_cache_size: int = 10000,
+        ses_send_rate: float = 14,
+        ses_rate_lease_size: int = 5,
+        priority_reserved_concurrency: Optional[int] = 2,
+        log_sample_rate: float = 0.01,
+        digest_window: Duration = Duration.minutes(5),
+        status_retention: Optional[Dict[str, Duration]] = None,
+        dead_letter_queue: Optional[sqs.IQueue] = None,
+        retry_base_delay: Duration = Duration.seconds(5),
+        retry_max_delay: Duration = Duration.minutes(5),
+        template_bucket: Optional[s3.IBucket] = None,
+        template_registry_size: int = 32,
+        template_revalidate_interval: Duration = Duration.minutes(1),
+        **kwargs
+    ) -> None:
         super().__init__(scope, id)
         
+        # Resolve the delivery profile of each lane and reject settings that cannot work together
+        self.profile = get_profile(profile)
+        self.priority_profile = get_profile(priority_profile)
+        self.profile.validate(ses_send_rate=ses_send_rate)
+        self.priority_profile.validate(
+            ses_send_rate=ses_send_rate,
+            reserved_concurrency=priority_reserved_concurrency
+        )
+        self._check_visibility_timeout(notification_queue, self.profile)
+        self._check_visibility_timeout(priority_queue, self.priority_profile)
+        
+        # Digest flushes are delayed SQS messages, which SQS delays by 15 minutes at most
+        if not 60 <= digest_window.to_seconds() <= 900:
+            raise ValueError("digest_window must be between 1 and 15 minutes")
+        
+        # Retries are delayed with ChangeMessageVisibility, which allows 12 hours at most
+        if not 0 < retry_base_delay.to_seconds() <= retry_max_delay.to_seconds() <= 43200:
+            raise ValueError("retry delays must satisfy 0 < retry_base_delay <= retry_max_delay <= 12 hours")
+        
+        # Time each status stays in the table before expiring into the archive
+        if status_retention is None:
+            status_retention = {
+                "SENT": Duration.days(30),
+                "ERROR": Duration.days(90),
+                "PROCESSING": Duration.days(7),  # Claims left by interrupted deliveries
+            }
+        
+        # Environment shared by the bulk and priority lane functions
+        environment = {
+            "NOTIFICATION_TABLE": notification_table.table_name,
+            "STATUS_CLAIM_WRITES": str(claim_writes).lower(),  # Conditional claim before each send
+            "IDEMPOTENCY_CACHE_SIZE": str(idempotency_cache_size),  # Sent ids remembered per container
+            "SES_SEND_RATE": str(ses_send_rate),  # Account-wide emails per second, 0 disables the limiter
+            "SES_RATE_LEASE_SIZE": str(ses_rate_lease_size),  # Send tokens leased per DynamoDB round-trip
+            "SES_FALLBACK_RATE": str(ses_send_rate / (  # Per-container pacing while the bucket is unreachable
+                self._max_containers(self.profile)
+                + self._max_containers(self.priority_profile, priority_reserved_concurrency)
+            )),
+            "LOG_SAMPLE_RATE": str(log_sample_rate),  # Messages logged with their verbose fields
+            "DIGEST_WINDOW": str(int(digest_window.to_seconds())),  # Default coalescing window of digestKey
+            "RETRY_BASE_DELAY": str(int(retry_base_delay.to_seconds())),  # Backoff of the first retry, doubled per receive
+            "RETRY_MAX_DELAY": str(int(retry_max_delay.to_seconds())),  # Longest backoff between receives
+            "STATUS_RETENTION": json.dumps({  # Seconds before each status expires (TTL)
+                status: int(retention.to_seconds()) for status, retention in status_retention.items()
+            }),
+        }
+        if dead_letter_queue:
+            environment["DEAD_LETTER_QUEUE_URL"] = dead_letter_queue.queue_url  # Permanent failures, moved at once
+        if template_bucket:
+            environment.update({
+                "TEMPLATE_BUCKET": template_bucket.bucket_name,  # Layouts referenced by templateId
+                "TEMPLATE_REGISTRY_SIZE": str(template_registry_size),  # Compiled layouts kept per container
+                "TEMPLATE_REVALIDATE_SECONDS": str(int(template_revalidate_interval.to_seconds())),  # Latest versions
+            })
+        
         # Lambda function to process messages from SQS and send emails via SES
-        self.lambda_function = lambda_.Function(
-            self, "MailingHandler",
+        self.lambda_function = self._create_function(
+            "MailingHandler",
+            shared_layer,
+            {**environment, "DIGEST_QUEUE_URL": notification_queue.queue_url},  # Digest flushes
+            self.profile
+        )
+        
+        # Lambda function of the priority lane: same code, but a separate function so its
+        # reserved concurrency keeps containers available however large the bulk backlog is
+        self.priority_function = self._create_function(
+            "PriorityMailingHandler",
+            shared_layer,
+            {**environment, "DIGEST_QUEUE_URL": priority_queue.queue_url},  # Digest flushes
+            self.priority_profile,
+            reserved_concurrent_executions=priority_reserved_concurrency
+        )
+        
+        for function, queue in ((self.lambda_function, notification_queue), (self.priority_function, priority_queue)):
+            # Grant permissions to the Lambda function
+            notification_table.grant_read_write_data(function)
+            queue.grant_send_messages(function)  # Delayed digest flush messages
+            payload_bucket.grant_read(function)  # Large payloads and attachments stored by the API
+            if dead_letter_queue:
+                dead_letter_queue.grant_send_messages(function)  # Permanent failures
+            if template_bucket:
+                template_bucket.grant_read(function, "templates/*")  # Email layouts
+            
+            # Grant SES permissions to Lambda
+            function.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=[
+                        "ses:SendEmail",
+                        "ses:SendRawEmail",
+                        # Multi-recipient notifications with per-recipient variables,
+                        # through one template per email layout
+                        "ses:SendBulkTemplatedEmail",
+                        "ses:CreateTemplate"
+                    ],
+                    resources=["*"]  # In production, scope this to specific resources
+                )
+            )
+        
+        # Bulk lane and priority lane (latency profile by default) event sources
+        self.lambda_function.add_event_source(self._event_source(notification_queue, self.profile))
+        self.priority_function.add_event_source(self._event_source(priority_queue, self.priority_profile))
+        
+        # Output lambda ARNs
+        CfnOutput(self, "MailingLambdaArn", value=self.lambda_function.function_arn)
+        CfnOutput(self, "PriorityMailingLambdaArn", value=self.priority_function.function_arn)
+
+    def _create_function(
+        self, 
+        id: str, 
+        shared_layer: lambda_.ILayerVersion, 
+        environment: dict, 
+        profile: DeliveryProfile, 
+        reserved_concurrent_executions: Optional[int] = None,
+    ) -> lambda_.Function:
+        """Create a mailing function running the shared mailing runtime with the settings of a profile"""
+        return lambda_.Function(
+            self, id,
             runtime=lambda_.Runtime.PYTHON_3_9,
             code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
             handler="lambda_function.handler",
+            layers=[shared_layer],  # notification_common modules
             environment={
-                "NOTIFICATION_TABLE": notification_table.table_name,
+                **environment,
+                "DELIVERY_CONCURRENCY": str(profile.delivery_concurrency),  # Records of a batch sent in parallel
+                "STATUS_CLAIM_LEASE": str(profile.timeout),  # A claim outlives the invocation that made it
             },
-            timeout=Duration.seconds(30),
-            memory_size=256,
+            reserved_concurrent_executions=reserved_concurrent_executions,
+            timeout=Duration.seconds(profile.timeout),
+            memory_size=profile.memory_size,
             log_retention=logs.RetentionDays.ONE_WEEK,
         )
-        
-        # Grant permissions to the Lambda function
-        notification_table.grant_read_write_data(self.lambda_function)
-        
-        # Add SQS event source to Lambda
-        self.lambda_function.add_event_source(lambda_event_sources.SqsEventSource(
-            notification_queue,
-            batch_size=5,  # Process up to 5 messages at a time
-            max_batching_window=Duration.seconds(30),  # Wait up to 30 seconds to gather batch
+
+    @staticmethod
+    def _max_containers(profile: DeliveryProfile, reserved_concurrency: Optional[int] = None) -> int:
+        """Most containers of a lane running at once, which share the SES rate when pacing locally"""
+        limits = [limit for limit in (profile.max_concurrency, reserved_concurrency) if limit is not None]
+        return min(limits) if limits else DEFAULT_ACCOUNT_CONCURRENCY
+
+    @staticmethod
+    def _event_source(queue: sqs.Queue, profile: DeliveryProfile) -> lambda_event_sources.SqsEventSource:
+        """SQS event source with the batching and concurrency of a profile"""
+        return lambda_event_sources.SqsEventSource(
+            queue,
+            batch_size=profile.batch_size,
+            max_batching_window=Duration.seconds(profile.max_batching_window),
+            max_concurrency=profile.max_concurrency,
             report_batch_item_failures=True,  # Enable partial batch responses
-        ))
-        
-        # Grant SES permissions to Lambda
-        self.lambda_function.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "ses:SendEmail",
-                    "ses:SendRawEmail"
-                ],
-                resources=["*"]  # In production, scope this to specific resources
-            )
         )
-        
-        # Output lambda ARN
-        CfnOutput(self, "MailingLambdaArn", value=self.lambda_function.function_arn)
+
+    @staticmethod
+    def _check_visibility_timeout(queue: sqs.Queue, profile: DeliveryProfile) -> None:
+        """Reject a queue that could redeliver messages still being processed with this profile"""
+        cfn_queue = queue.node.default_child
+        visibility_timeout = getattr(cfn_queue, "visibility_timeout", None)
+        required = profile.visibility_timeout.to_seconds()
+        if visibility_timeout is not None and visibility_timeout < required:
+            raise ValueError(
+                f"Queue {queue.node.path} has a visibility timeout of {visibility_timeout}s, "
+                f"delivery profile '{profile.name}' needs at least {required}s"
+            )
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Optional
+from aws_cdk import Duration
+
+
+# SQS must keep a message invisible for at least six times the function timeout plus
+# the batching window, so retries of a throttled invocation do not cause redeliveries
+VISIBILITY_TIMEOUT_MULTIPLE = 6
+
+# Rough time budget of one SES call (with its status write) used by the consistency check
+SEND_SECONDS_ESTIMATE = 0.5
+
+
+@dataclass(frozen=True)
+class DeliveryProfile:
+    """Event source and function settings of a mailing lane, tuned as a whole"""
+
+    name: str
+    batch_size: int  # Messages per invocation
+    max_batching_window: int  # Seconds to wait for a batch to fill up
+    max_concurrency: Optional[int]  # Concurrent invocations of the event source, None for no limit
+    delivery_concurrency: int  # Records of a batch sent in parallel
+    memory_size: int  # MB
+    timeout: int  # Seconds
+
+    @property
+    def visibility_timeout(self) -> Duration:
+        """Smallest safe visibility timeout of the queue consumed with this profile"""
+        return Duration.seconds(VISIBILITY_TIMEOUT_MULTIPLE * self.timeout + self.max_batching_window)
+
+    def validate(self, ses_send_rate: float = 0, reserved_concurrency: Optional[int] = None) -> None:
+        """Raise ValueError when the settings cannot work together"""
+        errors = []
+        if not 1 <= self.batch_size <= 10000:
+            errors.append("batch_size must be between 1 and 10000")
+        if not 0 <= self.max_batching_window <= 300:
+            errors.append("max_batching_window must be between 0 and 300 seconds")
+        if self.batch_size > 10 and self.max_batching_window < 1:
+            errors.append("a batch_size above 10 needs a max_batching_window of at least 1 second")
+        if self.max_concurrency is not None and not 2 <= self.max_concurrency <= 1000:
+            errors.append("max_concurrency must be between 2 and 1000")
+        if (self.max_concurrency is not None and reserved_concurrency is not None
+                and self.max_concurrency > reserved_concurrency):
+            errors.append("max_concurrency above the reserved concurrency would throttle the event source")
+        if not 1 <= self.delivery_concurrency <= 64:
+            errors.append("delivery_concurrency must be between 1 and 64")
+        if not 128 <= self.memory_size <= 10240:
+            errors.append("memory_size must be between 128 and 10240 MB")
+        if not 1 <= self.timeout <= 900:
+            errors.append("timeout must be between 1 and 900 seconds")
+
+        # A full batch must be delivered well within the timeout, including the
+        # time the shared SES rate limit can make it wait
+        rounds = -(-self.batch_size // self.delivery_concurrency)
+        batch_seconds = rounds * SEND_SECONDS_ESTIMATE
+        if ses_send_rate > 0:
+            batch_seconds = max(batch_seconds, self.batch_size / ses_send_rate)
+        if 2 * batch_seconds > self.timeout:
+            errors.append(
+                f"a full batch takes about {batch_seconds:.1f}s, "
+                f"more than half of the {self.timeout}s timeout"
+            )
+
+        if errors:
+            raise ValueError(f"Inconsistent delivery profile '{self.name}': {'; '.join(errors)}")
+
+
+DELIVERY_PROFILES = {
+    # Deliver each message as soon as it arrives
+    "latency": DeliveryProfile(
+        name="latency",
+        batch_size=1,
+        max_batching_window=0,
+        max_concurrency=None,
+        delivery_concurrency=1,
+        memory_size=256,
+        timeout=15,
+    ),
+    # Small batches gathered for at most a couple of seconds
+    "balanced": DeliveryProfile(
+        name="balanced",
+        batch_size=10,
+        max_batching_window=2,
+        max_concurrency=5,
+        delivery_concurrency=5,
+        memory_size=256,
+        timeout=30,
+    ),
+    # Large batches from few containers, fewest invocations per message
+    "throughput": DeliveryProfile(
+        name="throughput",
+        batch_size=100,
+        max_batching_window=20,
+        max_concurrency=3,
+        delivery_concurrency=10,
+        memory_size=512,
+        timeout=120,
+    ),
+}
+
+
+def get_profile(profile) -> DeliveryProfile:
+    """Resolve a profile name (or return a DeliveryProfile as is)"""
+    if isinstance(profile, DeliveryProfile):
+        return profile
+    try:
+        return DELIVERY_PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"Unknown delivery profile '{profile}', expected one of: {', '.join(DELIVERY_PROFILES)}"
+        ) from None
@@ -0,0 +1,167 @@
+import hashlib
+import html
+import json
+import logging
+import re
+import threading
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# SES accepts at most 50 destinations per email and per bulk call
+MAX_DESTINATIONS = 50
+
+# Per-recipient placeholders of the subject and message, e.g. {{name}}
+VARIABLE_PATTERN = re.compile(r'{{\s*(\w+)\s*}}')
+
+# Template data inserted as markup in the HTML part, where variables are escaped
+HTML_FIELDS = ('paragraphs', 'buttons')
+
+
+def recipient_body(body, address):
+    """Per-recipient view of a multi-recipient notification.
+    
+    Recipients share the notification id; their status items are told apart
+    by the sort key, so all of them are found with one query on the id.
+    """
+    return {**body, 'timestamp': f"{body['timestamp']}#{address}", 'to': address}
+
+
+def chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def send_bcc_chunks(ses, from_email, subject, message, html_content, addresses,
+                    chunk_size=MAX_DESTINATIONS, before_send=None):
+    """Send one rendered email to many addresses, in BCC so recipients stay private.
+    
+    Returns (address, ses_message_id, error) per address; every address of a
+    chunk shares the chunk's SES message id or error.
+    """
+    results = []
+    for chunk in chunks(addresses, chunk_size):
+        try:
+            if before_send:
+                before_send(len(chunk))
+            response = ses.send_email(
+                Source=from_email,
+                Destination={
+                    'BccAddresses': chunk
+                },
+                Message={
+                    'Subject': {
+                        'Data': subject
+                    },
+                    'Body': {
+                        'Text': {
+                            'Data': message
+                        },
+                        'Html': {
+                            'Data': html_content
+                        }
+                    }
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error sending email to {len(chunk)} recipients: {str(e)}")
+            results.extend((address, None, str(e)) for address in chunk)
+        else:
+            results.extend((address, response['MessageId'], None) for address in chunk)
+    return results
+
+
+class LayoutTemplates:
+    """SES templates of the email layouts, one per layout, registered once per container.
+    
+    A template only holds the layout and placeholders for the subject, text,
+    paragraphs and buttons, which every email passes as template data, so
+    its name is derived from its content and it is never updated. Creating
+    templates is throttled by SES and their number is capped, hence one per
+    layout rather than one per notification.
+    """
+
+    def __init__(self, prefix='notification-layout'):
+        self.prefix = prefix
+        self._registered = set()
+        self._lock = threading.Lock()
+
+    def register(self, ses, layout):
+        """Name of the template of a layout, created on first use by any container"""
+        template = {
+            'SubjectPart': '{{{subject}}}',
+            'TextPart': '{{{message}}}',
+            'HtmlPart': layout.handlebars
+        }
+        digest = hashlib.sha256(json.dumps(template, sort_keys=True).encode()).hexdigest()[:16]
+        template['TemplateName'] = f"{self.prefix}-{digest}"
+        with self._lock:
+            if template['TemplateName'] in self._registered:
+                return template['TemplateName']
+        
+        try:
+            ses.create_template(Template=template)
+        except ClientError as e:
+            # Created by another container; the name pins the content
+            if e.response['Error']['Code'] != 'AlreadyExists':
+                raise
+        with self._lock:
+            self._registered.add(template['TemplateName'])
+        return template['TemplateName']
+
+
+def substitute(text, variables, escape=str):
+    """Replace the {{name}} placeholders of a text with a recipient's variables, unknown ones with nothing"""
+    return VARIABLE_PATTERN.sub(lambda match: escape(str(variables.get(match.group(1), ''))), text)
+
+
+def send_templated(ses, template_name, from_email, data, recipients,
+                   chunk_size=MAX_DESTINATIONS, before_send=None):
+    """Send an email with per-recipient {{variables}} through SendBulkTemplatedEmail.
+    
+    data holds the subject, message, paragraphs and buttons of the email
+    (see LayoutTemplates). The fields with placeholders are filled in with
+    each recipient's variables, HTML-escaped in the markup, and every
+    destination gets its complete data, so SES never parses the message
+    itself. Returns (address, ses_message_id, error) per recipient.
+    """
+    shared = {name: value for name, value in data.items() if not VARIABLE_PATTERN.search(value)}
+    personal = {name: value for name, value in data.items() if name not in shared}
+    
+    results = []
+    for chunk in chunks(recipients, chunk_size):
+        try:
+            if before_send:
+                before_send(len(chunk))
+            response = ses.send_bulk_templated_email(
+                Source=from_email,
+                Template=template_name,
+                DefaultTemplateData=json.dumps(shared),
+                Destinations=[
+                    {
+                        'Destination': {'ToAddresses': [recipient['to']]},
+                        'ReplacementTemplateData': json.dumps(dict(shared, **{
+                            name: substitute(
+                                value,
+                                recipient.get('variables', {}),
+                                escape=html.escape if name in HTML_FIELDS else str
+                            )
+                            for name, value in personal.items()
+                        }))
+                    }
+                    for recipient in chunk
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Error sending templated email to {len(chunk)} recipients: {str(e)}")
+            results.extend((recipient['to'], None, str(e)) for recipient in chunk)
+            continue
+        
+        # One status per destination, in request order
+        for recipient, status in zip(chunk, response['Status']):
+            if status['Status'] == 'Success':
+                results.append((recipient['to'], status['MessageId'], None))
+            else:
+                results.append((recipient['to'], None, status.get('Error') or status['Status']))
+    
+    return results
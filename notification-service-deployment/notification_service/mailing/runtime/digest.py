@@ -0,0 +1,157 @@
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+from notification_common.wire import decode
+
+logger = logging.getLogger()
+
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_LIMIT = 25
+
+# Sort key of the item marking an open window; notification entries sort by timestamp before it
+WINDOW_SORT_KEY = 'window'
+
+# A window whose flush never ran (e.g. the flush message was lost) is taken over after this long
+STALE_WINDOW_SECONDS = 900
+
+# Buffered items outlive their window by this much if a flush never removes them
+BUFFER_TTL_SECONDS = 86400
+
+
+def digest_partition(body):
+    """Table partition buffering the notifications of one recipient and digest key"""
+    return f"digest#{body['digestKey']}#{body['to']}"
+
+
+def combine(entries):
+    """Subject, plain text and button text of the digest email of the buffered notifications"""
+    if len(entries) == 1:
+        entry = entries[0]
+        return entry['subject'], entry['message'], entry.get('buttonText')
+    
+    subject = entries[-1].get('digestSubject') or f"You have {len(entries)} new notifications"
+    message = "\n\n".join(f"{entry['subject']}\n{entry['message']}" for entry in entries)
+    return subject, message, entries[0].get('buttonText')
+
+
+class DigestBuffer:
+    """Coalesces the notifications sharing a digestKey and recipient into one email.
+    
+    Each notification is stored as an item of a per-recipient partition of
+    the notification table. The first one of a window also writes a window
+    marker and enqueues a flush message delayed by the window; the flush
+    removes the marker before reading the partition, so a notification
+    arriving meanwhile either is read by it or opens the next window.
+    """
+
+    def __init__(self, get_dynamodb_client, get_sqs_client, table_name, queue_url):
+        self.get_dynamodb_client = get_dynamodb_client
+        self.get_sqs_client = get_sqs_client
+        self.table_name = table_name
+        self.queue_url = queue_url
+
+    def add(self, body, window, message_body=None):
+        """Buffer a notification, returning True if it opened a new window.
+        
+        The entry stores message_body, the enqueued body, when given: a
+        payload stored in S3 stays a reference until the digest is sent.
+        """
+        partition = digest_partition(body)
+        now = time.time()
+        client = self.get_dynamodb_client()
+        client.put_item(
+            TableName=self.table_name,
+            Item={
+                'id': {'S': partition},
+                'timestamp': {'S': f"{body['timestamp']}#{body['id']}"},
+                'payload': {'S': message_body or json.dumps(body)},
+                'expiresAt': {'N': str(int(now + window + BUFFER_TTL_SECONDS))}
+            }
+        )
+        
+        # The entry is written first, so a window already open when the marker write fails covers it
+        marker_key = {'id': {'S': partition}, 'timestamp': {'S': WINDOW_SORT_KEY}}
+        try:
+            client.put_item(
+                TableName=self.table_name,
+                Item={
+                    **marker_key,
+                    'closesAt': {'N': str(int(now + window))},
+                    'expiresAt': {'N': str(int(now + window + BUFFER_TTL_SECONDS))}
+                },
+                ConditionExpression='attribute_not_exists(id) OR closesAt < :stale',
+                ExpressionAttributeValues={':stale': {'N': str(int(now - STALE_WINDOW_SECONDS))}}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        
+        try:
+            self.get_sqs_client().send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=json.dumps({
+                    'id': str(uuid.uuid4()),
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'type': 'digest',
+                    'digest': partition,
+                    'to': body['to'],
+                    'priority': body.get('priority', 'normal')
+                }),
+                DelaySeconds=int(window)
+            )
+        except Exception:
+            # Without a flush the window would stay open: close it so the retry opens it again
+            client.delete_item(TableName=self.table_name, Key=marker_key)
+            raise
+        return True
+
+    def collect(self, partition):
+        """Close the window of a partition and return its buffered (entry item key, body) pairs"""
+        client = self.get_dynamodb_client()
+        client.delete_item(
+            TableName=self.table_name,
+            Key={'id': {'S': partition}, 'timestamp': {'S': WINDOW_SORT_KEY}}
+        )
+        
+        entries = []
+        query = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': 'id = :id',
+            'ExpressionAttributeValues': {':id': {'S': partition}},
+            'ConsistentRead': True
+        }
+        while True:
+            result = client.query(**query)
+            for item in result.get('Items', []):
+                if item['timestamp']['S'] != WINDOW_SORT_KEY and 'payload' in item:
+                    key = {'id': item['id'], 'timestamp': item['timestamp']}
+                    entries.append((key, decode(item['payload']['S'])))
+            if not result.get('LastEvaluatedKey'):
+                return entries
+            query['ExclusiveStartKey'] = result['LastEvaluatedKey']
+
+    def discard(self, keys, max_attempts=4, base_delay=0.05):
+        """Delete delivered entries, returning False if some could not be deleted"""
+        for start in range(0, len(keys), BATCH_WRITE_LIMIT):
+            requests = [{'DeleteRequest': {'Key': key}} for key in keys[start:start + BATCH_WRITE_LIMIT]]
+            for attempt in range(max_attempts):
+                if attempt:
+                    time.sleep(base_delay * (2 ** (attempt - 1)))
+                try:
+                    response = self.get_dynamodb_client().batch_write_item(
+                        RequestItems={self.table_name: requests}
+                    )
+                except ClientError as e:
+                    logger.error(f"Error discarding digest entries: {str(e)}")
+                    continue
+                requests = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                if not requests:
+                    break
+            if requests:
+                return False
+        return True
@@ -0,0 +1,188 @@
+import os
+import re
+from functools import cached_property, lru_cache
+from string import Formatter
+
+# Email styling constants
+YELLOW_ACCENT = "#F0B100"
+TEXT_COLOR = "#2C2C33"
+PURPLE_ACCENT = "#6751E3"
+
+# Logo URL - replace with your actual logo URL
+LOGO_URL = "https://pamp-clm.s3.eu-west-1.amazonaws.com/PAMP-logo%400%2C3x.png"
+
+# Number of rendered emails kept per warm container (repeated broadcasts)
+TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', '64'))
+
+# URLs in the message are turned into buttons. The capturing group makes
+# re.split return the text and the URLs alternately in a single pass. The
+# last alternative (http?://) also catches the mistyped htt:// links, as
+# create_html_email always has.
+URL_PATTERN = re.compile(r'(https?://[^\s<>"]+|www\.[^\s<>"]+|http?://[^\s<>"]+)')
+
+PARAGRAPH_TEMPLATE = f"<p style=\"color: {TEXT_COLOR}; margin: 0 0 15px 0;\">{{paragraph}}</p>"
+
+BUTTON_TEMPLATE = f"""
+        <tr>
+            <td align="center" style="padding: 20px 0;">
+                <a href="{{url}}" target="_blank" style="background-color: {PURPLE_ACCENT}; 
+                   color: white; padding: 12px 30px; text-decoration: none; 
+                   border-radius: 4px; font-weight: bold; display: inline-block;">
+                    {{label}}
+                </a>
+            </td>
+        </tr>
+        """
+
+# HTML skeleton of every email; the styling constants are resolved here once
+# and the remaining fields are filled in when rendering
+SKELETON = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{{subject}}</title>
+    </head>
+    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f9f9f9;">
+        <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
+            <tr>
+                <td style="padding: 20px 0; text-align: center; background-color: {TEXT_COLOR};">
+                    <img src="{{logo_url}}" alt="Logo" width="150" style="max-width: 100%; height: auto;">
+                </td>
+            </tr>
+            <tr>
+                <td style="padding: 30px 20px; background-color: white;">
+                    <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
+                        <tr>
+                            <td>
+                                <h1 style="color: {YELLOW_ACCENT}; margin: 0 0 20px 0;">{{subject}}</h1>
+                                {{paragraphs}}
+                            </td>
+                        </tr>
+                        {{buttons}}
+                    </table>
+                </td>
+            </tr>
+            <tr>
+                <td style="padding: 20px; text-align: center; background-color: #f0f0f0; color: {TEXT_COLOR}; font-size: 12px;">
+                    <p>&copy; 2025 PAMP. All rights reserved.</p>
+                </td>
+            </tr>
+        </table>
+    </body>
+    </html>
+    """
+
+
+def compile_template(template, allowed_fields=None):
+    """Split a {field} template into literal chunks and field names, once per container"""
+    literals = []
+    fields = []
+    pending = ""
+    for literal, field, _, _ in Formatter().parse(template):
+        # Escaped braces ({{ and }}) split a literal chunk; its parts are joined again
+        pending += literal
+        if field is not None:
+            literals.append(pending)
+            fields.append(field)
+            pending = ""
+    literals.append(pending)
+    if allowed_fields is not None:
+        unknown = sorted(set(fields) - set(allowed_fields))
+        if unknown:
+            raise ValueError(f"Unknown template fields: {', '.join(unknown)}")
+    return literals, fields
+
+
+def render(compiled, values):
+    """Interleave the literal chunks of a compiled template with the field values"""
+    literals, fields = compiled
+    chunks = [None] * (len(literals) + len(fields))
+    chunks[0::2] = literals
+    chunks[1::2] = [values[field] for field in fields]
+    return "".join(chunks)
+
+
+class EmailLayout:
+    """Compiled HTML layout of the emails: page skeleton, paragraph and button templates.
+    
+    The default layout is built from the constants above; the template registry
+    builds others from the templates stored in S3. Templates use {field}
+    placeholders, with {{ and }} for literal braces.
+    """
+    
+    SKELETON_FIELDS = ('subject', 'logo_url', 'paragraphs', 'buttons')
+    PARAGRAPH_FIELDS = ('paragraph',)
+    BUTTON_FIELDS = ('url', 'label')
+
+    def __init__(self, skeleton=SKELETON, paragraph=PARAGRAPH_TEMPLATE, button=BUTTON_TEMPLATE, logo_url=LOGO_URL):
+        self.skeleton_parts = compile_template(skeleton, self.SKELETON_FIELDS)
+        self.button_parts = compile_template(button, self.BUTTON_FIELDS)
+        self.logo_url = logo_url
+        
+        # Paragraphs are joined in one pass: open + (close + open).join(paragraphs) + close
+        literals, fields = compile_template(paragraph, self.PARAGRAPH_FIELDS)
+        if len(fields) != 1:
+            raise ValueError("The paragraph template must contain {paragraph} once")
+        self.paragraph_open, self.paragraph_close = (literals + [''])[:2]
+        self.paragraph_separator = self.paragraph_close + self.paragraph_open
+
+    @cached_property
+    def handlebars(self):
+        """HTML part of the SES template of this layout, filled in by SES from the template data.
+        
+        The subject is HTML-escaped by SES; the paragraphs and buttons are
+        markup rendered by email_parts. Literal {{ of the layout are escaped
+        so SES does not read them as expressions.
+        """
+        literals, fields = self.skeleton_parts
+        return render(([literal.replace('{{', '\\{{') for literal in literals], fields), {
+            'subject': '{{subject}}',
+            'logo_url': self.logo_url.replace('{{', '\\{{'),
+            'paragraphs': '{{{paragraphs}}}',
+            'buttons': '{{{buttons}}}',
+        })
+
+
+DEFAULT_LAYOUT = EmailLayout()
+
+
+def button_label(index, button_text=None):
+    """Label of the button created for the index-th URL of the message"""
+    if index == 0:
+        return button_text or "Click here"
+    return f"Link {index + 1}"
+
+
+def email_parts(message, button_text=None, layout=DEFAULT_LAYOUT):
+    """Paragraphs and buttons markup of a message, as {'paragraphs', 'buttons'}"""
+    
+    # Text and URLs alternate in the split result: text, url, text, url, ..., text
+    pieces = URL_PATTERN.split(message)
+    text = "".join(pieces[0::2])
+    urls = pieces[1::2]
+    
+    # Create button HTML for each URL
+    buttons = "".join([
+        render(layout.button_parts, {'url': url, 'label': button_label(i, button_text)})
+        for i, url in enumerate(urls)
+    ])
+    
+    # Create paragraphs from the message text
+    paragraphs = [paragraph for paragraph in text.split('\n') if paragraph.strip()]
+    paragraphs_html = (
+        layout.paragraph_open + layout.paragraph_separator.join(paragraphs) + layout.paragraph_close
+        if paragraphs else ""
+    )
+    return {'paragraphs': paragraphs_html, 'buttons': buttons}
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def create_html_email(subject, message, logo_url=None, button_text=None, layout=DEFAULT_LAYOUT):
+    """Create HTML email with styling, cached for repeated messages"""
+    return render(layout.skeleton_parts, {
+        'subject': subject,
+        'logo_url': logo_url or layout.logo_url,
+        **email_parts(message, button_text, layout),
+    })
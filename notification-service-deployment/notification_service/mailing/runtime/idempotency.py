@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+# Outcomes of IdempotencyGuard.check
+NEW = 'NEW'  # Not sent yet, and claimed by this delivery when claims are on
+DUPLICATE = 'DUPLICATE'  # Already sent
+IN_PROGRESS = 'IN_PROGRESS'  # Claimed by a delivery still running in another container
+
+
+class IdempotencyGuard:
+    """Detects redelivered notifications so SES is not called twice for them.
+    
+    Notifications sent by this container are remembered in a bounded LRU,
+    keyed like the status items, which answers most SQS redeliveries without
+    any AWS call. Other containers are covered by an optional conditional
+    claim on the notification item: it marks the item PROCESSING until
+    claimedUntil, claim_lease seconds ahead (the function timeout), and
+    fails when the item is SENT or claimed by a delivery still in progress.
+    The final status written by the StatusWriter ends the lease. Claimed
+    items expire after claim_ttl seconds if no final status replaces them.
+    Only SENT notifications are remembered as duplicates: one claimed
+    elsewhere may still fail, so it must be received again.
+    """
+
+    def __init__(self, get_client, table_name, max_entries=10000, claim_writes=True, claim_ttl=None, claim_lease=900):
+        self.get_client = get_client
+        self.table_name = table_name
+        self.claim_ttl = claim_ttl
+        self.claim_lease = claim_lease
+        self.max_entries = max_entries
+        self.claim_writes = claim_writes
+        self._sent = OrderedDict()
+        self._counters = {
+            'IdempotencyMemoryHits': 0,
+            'IdempotencyTableHits': 0,
+            'IdempotencyInProgress': 0,
+            'IdempotencyMisses': 0
+        }
+        self._lock = threading.Lock()
+
+    def check(self, body):
+        """Return (outcome, detail) for a notification about to be sent.
+        
+        detail is the SES message id of a DUPLICATE (only known for the ones
+        found in memory) and the seconds left on the lease of an IN_PROGRESS
+        claim; None otherwise.
+        """
+        message_id = self._recall(body)
+        if message_id is not None:
+            return DUPLICATE, message_id or None
+        
+        if self.claim_writes:
+            claimed, item = self.claim(body)
+            if not claimed and item.get('status', {}).get('S') == 'SENT':
+                self.remember(body, None)
+                with self._lock:
+                    self._counters['IdempotencyTableHits'] += 1
+                return DUPLICATE, None
+            if not claimed:
+                # Left to a later receive, in case the delivery holding the claim fails
+                claimed_until = float(item.get('claimedUntil', {}).get('N', '0'))
+                with self._lock:
+                    self._counters['IdempotencyInProgress'] += 1
+                return IN_PROGRESS, max(0.0, claimed_until - time.time())
+        
+        with self._lock:
+            self._counters['IdempotencyMisses'] += 1
+        return NEW, None
+
+    def claim(self, body):
+        """Conditionally mark a notification PROCESSING.
+        
+        Returns (claimed, item), item being the notification item that
+        failed the claim (SENT, or claimed elsewhere) and {} when claimed.
+        """
+        now = time.time()
+        update_expression = "SET #status = :status, updatedAt = :updatedAt, claimedUntil = :claimedUntil"
+        values = {
+            ':status': {'S': 'PROCESSING'},
+            ':sent': {'S': 'SENT'},
+            ':updatedAt': {'S': datetime.utcnow().isoformat()},
+            ':claimedUntil': {'N': str(int(now + self.claim_lease))},
+            ':now': {'N': str(int(now))}
+        }
+        if self.claim_ttl:
+            update_expression += ", expiresAt = :expiresAt"
+            values[':expiresAt'] = {'N': str(int(now + self.claim_ttl))}
+        
+        try:
+            self.get_client().update_item(
+                TableName=self.table_name,
+                Key={
+                    'id': {'S': body['id']},
+                    'timestamp': {'S': body['timestamp']}
+                },
+                UpdateExpression=update_expression,
+                # Claimable unless SENT or PROCESSING under a lease that has not run out; only
+                # a claim sets claimedUntil, and every other status write removes it
+                ConditionExpression=(
+                    "attribute_not_exists(#status) OR (#status <> :sent AND #status <> :status) "
+                    "OR claimedUntil < :now"
+                ),
+                ExpressionAttributeNames={
+                    '#status': 'status'
+                },
+                ExpressionAttributeValues=values,
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return True, {}
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False, e.response.get('Item', {})
+            raise
+
+    def unsent(self, bodies):
+        """Split the per-recipient bodies of a multi-recipient notification.
+        
+        Returns (unsent_bodies, duplicates) where duplicates holds
+        (body, ses_message_id) pairs. Recipients not found in memory are
+        looked up with BatchGetItem (100 keys per call) rather than one
+        conditional claim per recipient.
+        """
+        unsent = []
+        duplicates = []
+        for body in bodies:
+            message_id = self._recall(body)
+            if message_id is not None:
+                duplicates.append((body, message_id or None))
+            else:
+                unsent.append(body)
+        
+        if self.claim_writes and unsent:
+            sent = self._sent_in_table(unsent)
+            for body in unsent:
+                if self._key(body) in sent:
+                    self.remember(body, sent[self._key(body)])
+                    duplicates.append((body, sent[self._key(body)]))
+            unsent = [body for body in unsent if self._key(body) not in sent]
+            with self._lock:
+                self._counters['IdempotencyTableHits'] += len(sent)
+        
+        with self._lock:
+            self._counters['IdempotencyMisses'] += len(unsent)
+        return unsent, duplicates
+
+    def _sent_in_table(self, bodies, max_attempts=3):
+        """Return {key: ses_message_id} of the given notifications already SENT in the table"""
+        sent = {}
+        keys = [
+            {'id': {'S': body['id']}, 'timestamp': {'S': body['timestamp']}}
+            for body in bodies
+        ]
+        for start in range(0, len(keys), 100):
+            request = {
+                self.table_name: {
+                    'Keys': keys[start:start + 100],
+                    'ProjectionExpression': 'id, #timestamp, #status, messageId',
+                    'ExpressionAttributeNames': {'#timestamp': 'timestamp', '#status': 'status'},
+                    'ConsistentRead': True
+                }
+            }
+            for _ in range(max_attempts):
+                response = self.get_client().batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    if item.get('status', {}).get('S') == 'SENT':
+                        key = (item['id']['S'], item['timestamp']['S'])
+                        sent[key] = item.get('messageId', {}).get('S')
+                request = response.get('UnprocessedKeys')
+                if not request:
+                    break
+        return sent
+
+    def remember(self, body, message_id):
+        """Record a notification accepted by SES (message_id is None when unknown)"""
+        key = self._key(body)
+        with self._lock:
+            self._sent[key] = message_id or ''
+            self._sent.move_to_end(key)
+            while len(self._sent) > self.max_entries:
+                self._sent.popitem(last=False)
+
+    def _recall(self, body):
+        """SES message id of a notification sent by this container ('' if unknown), None if not sent"""
+        key = self._key(body)
+        with self._lock:
+            message_id = self._sent.get(key)
+            if message_id is not None:
+                self._sent.move_to_end(key)
+                self._counters['IdempotencyMemoryHits'] += 1
+            return message_id
+
+    @staticmethod
+    def _key(body):
+        return (body['id'], body['timestamp'])
+
+    def drain_counters(self):
+        """Return the hit/miss counters (by metric name) accumulated since the last call"""
+        with self._lock:
+            counters = self._counters
+            self._counters = dict.fromkeys(counters, 0)
+        return counters
@@ -1,234 +1,565 @@
+from notification_common.coldstart import init_metrics
 import json
 import os
-import boto3
 import logging
-from datetime import datetime
-import traceback
-import re
+import time
+from datetime import datetime, timezone
+from notification_common.claim_check import load_payload
+from notification_common.clients import get_client
+from notification_common.delivery import deliver_batch
+from notification_common.failures import FailureRouter, classify
+from notification_common.message_log import MessageLog
+from notification_common.metrics import emit_metrics
+from notification_common.status_writer import StatusWriter
+from notification_common.wire import decode
+
+with init_metrics.measure('import.modules'):
+    from bulk import LayoutTemplates, recipient_body, send_bcc_chunks, send_templated
+    from digest import DigestBuffer, combine
+    from email_template import DEFAULT_LAYOUT, create_html_email, email_parts
+    from idempotency import DUPLICATE, IN_PROGRESS, IdempotencyGuard
+    from raw_email import send_raw_email
+    from rate_limiter import SendRateLimiter
+    from template_registry import TemplateRegistry
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-ses_client = boto3.client('ses')
-dynamodb = boto3.resource('dynamodb')
+# Number of records of a batch delivered in parallel (1 = sequential)
+DELIVERY_CONCURRENCY = max(1, int(os.environ.get('DELIVERY_CONCURRENCY', '1')))
+
+# Conditionally claim each notification before sending to skip duplicates already SENT or
+# being sent; a claim holds for STATUS_CLAIM_LEASE seconds, the function timeout
+STATUS_CLAIM_WRITES = os.environ.get('STATUS_CLAIM_WRITES', 'true').lower() == 'true'
+STATUS_CLAIM_LEASE = int(os.environ.get('STATUS_CLAIM_LEASE', '900'))
+
+# Number of sent notification ids remembered per warm container
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+
+# Account-wide SES send rate shared by all containers (0 disables the limiter),
+# tokens leased from the shared bucket at once and per-container fallback rate
+SES_SEND_RATE = float(os.environ.get('SES_SEND_RATE', '0'))
+SES_RATE_LEASE_SIZE = int(os.environ.get('SES_RATE_LEASE_SIZE', '5'))
+SES_FALLBACK_RATE = float(os.environ.get('SES_FALLBACK_RATE', '0')) or None
+
+# Destinations per SES call for multi-recipient notifications (SES allows 50)
+BULK_CHUNK_SIZE = min(50, int(os.environ.get('BULK_CHUNK_SIZE', '50')))
+
+# Seconds each status is kept in the table before expiring (TTL) into the S3 archive,
+# e.g. {"SENT": 2592000}; statuses without retention are kept forever
+STATUS_RETENTION = json.loads(os.environ.get('STATUS_RETENTION', '{}'))
+
+# Notifications with a digestKey are buffered per recipient for DIGEST_WINDOW seconds
+# (or their digestWindow) and sent as one email; the flush is a delayed message on this queue
+DIGEST_QUEUE_URL = os.environ.get('DIGEST_QUEUE_URL')
+DIGEST_WINDOW = int(os.environ.get('DIGEST_WINDOW', '300'))
+
+# Retryable failures are received again after RETRY_BASE_DELAY * 2^(receives - 1) seconds,
+# at most RETRY_MAX_DELAY, with jitter; permanent ones go to the dead-letter queue at once
+RETRY_BASE_DELAY = int(os.environ.get('RETRY_BASE_DELAY', '5'))
+RETRY_MAX_DELAY = int(os.environ.get('RETRY_MAX_DELAY', '300'))
+DEAD_LETTER_QUEUE_URL = os.environ.get('DEAD_LETTER_QUEUE_URL')
+
+# Layouts of the notifications with a templateId are read from TEMPLATE_BUCKET; up to
+# TEMPLATE_REGISTRY_SIZE compiled layouts are kept per warm container, and latest versions
+# are revalidated by ETag every TEMPLATE_REVALIDATE_SECONDS
+TEMPLATE_BUCKET = os.environ.get('TEMPLATE_BUCKET')
+TEMPLATE_REGISTRY_SIZE = int(os.environ.get('TEMPLATE_REGISTRY_SIZE', '32'))
+TEMPLATE_REVALIDATE_SECONDS = float(os.environ.get('TEMPLATE_REVALIDATE_SECONDS', '60'))
+
+# Sender of the notifications without a from address
+# In production, this should be configurable
+DEFAULT_FROM_EMAIL = 'noreply@edulor.fr'  # Replace with your verified email
+
+# AWS clients are created on first use. Low-level clients are thread-safe, so every
+# delivery worker shares the same instances and their HTTP connection pool.
+CLIENT_CONFIG = {'max_pool_connections': max(10, DELIVERY_CONCURRENCY)}
 table_name = os.environ['NOTIFICATION_TABLE']
-notification_table = dynamodb.Table(table_name)
-
-# Email styling constants
-YELLOW_ACCENT = "#F0B100"
-TEXT_COLOR = "#2C2C33"
-PURPLE_ACCENT = "#6751E3"
-
-# Logo URL - replace with your actual logo URL
-LOGO_URL = "https://pamp-clm.s3.eu-west-1.amazonaws.com/PAMP-logo%400%2C3x.png"
-
-def create_html_email(subject, message, logo_url=LOGO_URL, button_text=None):
-    """Create HTML email with styling"""
-    
-    # Check if the message contains any URLs to convert to buttons
-    button_html = ""
-    url_pattern = r'https?://[^\s<>"]+|www\.[^\s<>"]+|http?://[^\s<>"]+'
-    urls = re.findall(url_pattern, message)
-    
-    # Replace URLs in the message with placeholders
-    message_without_urls = message
-    for i, url in enumerate(urls):
-        placeholder = f"[LINK_{i}]"
-        message_without_urls = message_without_urls.replace(url, placeholder)
-    
-    # Create button HTML for each URL
-    buttons_html = ""
-    for i, url in enumerate(urls):
-        if i == 0 and button_text:
-            button_label = button_text
-        else:
-            button_label = f"Click here" if i == 0 else f"Link {i+1}"
-        buttons_html += f"""
-        <tr>
-            <td align="center" style="padding: 20px 0;">
-                <a href="{url}" target="_blank" style="background-color: {PURPLE_ACCENT}; 
-                   color: white; padding: 12px 30px; text-decoration: none; 
-                   border-radius: 4px; font-weight: bold; display: inline-block;">
-                    {button_label}
-                </a>
-            </td>
-        </tr>
-        """
-    
-    # Replace placeholders with empty strings
-    for i in range(len(urls)):
-        message_without_urls = message_without_urls.replace(f"[LINK_{i}]", "")
-    
-    # Create paragraphs from the message text
-    paragraphs = ""
-    for paragraph in message_without_urls.split('\n'):
-        if paragraph.strip():
-            paragraphs += f"<p style=\"color: {TEXT_COLOR}; margin: 0 0 15px 0;\">{paragraph}</p>"
-    
-    # Create the HTML email template
-    html_template = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{subject}</title>
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f9f9f9;">
-        <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
-            <tr>
-                <td style="padding: 20px 0; text-align: center; background-color: {TEXT_COLOR};">
-                    <img src="{logo_url}" alt="Logo" width="150" style="max-width: 100%; height: auto;">
-                </td>
-            </tr>
-            <tr>
-                <td style="padding: 30px 20px; background-color: white;">
-                    <table role="presentation" width="100%" cellspacing="0" cellpadding="0" border="0">
-                        <tr>
-                            <td>
-                                <h1 style="color: {YELLOW_ACCENT}; margin: 0 0 20px 0;">{subject}</h1>
-                                {paragraphs}
-                            </td>
-                        </tr>
-                        {buttons_html}
-                    </table>
-                </td>
-            </tr>
-            <tr>
-                <td style="padding: 20px; text-align: center; background-color: #f0f0f0; color: {TEXT_COLOR}; font-size: 12px;">
-                    <p>&copy; 2025 PAMP. All rights reserved.</p>
-                </td>
-            </tr>
-        </table>
-    </body>
-    </html>
+
+def ses_client():
+    """SES client shared by the delivery workers"""
+    return get_client('ses', **CLIENT_CONFIG)
+
+def dynamodb_client():
+    """DynamoDB client shared by the delivery workers"""
+    return get_client('dynamodb', **CLIENT_CONFIG)
+
+def sqs_client():
+    """SQS client used to schedule digest flushes and retries"""
+    return get_client('sqs', **CLIENT_CONFIG)
+
+def s3_client():
+    """S3 client reading the payloads and attachments stored by the API, and the templates"""
+    return get_client('s3', **CLIENT_CONFIG)
+
+# Kept across warm invocations so redeliveries of recent sends are detected in memory
+idempotency_guard = IdempotencyGuard(
+    dynamodb_client,
+    table_name,
+    max_entries=IDEMPOTENCY_CACHE_SIZE,
+    claim_writes=STATUS_CLAIM_WRITES,
+    claim_ttl=STATUS_RETENTION.get('PROCESSING'),
+    claim_lease=STATUS_CLAIM_LEASE
+)
+
+# Token bucket consulted before every SES call, kept across warm invocations
+send_rate_limiter = SendRateLimiter(
+    dynamodb_client,
+    table_name,
+    rate=SES_SEND_RATE,
+    lease_size=SES_RATE_LEASE_SIZE,
+    fallback_rate=SES_FALLBACK_RATE
+) if SES_SEND_RATE > 0 else None
+
+# Per-recipient buffer of the notifications sent with a digestKey
+digest_buffer = DigestBuffer(
+    dynamodb_client,
+    sqs_client,
+    table_name,
+    DIGEST_QUEUE_URL
+) if DIGEST_QUEUE_URL else None
+
+# Compiled email layouts, kept across warm invocations
+template_registry = TemplateRegistry(
+    s3_client,
+    TEMPLATE_BUCKET,
+    max_entries=TEMPLATE_REGISTRY_SIZE,
+    revalidate_after=TEMPLATE_REVALIDATE_SECONDS
+) if TEMPLATE_BUCKET else None
+
+# SES templates of the layouts used by personalised multi-recipient notifications
+layout_templates = LayoutTemplates()
+
+# Retry delays and dead-lettering of the records that failed
+failure_router = FailureRouter(
+    sqs_client,
+    DEAD_LETTER_QUEUE_URL,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY
+)
+
+def record_failure(message_log, exception):
+    """Log a failure with its classification, which decides how the record is retried"""
+    retryable, reason = classify(exception)
+    message_log.set(status='ERROR', retryable=retryable, failureReason=reason)
+    message_log.error(exception)
+
+def claimed_elsewhere(message_log, claimed_for):
+    """Fail a notification claimed by a delivery in progress in another container.
+    
+    It is neither sent nor acknowledged: the record is received again once
+    the claim has expired, and skipped then if the other delivery sent it.
     """
+    message_log.set(status='IN_PROGRESS', retryable=True, failureReason='ClaimedElsewhere', retryAfter=claimed_for)
+    return False
+
+def email_layout(body, message_log):
+    """Layout of the template a notification references, the default one without templateId"""
+    if not body.get('templateId'):
+        return DEFAULT_LAYOUT
+    if not template_registry:
+        raise ValueError("Templates are not enabled")
+    message_log.set(templateId=body['templateId'], templateVersion=body.get('templateVersion'))
+    with message_log.stage('template'):
+        return template_registry.get(body['templateId'], body.get('templateVersion'))
+
+def enqueued_at(record, body):
+    """Epoch seconds at which the API enqueued a notification, or at which it was due if scheduled"""
+    # The API stamps the payload in UTC; SentTimestamp covers payloads without a valid one
+    try:
+        return datetime.fromisoformat(body.get('sendAt') or body['timestamp']).replace(tzinfo=timezone.utc).timestamp()
+    except (KeyError, TypeError, ValueError):
+        sent_timestamp = record.get('attributes', {}).get('SentTimestamp')
+        return int(sent_timestamp) / 1000 if sent_timestamp else None
+
+def record_latency(record, body, message_log):
+    """Add the queue, delivery and end-to-end latencies of a notification accepted by SES now"""
+    accepted = time.time()
+    enqueued = enqueued_at(record, body)
+    first_received = record.get('attributes', {}).get('ApproximateFirstReceiveTimestamp')
+    first_received = int(first_received) / 1000 if first_received else None
     
-    return html_template
+    # Enqueue -> first dequeue, first dequeue -> SES accepted (including retries), enqueue -> SES accepted
+    if enqueued is not None and first_received is not None:
+        message_log.metric('QueueLatency', max(0.0, first_received - enqueued) * 1000)
+    if first_received is not None:
+        message_log.metric('DeliveryLatency', max(0.0, accepted - first_received) * 1000)
+    if enqueued is not None:
+        message_log.metric('EndToEndLatency', max(0.0, accepted - enqueued) * 1000)
 
-def handler(event, context):
-    """Lambda handler function for processing email notifications"""
-    # List to collect failed message IDs for SQS batch processing
-    failed_message_ids = []
+def process_record(record, status_writer, message_log):
+    """Deliver a single SQS record, returning True when it can be acknowledged"""
+    message_id = record['messageId']
+    body = None
     
-    # Process each message in the batch
-    for record in event.get('Records', []):
-        message_id = record['messageId']
+    try:
+        # Parse SQS message (compact wire format or plain JSON)
+        with message_log.stage('parse'):
+            body = decode(record['body'])
+        if body.get('type') == 'digest':
+            return deliver_digest(record, body, status_writer, message_log)
+        message_log.set(notificationId=body.get('id'), priority=body.get('priority'))
         
-        try:
-            # Parse SQS message
-            body = json.loads(record['body'])
-            logger.info(f"Processing notification {body.get('id')}")
-            
-            # Validate required fields
-            required_fields = ['id', 'timestamp', 'to', 'subject', 'message']
-            missing_fields = [field for field in required_fields if field not in body]
-            if missing_fields:
-                logger.error(f"Missing required fields: {', '.join(missing_fields)}")
-                failed_message_ids.append({'itemIdentifier': record['messageId']})
-                continue
-            
-            # Extract email parameters
-            to_email = body['to']
-            subject = body['subject']
-            message = body['message']
-            from_email = body.get('from')
-            button_text = body.get('buttonText')
-            
-            if not from_email:
-                # Use a default verified sender email address
-                # In production, this should be configurable
-                from_email = 'noreply@edulor.fr'  # Replace with your verified email
-            
-            # Update notification status to PROCESSING
-            notification_table.update_item(
-                Key={
-                    'id': body['id'],
-                    'timestamp': body['timestamp']
-                },
-                UpdateExpression="SET #status = :status, updatedAt = :updatedAt",
-                ExpressionAttributeNames={
-                    '#status': 'status'
-                },
-                ExpressionAttributeValues={
-                    ':status': 'PROCESSING',
-                    ':updatedAt': datetime.utcnow().isoformat()
-                }
+        # Payloads too large for SQS were stored in S3 by the API and enqueued as a reference
+        if 'payloadRef' in body:
+            with message_log.stage('claim_check'):
+                body = load_payload(s3_client(), body)
+        message_log.verbose(
+            subject=body.get('subject'),
+            messageLength=len(body.get('message') or ''),
+            receiveCount=record.get('attributes', {}).get('ApproximateReceiveCount')
+        )
+        
+        # Validate required fields
+        required_fields = ['id', 'timestamp', 'subject', 'message']
+        missing_fields = [field for field in required_fields if field not in body]
+        if 'to' not in body and 'recipients' not in body:
+            missing_fields.append('to')
+        if missing_fields:
+            # Retrying cannot fix the message: it goes to the dead-letter queue at once
+            message_log.set(
+                status='INVALID',
+                error=f"Missing required fields: {', '.join(missing_fields)}",
+                retryable=False,
+                failureReason='InvalidMessage'
             )
-            
-            # Generate HTML content
-            html_content = create_html_email(subject, message, button_text=button_text)
-            
-            # Send email via SES with both HTML and plain text
-            response = ses_client.send_email(
-                Source=from_email,
-                Destination={
-                    'ToAddresses': [to_email]
-                },
-                Message={
-                    'Subject': {
-                        'Data': subject
+            return False
+        
+        # Extract email parameters
+        subject = body['subject']
+        message = body['message']
+        from_email = body.get('from')
+        button_text = body.get('buttonText')
+        
+        if not from_email:
+            # Use a default verified sender email address
+            from_email = DEFAULT_FROM_EMAIL
+        
+        if 'recipients' in body:
+            return deliver_to_recipients(record, body, from_email, status_writer, message_log)
+        
+        if body.get('digestKey') and digest_buffer:
+            return buffer_notification(record, body, status_writer, message_log)
+        
+        # Skip notifications already sent, e.g. redelivered after a partial batch failure
+        with message_log.stage('idempotency'):
+            outcome, detail = idempotency_guard.check(body)
+        if outcome == IN_PROGRESS:
+            return claimed_elsewhere(message_log, detail)
+        if outcome == DUPLICATE:
+            ses_message_id = detail
+            message_log.set(status='DUPLICATE', sesMessageId=ses_message_id)
+            if ses_message_id:
+                # Sent by this container: make sure its SENT status gets written
+                status_writer.record(message_id, body, 'SENT', messageId=ses_message_id)
+            return True
+        
+        # Generate HTML content in the layout of the notification's template
+        layout = email_layout(body, message_log)
+        with message_log.stage('render'):
+            html_content = create_html_email(subject, message, button_text=button_text, layout=layout)
+        
+        # Wait for the shared SES send rate to allow one more email
+        if send_rate_limiter:
+            with message_log.stage('rate_limit'):
+                send_rate_limiter.acquire()
+        
+        # Send email via SES with both HTML and plain text; attachments
+        # need a raw MIME message, built from the objects stored by the API
+        with message_log.stage('ses'):
+            if body.get('attachments'):
+                response = send_raw_email(
+                    ses_client(),
+                    s3_client(),
+                    from_email,
+                    body['to'],
+                    subject,
+                    message,
+                    html_content,
+                    body['attachments']
+                )
+            else:
+                response = ses_client().send_email(
+                    Source=from_email,
+                    Destination={
+                        'ToAddresses': [body['to']]
                     },
-                    'Body': {
-                        'Text': {
-                            'Data': message
+                    Message={
+                        'Subject': {
+                            'Data': subject
                         },
-                        'Html': {
-                            'Data': html_content
+                        'Body': {
+                            'Text': {
+                                'Data': message
+                            },
+                            'Html': {
+                                'Data': html_content
+                            }
                         }
                     }
-                }
-            )
-            
-            # Log success
-            logger.info(f"Successfully sent email: {response['MessageId']}")
-            
-            # Update notification status to SENT
-            notification_table.update_item(
-                Key={
-                    'id': body['id'],
-                    'timestamp': body['timestamp']
-                },
-                UpdateExpression="SET #status = :status, updatedAt = :updatedAt, messageId = :messageId",
-                ExpressionAttributeNames={
-                    '#status': 'status'
-                },
-                ExpressionAttributeValues={
-                    ':status': 'SENT',
-                    ':updatedAt': datetime.utcnow().isoformat(),
-                    ':messageId': response['MessageId']
-                }
-            )
-            
-        except Exception as e:
-            logger.error(f"Error processing message {message_id}: {str(e)}")
-            logger.error(traceback.format_exc())
-            
-            # Try to update notification status to ERROR if we have the necessary info
-            try:
-                if 'body' in locals() and isinstance(body, dict) and 'id' in body and 'timestamp' in body:
-                    notification_table.update_item(
-                        Key={
-                            'id': body['id'],
-                            'timestamp': body['timestamp']
-                        },
-                        UpdateExpression="SET #status = :status, updatedAt = :updatedAt, errorMessage = :errorMessage",
-                        ExpressionAttributeNames={
-                            '#status': 'status'
+                )
+        
+        message_log.set(status='SENT', sesMessageId=response['MessageId'])
+        record_latency(record, body, message_log)
+        idempotency_guard.remember(body, response['MessageId'])
+        
+        # Record notification status SENT (written with the rest of the batch)
+        status_writer.record(message_id, body, 'SENT', messageId=response['MessageId'])
+        return True
+        
+    except Exception as e:
+        record_failure(message_log, e)
+        
+        # Record notification status ERROR if we have the necessary info (digest flushes have none)
+        if isinstance(body, dict) and 'id' in body and 'timestamp' in body and body.get('type') != 'digest':
+            status_writer.record(message_id, body, 'ERROR', errorMessage=str(e))
+        
+        return False
+
+def buffer_notification(record, body, status_writer, message_log):
+    """Add a notification to the digest of its recipient, returning True when it can be acknowledged"""
+    message_id = record['messageId']
+    
+    # Notifications already sent in an earlier digest are not buffered again
+    with message_log.stage('idempotency'):
+        outcome, detail = idempotency_guard.check(body)
+    if outcome == IN_PROGRESS:
+        return claimed_elsewhere(message_log, detail)
+    if outcome == DUPLICATE:
+        ses_message_id = detail
+        message_log.set(status='DUPLICATE', sesMessageId=ses_message_id)
+        if ses_message_id:
+            status_writer.record(message_id, body, 'SENT', messageId=ses_message_id)
+        return True
+    
+    with message_log.stage('digest'):
+        opened = digest_buffer.add(body, body.get('digestWindow') or DIGEST_WINDOW, record['body'])
+    message_log.set(status='BUFFERED', digestKey=body['digestKey'], digestOpened=opened)
+    status_writer.record(message_id, body, 'BUFFERED', digestKey=body['digestKey'])
+    return True
+
+def deliver_digest(record, body, status_writer, message_log):
+    """Send the notifications buffered for a recipient as one email when its window closes"""
+    message_id = record['messageId']
+    message_log.set(digest=body['digest'])
+    
+    with message_log.stage('digest'):
+        entries = digest_buffer.collect(body['digest'])
+    if not entries:
+        # Already sent by the flush of an overlapping window
+        message_log.set(status='EMPTY')
+        return True
+    keys = [key for key, _ in entries]
+    
+    # Entries buffered as a reference are read from S3 only now
+    if any('payloadRef' in entry for _, entry in entries):
+        with message_log.stage('claim_check'):
+            entries = [
+                (key, load_payload(s3_client(), entry) if 'payloadRef' in entry else entry)
+                for key, entry in entries
+            ]
+    
+    # Skip entries already sent, e.g. when a flush is redelivered before its entries were discarded
+    with message_log.stage('idempotency'):
+        pending, duplicates = idempotency_guard.unsent([entry for _, entry in entries])
+    for entry, ses_message_id in duplicates:
+        if ses_message_id:
+            status_writer.record(message_id, entry, 'SENT', messageId=ses_message_id)
+    message_log.set(notifications=len(entries), duplicates=len(duplicates))
+    
+    if pending:
+        # The digest takes the template of its latest notification, like its subject
+        subject, message, button_text = combine(pending)
+        layout = email_layout(pending[-1], message_log)
+        with message_log.stage('render'):
+            html_content = create_html_email(subject, message, button_text=button_text, layout=layout)
+        
+        if send_rate_limiter:
+            with message_log.stage('rate_limit'):
+                send_rate_limiter.acquire()
+        
+        try:
+            with message_log.stage('ses'):
+                response = ses_client().send_email(
+                    Source=pending[0].get('from') or DEFAULT_FROM_EMAIL,
+                    Destination={
+                        'ToAddresses': [body['to']]
+                    },
+                    Message={
+                        'Subject': {
+                            'Data': subject
                         },
-                        ExpressionAttributeValues={
-                            ':status': 'ERROR',
-                            ':updatedAt': datetime.utcnow().isoformat(),
-                            ':errorMessage': str(e)
+                        'Body': {
+                            'Text': {
+                                'Data': message
+                            },
+                            'Html': {
+                                'Data': html_content
+                            }
                         }
-                    )
-            except Exception as inner_e:
-                logger.error(f"Error updating notification status: {str(inner_e)}")
-            
-            # Add to failed messages for SQS batch processing
-            failed_message_ids.append({'itemIdentifier': message_id})
+                    }
+                )
+        except Exception as e:
+            # The entries stay buffered; the redelivered flush sends them again
+            record_failure(message_log, e)
+            for entry in pending:
+                status_writer.record(message_id, entry, 'ERROR', errorMessage=str(e))
+            return False
+        
+        message_log.set(status='SENT', sesMessageId=response['MessageId'])
+        record_latency(record, pending[0], message_log)
+        for entry in pending:
+            idempotency_guard.remember(entry, response['MessageId'])
+            status_writer.record(message_id, entry, 'SENT', messageId=response['MessageId'])
+    else:
+        message_log.set(status='DUPLICATE')
+    
+    # Entries left behind are found sent by the next flush of this recipient and discarded then
+    with message_log.stage('digest'):
+        if not digest_buffer.discard(keys):
+            logger.error(f"Could not discard the delivered entries of digest {body['digest']}")
+    return True
+
+def deliver_to_recipients(record, body, from_email, status_writer, message_log):
+    """Deliver a multi-recipient notification, returning True when every recipient got it"""
+    message_id = record['messageId']
+    
+    # One status item per recipient; repeated addresses get a single email
+    recipients = {}
+    for recipient in body['recipients']:
+        recipients.setdefault(recipient['to'], recipient)
+    bodies = {address: recipient_body(body, address) for address in recipients}
+    
+    # Skip recipients already sent, e.g. when the record is redelivered after a partial failure
+    with message_log.stage('idempotency'):
+        pending, duplicates = idempotency_guard.unsent(list(bodies.values()))
+    message_log.set(recipients=len(bodies), duplicateRecipients=len(duplicates))
+    for recipient, ses_message_id in duplicates:
+        if ses_message_id:
+            status_writer.record(message_id, recipient, 'SENT', messageId=ses_message_id)
+    if not pending:
+        message_log.set(status='DUPLICATE')
+        return True
+    pending = [recipients[recipient['to']] for recipient in pending]
+    
+    layout = email_layout(body, message_log)
+    
+    def before_send(count):
+        if send_rate_limiter:
+            with message_log.stage('rate_limit'):
+                send_rate_limiter.acquire(count)
+    
+    # The ses stage excludes the time spent waiting for send tokens between chunks
+    started = time.perf_counter()
+    rate_limited = message_log.timings.get('rate_limit', 0.0)
+    if any('variables' in recipient for recipient in pending):
+        # Personalised: the layout's SES template, filled in per destination
+        with message_log.stage('render'):
+            data = dict(email_parts(body['message'], body.get('buttonText'), layout),
+                        subject=body['subject'], message=body['message'])
+        results = send_templated(
+            ses_client(),
+            layout_templates.register(ses_client(), layout),
+            from_email,
+            data,
+            pending,
+            chunk_size=BULK_CHUNK_SIZE,
+            before_send=before_send
+        )
+    else:
+        # Identical content: one email per chunk of BCC recipients
+        with message_log.stage('render'):
+            html_content = create_html_email(
+                body['subject'],
+                body['message'],
+                button_text=body.get('buttonText'),
+                layout=layout
+            )
+        results = send_bcc_chunks(
+            ses_client(),
+            from_email,
+            body['subject'],
+            body['message'],
+            html_content,
+            [recipient['to'] for recipient in pending],
+            chunk_size=BULK_CHUNK_SIZE,
+            before_send=before_send
+        )
+    
+    message_log.add_timing(
+        'ses',
+        time.perf_counter() - started - (message_log.timings.get('rate_limit', 0.0) - rate_limited)
+    )
+    
+    # A failed recipient fails the record; its redelivery only retries the recipients not yet sent
+    delivered = True
+    for address, ses_message_id, error in results:
+        if ses_message_id:
+            idempotency_guard.remember(bodies[address], ses_message_id)
+            status_writer.record(message_id, bodies[address], 'SENT', messageId=ses_message_id)
+        else:
+            status_writer.record(message_id, bodies[address], 'ERROR', errorMessage=error)
+            delivered = False
+    
+    failed = sum(1 for _, ses_message_id, _ in results if not ses_message_id)
+    if failed < len(results):
+        record_latency(record, body, message_log)
+    message_log.set(status='SENT' if delivered else 'ERROR', failedRecipients=failed)
+    return delivered
+
+@init_metrics.report_cold_start('mailing')
+def handler(event, context):
+    """Lambda handler function for processing email notifications"""
+    records = event.get('Records', [])
+    status_writer = StatusWriter(
+        dynamodb_client(),
+        table_name,
+        retention=STATUS_RETENTION,
+        max_workers=DELIVERY_CONCURRENCY
+    )
+    
+    # One structured log record per message, emitted once its status is written
+    message_logs = {
+        record['messageId']: MessageLog('mailing', sqsMessageId=record['messageId'])
+        for record in records
+    }
+    
+    def deliver(record):
+        return process_record(record, status_writer, message_logs[record['messageId']])
+    
+    # Process the messages of the batch, up to DELIVERY_CONCURRENCY at a time
+    results = deliver_batch(records, deliver, max_workers=DELIVERY_CONCURRENCY)
+    
+    # Write the final status of every message of the batch; one that cannot be written
+    # is only logged (statusWritten false), as retrying the message would send it again
+    started = time.perf_counter()
+    unwritten_message_ids = status_writer.flush()
+    status_write_duration = time.perf_counter() - started
+    
+    # Permanent failures are moved to the dead-letter queue and acknowledged; the other
+    # failed records are retried after their backoff (or the visibility timeout if the
+    # dead-letter queue or the visibility change is unavailable)
+    retries = failure_router.route(records, results, message_logs)
+    
+    # Every message waited for the batch write before being acknowledged
+    for record_id, message_log in message_logs.items():
+        message_log.add_timing('status_write', status_write_duration)
+        message_log.emit(statusWritten=record_id not in unwritten_message_ids)
+    
+    # List to collect failed message IDs for SQS batch processing
+    failed_message_ids = [{'itemIdentifier': record['messageId']} for record in retries]
+    
+    # Publish the duplicate detection and template cache counters of the batch
+    if records:
+        counters = idempotency_guard.drain_counters()
+        if template_registry:
+            counters.update(template_registry.drain_counters())
+        emit_metrics(
+            counters,
+            dimensions={'Function': 'mailing'},
+            units=dict.fromkeys(counters, 'Count')
+        )
     
     # Return failed message IDs for SQS batch processing
     return {
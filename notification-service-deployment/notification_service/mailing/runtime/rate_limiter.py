@@ -0,0 +1,186 @@
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Key of the item holding the shared token bucket in the notification table
+BUCKET_KEY = {
+    'id': {'S': '__ses_send_rate__'},
+    'timestamp': {'S': 'bucket'}
+}
+
+# Seconds to use local pacing before trying the shared bucket again after a failure
+UNAVAILABLE_BACKOFF = 5.0
+
+
+class RateLimitExceeded(Exception):
+    """No send token could be obtained within the maximum wait"""
+
+
+class SendRateLimiter:
+    """Token bucket for the SES send rate, shared by every mailing container.
+    
+    The bucket lives in a single DynamoDB item updated with optimistic
+    concurrency. Containers lease tokens in blocks so only one read and one
+    conditional write are needed per lease_size sends; unused leased tokens
+    expire after lease_ttl seconds so they cannot be saved up for a burst.
+    When the bucket cannot be reached the container paces itself locally at
+    fallback_rate sends per second.
+    """
+
+    def __init__(self, get_client, table_name, rate, lease_size=5, lease_ttl=1.0,
+                 fallback_rate=None, max_wait=10.0):
+        self.get_client = get_client
+        self.table_name = table_name
+        self.rate = rate
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.capacity = max(rate, lease_size)  # One second of sends, at least one lease
+        self.fallback_rate = fallback_rate or rate
+        self.max_wait = max_wait
+        self._tokens = 0
+        self._lease_expires = 0.0
+        self._next_local_send = 0.0
+        self._unavailable_until = 0.0
+        self._misses = 0
+        self._lock = threading.Lock()  # Leased tokens and local pacing
+        self._lease_lock = threading.Lock()  # Round-trips to the shared bucket
+
+    def acquire(self, count=1):
+        """Block until count sends are allowed, raising RateLimitExceeded after max_wait.
+        
+        A multi-recipient email counts once per recipient against the SES
+        rate; the wait allowed grows with the time count sends take at rate.
+        """
+        deadline = time.time() + self.max_wait + (count - 1) / self.rate
+        for _ in range(count):
+            self._acquire_one(deadline)
+
+    def _acquire_one(self, deadline):
+        """Block until one send is allowed, raising RateLimitExceeded past deadline"""
+        while True:
+            with self._lock:
+                now = time.time()
+                if self._take_token(now):
+                    return
+                wait = self._pace_locally(now) if now < self._unavailable_until else None
+            
+            # One thread at a time leases from the shared bucket, outside the token lock,
+            # so the other threads keep taking leased tokens or pacing locally meanwhile
+            if wait is None:
+                with self._lease_lock:
+                    acquired, wait = self._refill()
+                if acquired:
+                    return
+            elif wait <= 0:
+                return
+            
+            if time.time() + wait > deadline:
+                raise RateLimitExceeded("No SES send token available in time")
+            time.sleep(wait)
+
+    def _take_token(self, now):
+        """Take a token of the current lease, if any is left; called under the token lock"""
+        if self._tokens > 0 and now < self._lease_expires:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _refill(self):
+        """Lease a block of tokens and take one; called under the lease lock.
+        
+        Returns (acquired, wait), wait being how long to wait before trying
+        again when no token was obtained.
+        """
+        with self._lock:
+            now = time.time()
+            # Another thread may have leased, or found the bucket unavailable, in the meantime
+            if self._take_token(now):
+                return True, 0.0
+            if now < self._unavailable_until:
+                return False, 0.0
+        
+        try:
+            granted, wait = self._lease(now)
+        except Exception as e:
+            logger.warning(f"Send rate bucket unavailable, pacing locally: {str(e)}")
+            with self._lock:
+                self._unavailable_until = now + UNAVAILABLE_BACKOFF
+            return False, 0.0
+        if not granted:
+            return False, wait
+        
+        with self._lock:
+            self._tokens = granted - 1
+            self._lease_expires = now + self.lease_ttl
+        return True, 0.0
+
+    def _pace_locally(self, now):
+        """Space sends 1/fallback_rate apart; returns 0 when a send is allowed now"""
+        if now >= self._next_local_send:
+            self._next_local_send = max(now, self._next_local_send) + 1.0 / self.fallback_rate
+            return 0.0
+        return self._next_local_send - now
+
+    def _lease(self, now):
+        """Take up to lease_size tokens from the shared bucket.
+        
+        Returns (granted, wait): the number of tokens obtained and, when none
+        were, how long to wait before trying again.
+        """
+        client = self.get_client()
+        item = client.get_item(
+            TableName=self.table_name,
+            Key=BUCKET_KEY,
+            ConsistentRead=True
+        ).get('Item')
+        
+        if item:
+            previous = item['refilledAt']['N']
+            tokens = float(item['tokens']['N'])
+            refilled_at = float(previous)
+        else:
+            previous = None
+            tokens = self.capacity
+            refilled_at = now
+        
+        # Refill for the time elapsed since the last lease. Only whole blocks are
+        # leased; containers that keep missing them back off exponentially, with
+        # jitter, so many waiting containers do not all poll the item every block.
+        tokens = min(self.capacity, tokens + max(0.0, now - refilled_at) * self.rate)
+        if tokens < self.lease_size:
+            self._misses += 1
+            spread = self.lease_size / self.rate * 2 ** min(self._misses - 1, 4)
+            return 0, (self.lease_size - tokens) / self.rate + random.uniform(0.0, spread)
+        granted = self.lease_size
+        
+        try:
+            client.update_item(
+                TableName=self.table_name,
+                Key=BUCKET_KEY,
+                UpdateExpression="SET #tokens = :tokens, refilledAt = :now",
+                ConditionExpression=(
+                    "attribute_not_exists(#tokens)" if previous is None else "refilledAt = :previous"
+                ),
+                ExpressionAttributeNames={
+                    '#tokens': 'tokens'
+                },
+                ExpressionAttributeValues={
+                    ':tokens': {'N': repr(tokens - granted)},
+                    ':now': {'N': repr(now)},
+                    **({':previous': {'N': previous}} if previous is not None else {})
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # Another container leased in between; retry shortly with fresh state
+                self._misses += 1
+                return 0, random.uniform(0.0, 0.02)
+            raise
+        
+        self._misses = 0
+        return granted, 0.0
@@ -0,0 +1,101 @@
+import base64
+import re
+import tempfile
+import uuid
+from email import policy
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import encode_rfc2231
+
+# Raw messages larger than this are spooled to /tmp while they are written
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# Attachments are read in blocks of a multiple of 57 bytes, which base64 encodes to whole 76-character lines
+LINE_BYTES = 57
+READ_SIZE = LINE_BYTES * 1000
+
+# Content types accepted as given; anything else is sent as application/octet-stream
+CONTENT_TYPE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9!#$&^_.+-]*/[A-Za-z0-9][A-Za-z0-9!#$&^_.+-]*$')
+
+
+def header(name, value):
+    """Folded header line, with non-ASCII values encoded as RFC 2047 words"""
+    return policy.SMTP.header_factory(name, value).fold(policy=policy.SMTP).encode('ascii')
+
+
+def attachment_headers(attachment):
+    """MIME headers of an attachment part"""
+    content_type = attachment.get('contentType') or ''
+    if not CONTENT_TYPE.match(content_type):
+        content_type = 'application/octet-stream'
+    
+    # RFC 2231 filename parameter, so any name survives quoting and encoding
+    filename = encode_rfc2231(attachment['filename'], 'utf-8')
+    return (
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Disposition: attachment; filename*={filename}\r\n"
+        "Content-Transfer-Encoding: base64\r\n"
+        "\r\n"
+    ).encode('ascii')
+
+
+def write_base64(out, stream):
+    """Write a stream as base64 lines, one block at a time"""
+    remainder = b''
+    while True:
+        block = stream.read(READ_SIZE)
+        if not block:
+            break
+        data = remainder + block
+        whole = len(data) - len(data) % LINE_BYTES
+        out.write(base64.encodebytes(data[:whole]).replace(b'\n', b'\r\n'))
+        remainder = data[whole:]
+    if remainder:
+        out.write(base64.encodebytes(remainder).replace(b'\n', b'\r\n'))
+
+
+def write_message(out, from_email, to, subject, text, html, attachments, open_attachment):
+    """Write a multipart/mixed message: the text and HTML alternatives, then the attachments.
+    
+    Attachments are copied from the streams returned by open_attachment
+    and encoded block by block, so none is ever held whole in memory.
+    """
+    boundary = f"mixed-{uuid.uuid4().hex}"
+    out.write(header('From', from_email))
+    out.write(header('To', to))
+    out.write(header('Subject', subject))
+    out.write(b"MIME-Version: 1.0\r\n")
+    out.write(f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode('ascii'))
+    
+    body = MIMEMultipart('alternative')
+    body.attach(MIMEText(text, 'plain', 'utf-8'))
+    body.attach(MIMEText(html, 'html', 'utf-8'))
+    del body['MIME-Version']
+    out.write(f"--{boundary}\r\n".encode('ascii'))
+    out.write(body.as_bytes(policy=policy.SMTP))
+    
+    for attachment in attachments:
+        out.write(f"\r\n--{boundary}\r\n".encode('ascii'))
+        out.write(attachment_headers(attachment))
+        stream = open_attachment(attachment)
+        try:
+            write_base64(out, stream)
+        finally:
+            stream.close()
+    out.write(f"\r\n--{boundary}--\r\n".encode('ascii'))
+
+
+def send_raw_email(ses, s3, from_email, to, subject, text, html, attachments):
+    """Send an email with attachments stored in S3 through SendRawEmail"""
+    def open_attachment(attachment):
+        return s3.get_object(Bucket=attachment['bucket'], Key=attachment['key'])['Body']
+    
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as message:
+        write_message(message, from_email, to, subject, text, html, attachments, open_attachment)
+        message.seek(0)
+        # SES takes the whole message in the request, so only the encoded copy is read back
+        return ses.send_raw_email(
+            Source=from_email,
+            Destinations=[to],
+            RawMessage={'Data': message.read()}
+        )
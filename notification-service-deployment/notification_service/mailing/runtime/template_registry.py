@@ -0,0 +1,131 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from email_template import EmailLayout
+
+logger = logging.getLogger()
+
+# Templates are stored as templates/<templateId>/<version>.json; notifications
+# without a templateVersion use the latest.json object of their template
+TEMPLATE_PREFIX = 'templates/'
+LATEST_VERSION = 'latest'
+TEMPLATE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+TEMPLATE_VERSION_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,32}$')
+
+
+def template_key(template_id, version=None):
+    """S3 key of a template version"""
+    version = version or LATEST_VERSION
+    if not TEMPLATE_ID_PATTERN.match(template_id) or not TEMPLATE_VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid template reference: {template_id!r} version {version!r}")
+    return f"{TEMPLATE_PREFIX}{template_id}/{version}.json"
+
+
+def parse_template(data):
+    """Compile a template document: {"html": ..., "paragraph": ..., "button": ..., "logoUrl": ...}"""
+    document = json.loads(data)
+    if not isinstance(document, dict) or not isinstance(document.get('html'), str):
+        raise ValueError("A template must be a JSON object with an html string")
+    options = {}
+    for name, field in (('paragraph', 'paragraph'), ('button', 'button'), ('logo_url', 'logoUrl')):
+        if document.get(field) is not None:
+            options[name] = document[field]
+    return EmailLayout(document['html'], **options)
+
+
+class TemplateRegistry:
+    """Email layouts stored in S3, compiled once per warm container.
+    
+    A numbered version never changes, so it is served from memory until
+    evicted. The latest version of a template is revalidated at most every
+    revalidate_after seconds with a GET conditional on its ETag, which
+    costs no transfer while it is unchanged; if S3 cannot be reached the
+    cached layout keeps being used. At most max_entries layouts are kept,
+    the least recently used being evicted first.
+    """
+
+    def __init__(self, get_client, bucket, max_entries=32, revalidate_after=60):
+        self.get_client = get_client
+        self.bucket = bucket
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_after
+        self._layouts = OrderedDict()
+        self._counters = {'TemplateCacheHits': 0, 'TemplateRevalidations': 0, 'TemplateFetches': 0}
+        self._lock = threading.Lock()
+
+    def get(self, template_id, version=None):
+        """Compiled layout of a template version (the latest one by default)"""
+        key = template_key(template_id, version)
+        with self._lock:
+            cached = self._layouts.get(key)
+            if cached is not None:
+                self._layouts.move_to_end(key)
+        
+        now = time.monotonic()
+        if cached is not None:
+            layout, etag, checked_at = cached
+            if (version or LATEST_VERSION) != LATEST_VERSION or now - checked_at < self.revalidate_after:
+                self._count('TemplateCacheHits')
+                return layout
+            return self._revalidate(key, layout, etag, now)
+        return self._fetch(key, now)
+
+    def _fetch(self, key, now):
+        """Read and compile a template, caching it"""
+        response = self.get_client().get_object(Bucket=self.bucket, Key=key)
+        layout = parse_template(response['Body'].read())
+        self._count('TemplateFetches')
+        self._store(key, layout, response.get('ETag'), now)
+        return layout
+
+    def _revalidate(self, key, layout, etag, now):
+        """Check a cached latest version against S3, fetching it again only if it changed"""
+        try:
+            response = self.get_client().get_object(Bucket=self.bucket, Key=key, IfNoneMatch=etag)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                self._count('TemplateRevalidations')
+                self._store(key, layout, etag, now)
+                return layout
+            if e.response.get('Error', {}).get('Code') == 'NoSuchKey':
+                with self._lock:
+                    self._layouts.pop(key, None)
+                raise
+            logger.warning(f"Could not revalidate template {key}, using the cached version: {str(e)}")
+            return layout
+        
+        # A broken update does not stop the deliveries: the last valid layout is kept for its ETag
+        self._count('TemplateFetches')
+        try:
+            changed = parse_template(response['Body'].read())
+        except ValueError as e:
+            logger.error(f"Invalid update of template {key}, using the cached version: {str(e)}")
+            changed = layout
+        self._store(key, changed, response.get('ETag'), now)
+        return changed
+
+    def _store(self, key, layout, etag, now):
+        """Cache a layout, evicting the least recently used ones beyond max_entries"""
+        with self._lock:
+            self._layouts[key] = (layout, etag, now)
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.max_entries:
+                self._layouts.popitem(last=False)
+
+    def _count(self, counter):
+        """Increment a cache counter"""
+        with self._lock:
+            self._counters[counter] += 1
+
+    def drain_counters(self):
+        """Return the cache counters accumulated since the last call and reset them"""
+        with self._lock:
+            counters = self._counters
+            self._counters = dict.fromkeys(counters, 0)
+        return counters
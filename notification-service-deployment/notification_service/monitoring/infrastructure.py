@@ -1,3 +1,4 @@
+from typing import Optional
 from aws_cdk import (
     Duration,
     aws_cloudwatch as cloudwatch,
@@ -10,6 +11,9 @@ from constructs import Construct
 from ..api.infrastructure import ApiComponent
 from ..queue.infrastructure import QueueComponent
 from ..mailing.infrastructure import MailingComponent
+from ..archive.infrastructure import ArchiveComponent
+from ..scheduler.infrastructure import SchedulerComponent
+from ..webhook.infrastructure import WebhookComponent
 
 
 class MonitoringComponent(Construct):
@@ -22,7 +26,11 @@ class MonitoringComponent(Construct):
         api_component: ApiComponent,
         queue_component: QueueComponent,
         mailing_component: MailingComponent,
+        archive_component: ArchiveComponent,
+        scheduler_component: SchedulerComponent,
         notification_table: dynamodb.Table,
+        end_to_end_latency_threshold: Duration = Duration.seconds(60),
+        webhook_component: Optional[WebhookComponent] = None,
         **kwargs
     ) -> None:
         super().__init__(scope, id)
@@ -62,6 +70,73 @@ class MonitoringComponent(Construct):
         )
         queue_depth_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
         
+        # Age of the oldest message per lane - how long notifications wait before delivery
+        bulk_queue_age_metric = queue_component.notification_queue.metric_approximate_age_of_oldest_message(
+            statistic="Maximum",
+            period=Duration.minutes(1),
+            label="Bulk lane"
+        )
+        priority_queue_age_metric = queue_component.priority_queue.metric_approximate_age_of_oldest_message(
+            statistic="Maximum",
+            period=Duration.minutes(1),
+            label="Priority lane"
+        )
+        
+        # Priority lane age alarm - Alert if a high-priority message waited more than 60 seconds for 3 minutes
+        priority_queue_age_alarm = cloudwatch.Alarm(
+            self, "PriorityQueueAgeAlarm",
+            metric=priority_queue_age_metric,
+            threshold=60,
+            evaluation_periods=3,
+            alarm_description="High-priority notifications waiting in queue",
+            alarm_name="NotificationPriorityQueueAgeAlarm",
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+        priority_queue_age_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
+        
+        # Delivery latency percentiles, published by the mailing functions in their EMF records:
+        # queue (enqueue -> first dequeue), delivery (first dequeue -> SES accepted) and end-to-end
+        latency_widgets = []
+        for metric_name, title in (
+            ("QueueLatency", "Queue Latency (ms)"),
+            ("DeliveryLatency", "Delivery Latency (ms)"),
+            ("EndToEndLatency", "End-to-End Latency (ms)"),
+        ):
+            latency_widgets.append(cloudwatch.GraphWidget(
+                title=title,
+                left=[
+                    cloudwatch.Metric(
+                        namespace="NotificationService",
+                        metric_name=metric_name,
+                        dimensions_map={"Function": "mailing"},
+                        statistic=statistic,
+                        period=Duration.minutes(1),
+                        label=statistic
+                    )
+                    for statistic in ("p50", "p90", "p99")
+                ]
+            ))
+        
+        # End-to-end latency alarm - Alert if p99 from POST to SES acceptance exceeds the threshold for 5 minutes
+        end_to_end_latency_alarm = cloudwatch.Alarm(
+            self, "EndToEndLatencyAlarm",
+            metric=cloudwatch.Metric(
+                namespace="NotificationService",
+                metric_name="EndToEndLatency",
+                dimensions_map={"Function": "mailing"},
+                statistic="p99",
+                period=Duration.minutes(1)
+            ),
+            threshold=end_to_end_latency_threshold.to_milliseconds(),
+            evaluation_periods=5,
+            alarm_description="p99 end-to-end notification latency exceeding threshold",
+            alarm_name="NotificationEndToEndLatencyAlarm",
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+        end_to_end_latency_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
+        
         # Monitor DLQ - ApproximateNumberOfMessagesVisible
         dlq_depth_metric = queue_component.dlq.metric_approximate_number_of_messages_visible(
             statistic="Maximum",
@@ -119,6 +194,70 @@ class MonitoringComponent(Construct):
         )
         lambda_errors_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
         
+        # Archive errors alarm - expired items are retried, then dropped, when archiving keeps failing
+        archive_errors_alarm = cloudwatch.Alarm(
+            self, "ArchiveErrorsAlarm",
+            metric=archive_component.lambda_function.metric_errors(
+                statistic="Sum",
+                period=Duration.minutes(5)
+            ),
+            threshold=0,
+            evaluation_periods=3,
+            alarm_description="Errors archiving expired notifications to S3",
+            alarm_name="NotificationArchiveErrorsAlarm",
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+        archive_errors_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
+        
+        # Archive failure alarm - a batch that exhausted its retries must be archived by hand
+        # (its records are only located by the message) before the stream retention drops them
+        archive_failure_metric = archive_component.failure_queue.metric_approximate_number_of_messages_visible(
+            statistic="Maximum",
+            period=Duration.minutes(1)
+        )
+        archive_failure_alarm = cloudwatch.Alarm(
+            self, "ArchiveFailureAlarm",
+            metric=archive_failure_metric,
+            threshold=0,
+            evaluation_periods=1,
+            alarm_description="Expired notifications could not be archived; read them back from the stream within 24 hours",
+            alarm_name="NotificationArchiveFailureAlarm",
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+        archive_failure_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
+        
+        # Scheduler lag alarm - scheduled notifications are late when the sweeper falls behind or keeps failing
+        schedule_lag_metric = cloudwatch.Metric(
+            namespace="NotificationService",
+            metric_name="ScheduleLag",
+            dimensions_map={"Function": "scheduler"},
+            statistic="Maximum",
+            period=Duration.minutes(5)
+        )
+        scheduler_alarm = cloudwatch.Alarm(
+            self, "SchedulerLagAlarm",
+            metric=cloudwatch.MathExpression(
+                expression="MAX([lag, errors * 300])",
+                using_metrics={
+                    "lag": schedule_lag_metric,
+                    "errors": scheduler_component.lambda_function.metric_errors(
+                        statistic="Sum",
+                        period=Duration.minutes(5)
+                    )
+                },
+                period=Duration.minutes(5)
+            ),
+            threshold=120,  # Seconds behind the current minute
+            evaluation_periods=2,
+            alarm_description="Scheduled notifications are being released late",
+            alarm_name="NotificationSchedulerLagAlarm",
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloudwatch.TreatMissingData.BREACHING  # The sweeper reports every minute
+        )
+        scheduler_alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
+        
         # Add widgets to the dashboard
         self.dashboard.add_widgets(
             # Queue monitoring
@@ -127,10 +266,18 @@ class MonitoringComponent(Construct):
                 left=[
                     queue_depth_metric,
                     queue_component.notification_queue.metric_approximate_number_of_messages_not_visible(),
-                    queue_component.notification_queue.metric_approximate_age_of_oldest_message(),
+                    queue_component.priority_queue.metric_approximate_number_of_messages_visible(),
                     dlq_depth_metric
                 ]
             ),
+            # Queue age per lane (seconds)
+            cloudwatch.GraphWidget(
+                title="Queue Age by Lane",
+                left=[
+                    bulk_queue_age_metric,
+                    priority_queue_age_metric
+                ]
+            ),
             # API Gateway metrics - Fix: use correct metric methods
             cloudwatch.GraphWidget(
                 title="API Gateway Metrics",
@@ -148,7 +295,78 @@ class MonitoringComponent(Construct):
                     mailing_component.lambda_function.metric_invocations(),
                     mailing_component.lambda_function.metric_errors(),
                     mailing_component.lambda_function.metric_duration(),
-                    mailing_component.lambda_function.metric_throttles()
+                    mailing_component.lambda_function.metric_throttles(),
+                    mailing_component.priority_function.metric_invocations(),
+                    mailing_component.priority_function.metric_errors(),
+                    mailing_component.priority_function.metric_throttles()
                 ]
             )
         )
+        
+        # Latency percentiles on their own row
+        self.dashboard.add_widgets(*latency_widgets)
+        
+        # Archive of the expired statuses
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Archive Metrics",
+                left=[
+                    cloudwatch.Metric(
+                        namespace="NotificationService",
+                        metric_name="ArchivedItems",
+                        dimensions_map={"Function": "archive"},
+                        statistic="Sum",
+                        period=Duration.minutes(5)
+                    ),
+                    archive_component.lambda_function.metric_errors(),
+                    archive_failure_metric
+                ],
+                right=[
+                    archive_component.lambda_function.metric(
+                        "IteratorAge",
+                        statistic="Maximum",
+                        period=Duration.minutes(5)
+                    )
+                ]
+            ),
+            # Scheduled notifications released per 5 minutes and how far the sweeper is behind
+            cloudwatch.GraphWidget(
+                title="Scheduler Metrics",
+                left=[
+                    cloudwatch.Metric(
+                        namespace="NotificationService",
+                        metric_name="ScheduledReleased",
+                        dimensions_map={"Function": "scheduler"},
+                        statistic="Sum",
+                        period=Duration.minutes(5)
+                    ),
+                    scheduler_component.lambda_function.metric_errors()
+                ],
+                right=[schedule_lag_metric]
+            )
+        )
+        
+        # Webhook deliveries: requests against the connections opened shows the keep-alive reuse
+        if webhook_component:
+            self.dashboard.add_widgets(
+                cloudwatch.GraphWidget(
+                    title="Webhook Metrics",
+                    left=[
+                        cloudwatch.Metric(
+                            namespace="NotificationService",
+                            metric_name=metric_name,
+                            dimensions_map={"Function": "webhook"},
+                            statistic="Sum",
+                            period=Duration.minutes(5)
+                        )
+                        for metric_name in ("WebhookRequests", "WebhookConnections")
+                    ] + [webhook_component.lambda_function.metric_errors()],
+                    right=[
+                        queue_component.webhook_queue.metric_approximate_age_of_oldest_message(
+                            statistic="Maximum",
+                            period=Duration.minutes(1),
+                            label="Webhook queue age"
+                        )
+                    ]
+                )
+            )
@@ -9,9 +9,24 @@ from constructs import Construct
 class QueueComponent(Construct):
     """SQS queue component for notification service"""
 
-    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        visibility_timeout: Duration = Duration.seconds(300),
+        priority_visibility_timeout: Duration = Duration.seconds(300),
+        webhook_visibility_timeout: Duration = Duration.seconds(300),
+        max_receive_count: int = 8,
+        **kwargs
+    ) -> None:
         super().__init__(scope, id)
         
+        # The mailing function retries with an exponential backoff (5s, 10s, ... 5min), so the
+        # receives span about as long as three visibility timeouts did; permanent failures
+        # are moved to the dead-letter queue by the mailing function without waiting for them
+        if max_receive_count < 1:
+            raise ValueError("max_receive_count must be at least 1")
+        
         # Create a dead letter queue for failed messages
         self.dlq = sqs.Queue(
             self, "NotificationDLQ",
@@ -22,15 +37,42 @@ class QueueComponent(Construct):
         # Create the main notification queue
         self.notification_queue = sqs.Queue(
             self, "NotificationQueue",
-            visibility_timeout=Duration.seconds(300),  # 5 minutes timeout for processing
+            visibility_timeout=visibility_timeout,  # Derived from the delivery profile of the consumer
+            retention_period=Duration.days(4),        # Keep messages for 4 days
+            encryption=sqs.QueueEncryption.SQS_MANAGED,  # Enable encryption
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=max_receive_count,  # After that many failed attempts, send to DLQ
+                queue=self.dlq
+            )
+        )
+        
+        # Create the high-priority queue, consumed separately so urgent notifications
+        # (password resets, verification codes) never wait behind bulk announcements
+        self.priority_queue = sqs.Queue(
+            self, "PriorityNotificationQueue",
+            visibility_timeout=priority_visibility_timeout,  # Derived from the delivery profile of the consumer
+            retention_period=Duration.days(4),        # Keep messages for 4 days
+            encryption=sqs.QueueEncryption.SQS_MANAGED,  # Enable encryption
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=max_receive_count,  # After that many failed attempts, send to DLQ
+                queue=self.dlq
+            )
+        )
+        
+        # Create the webhook queue, consumed by its own function so slow receivers never hold up email
+        self.webhook_queue = sqs.Queue(
+            self, "WebhookQueue",
+            visibility_timeout=webhook_visibility_timeout,  # Derived from the timeouts of the webhook consumer
             retention_period=Duration.days(4),        # Keep messages for 4 days
             encryption=sqs.QueueEncryption.SQS_MANAGED,  # Enable encryption
             dead_letter_queue=sqs.DeadLetterQueue(
-                max_receive_count=3,  # After 3 failed attempts, send to DLQ
+                max_receive_count=max_receive_count,  # After that many failed attempts, send to DLQ
                 queue=self.dlq
             )
         )
         
         # Outputs
         CfnOutput(self, "NotificationQueueUrl", value=self.notification_queue.queue_url)
+        CfnOutput(self, "PriorityNotificationQueueUrl", value=self.priority_queue.queue_url)
+        CfnOutput(self, "WebhookQueueUrl", value=self.webhook_queue.queue_url)
         CfnOutput(self, "NotificationQueueDlqUrl", value=self.dlq.queue_url)
@@ -0,0 +1,64 @@
+import os
+from typing import Optional
+from aws_cdk import (
+    Duration,
+    aws_lambda as lambda_,
+    aws_sqs as sqs,
+    aws_dynamodb as dynamodb,
+    aws_events as events,
+    aws_events_targets as targets,
+    aws_logs as logs,
+)
+from constructs import Construct
+
+
+class SchedulerComponent(Construct):
+    """Periodic sweeper enqueueing the notifications scheduled beyond the SQS delay"""
+
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        notification_queue: sqs.Queue, 
+        priority_queue: sqs.Queue, 
+        notification_table: dynamodb.Table, 
+        shared_layer: lambda_.ILayerVersion, 
+        max_buckets_per_run: int = 30,
+        schedule_index: Optional[str] = "ScheduleIndex",
+        **kwargs
+    ) -> None:
+        super().__init__(scope, id)
+        
+        # Lambda function sweeping the schedule index one minute bucket at a time;
+        # a single concurrent run keeps the cursor consistent
+        self.lambda_function = lambda_.Function(
+            self, "SchedulerHandler",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
+            handler="lambda_function.handler",
+            layers=[shared_layer],  # notification_common modules
+            environment={
+                "NOTIFICATION_TABLE": notification_table.table_name,
+                "SCHEDULE_INDEX": schedule_index or "",  # GSI on scheduleBucket + sendAt
+                "QUEUE_URL": notification_queue.queue_url,
+                "PRIORITY_QUEUE_URL": priority_queue.queue_url,  # Lane of "priority": "high" notifications
+                "MAX_BUCKETS_PER_RUN": str(max_buckets_per_run),  # Minutes caught up per run after an outage
+            },
+            timeout=Duration.seconds(55),  # Done before the next run starts
+            memory_size=256,
+            reserved_concurrent_executions=1,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        # Grant permission to read and release the scheduled notifications
+        notification_table.grant_read_write_data(self.lambda_function)
+        notification_queue.grant_send_messages(self.lambda_function)
+        priority_queue.grant_send_messages(self.lambda_function)
+        
+        # Run every minute; each run releases the notifications due by the end of the next minute
+        self.rule = events.Rule(
+            self, "SchedulerRule",
+            schedule=events.Schedule.rate(Duration.minutes(1)),
+            enabled=schedule_index is not None,  # Stored notifications wait until the index is built
+            targets=[targets.LambdaFunction(self.lambda_function, retry_attempts=0)]
+        )
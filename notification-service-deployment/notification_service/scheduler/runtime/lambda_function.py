@@ -0,0 +1,194 @@
+from notification_common.coldstart import init_metrics
+import os
+import logging
+import time
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from notification_common.clients import get_client
+from notification_common.metrics import emit_metrics
+from notification_common.schedule import (
+    BUCKET_SECONDS, MAX_DELAY_SECONDS, bucket_of, bucket_start, next_bucket
+)
+from notification_common.wire import decode
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+table_name = os.environ['NOTIFICATION_TABLE']
+SCHEDULE_INDEX = os.environ.get('SCHEDULE_INDEX', 'ScheduleIndex')
+QUEUE_URL = os.environ['QUEUE_URL']
+PRIORITY_QUEUE_URL = os.environ.get('PRIORITY_QUEUE_URL', QUEUE_URL)
+
+# Buckets swept per run at most, so a backlog after an outage is caught up over several runs
+MAX_BUCKETS_PER_RUN = int(os.environ.get('MAX_BUCKETS_PER_RUN', '30'))
+# How far back the first run starts, when there is no cursor yet
+INITIAL_LOOKBACK_SECONDS = 3600
+SQS_BATCH_LIMIT = 10  # SendMessageBatch accepts at most 10 entries
+
+# Item holding the last bucket swept; not a notification, so it has no index keys
+CURSOR_KEY = {
+    'id': {'S': '__schedule_sweeper__'},
+    'timestamp': {'S': 'cursor'}
+}
+
+def dynamodb_client():
+    """DynamoDB client created on first use"""
+    return get_client('dynamodb')
+
+def sqs_client():
+    """SQS client created on first use"""
+    return get_client('sqs')
+
+def read_cursor(now):
+    """Last bucket swept by a previous run"""
+    item = dynamodb_client().get_item(TableName=table_name, Key=CURSOR_KEY, ConsistentRead=True).get('Item')
+    if item:
+        return item['bucket']['S']
+    return bucket_of(datetime.fromtimestamp(now - INITIAL_LOOKBACK_SECONDS, timezone.utc))
+
+def write_cursor(bucket):
+    dynamodb_client().put_item(
+        TableName=table_name,
+        Item=dict(CURSOR_KEY, bucket={'S': bucket}, updatedAt={'S': datetime.utcnow().isoformat()})
+    )
+
+def scheduled_items(bucket):
+    """Notifications of a bucket that are still waiting, ordered by due time"""
+    items = []
+    query = {
+        'TableName': table_name,
+        'IndexName': SCHEDULE_INDEX,
+        'KeyConditionExpression': 'scheduleBucket = :bucket',
+        'FilterExpression': '#status = :scheduled',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {':bucket': {'S': bucket}, ':scheduled': {'S': 'SCHEDULED'}}
+    }
+    while True:
+        result = dynamodb_client().query(**query)
+        items.extend(result.get('Items', []))
+        if not result.get('LastEvaluatedKey'):
+            return items
+        query['ExclusiveStartKey'] = result['LastEvaluatedKey']
+
+def release_delays(items, bucket, now):
+    """SQS delay of each item, spreading the releases of a bucket evenly across its minute.
+    
+    An item is never released before it is due, but a minute with many
+    notifications due at the same second reaches the queue as a steady
+    flow rather than a spike; an item can be released up to a minute late.
+    """
+    start = bucket_start(bucket).timestamp()
+    step = BUCKET_SECONDS / len(items)
+    delays = []
+    for index, item in enumerate(items):
+        due = datetime.fromisoformat(item['sendAt']['S']).replace(tzinfo=timezone.utc).timestamp()
+        release = max(due, start + index * step)
+        delays.append(min(MAX_DELAY_SECONDS, max(0, int(release - now + 0.5))))
+    return delays
+
+def message_attributes(payload):
+    """SQS message attributes of a notification payload, as set by the API"""
+    return {
+        'NotificationType': {'DataType': 'String', 'StringValue': payload['type']},
+        'Priority': {'DataType': 'String', 'StringValue': payload['priority']}
+    }
+
+def enqueue(items, delays):
+    """Send the payloads of the items to their lane queues, returning the items sent"""
+    lanes = {}
+    for item, delay in zip(items, delays):
+        payload = decode(item['payload']['S'])
+        queue_url = PRIORITY_QUEUE_URL if payload.get('priority') == 'high' else QUEUE_URL
+        lanes.setdefault(queue_url, []).append((item, payload, delay))
+    
+    sent = []
+    for queue_url, lane in lanes.items():
+        for start in range(0, len(lane), SQS_BATCH_LIMIT):
+            chunk = lane[start:start + SQS_BATCH_LIMIT]
+            try:
+                response = sqs_client().send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {
+                            'Id': str(index),
+                            'MessageBody': item['payload']['S'],
+                            'MessageAttributes': message_attributes(payload),
+                            'DelaySeconds': delay
+                        }
+                        for index, (item, payload, delay) in enumerate(chunk)
+                    ]
+                )
+            except ClientError as e:
+                logger.error("Error enqueueing scheduled notifications: %s", str(e))
+                continue
+            for entry in response.get('Failed', []):
+                logger.error("Error enqueueing scheduled notification: %s", entry.get('Message'))
+            sent.extend(chunk[int(entry['Id'])][0] for entry in response.get('Successful', []))
+    return sent
+
+def mark_queued(item):
+    """Move a released item out of the schedule index, unless the mailing function already updated it"""
+    try:
+        dynamodb_client().update_item(
+            TableName=table_name,
+            Key={'id': item['id'], 'timestamp': item['timestamp']},
+            UpdateExpression='SET #status = :queued, updatedAt = :now REMOVE scheduleBucket, payload',
+            ConditionExpression='#status = :scheduled',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':queued': {'S': 'QUEUED'},
+                ':scheduled': {'S': 'SCHEDULED'},
+                ':now': {'S': datetime.utcnow().isoformat()}
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def sweep_bucket(bucket, now):
+    """Release the notifications of a bucket, returning (released, waiting)"""
+    items = scheduled_items(bucket)
+    items.sort(key=lambda item: item['sendAt']['S'])
+    if not items:
+        return 0, 0
+    
+    # A notification sent but not marked is sent again by the next run; the
+    # mailing function's idempotency guard drops the duplicate
+    sent = enqueue(items, release_delays(items, bucket, now))
+    for item in sent:
+        mark_queued(item)
+    return len(sent), len(items) - len(sent)
+
+@init_metrics.report_cold_start('scheduler')
+def handler(event, context):
+    """Enqueue the scheduled notifications due by the end of the coming minute"""
+    now = time.time()
+    cursor = read_cursor(now)
+    
+    # The API only stores notifications due more than MAX_DELAY_SECONDS ahead,
+    # so a bucket swept up to a minute early cannot receive new items afterwards
+    horizon = now + BUCKET_SECONDS
+    released = waiting = swept = 0
+    bucket = next_bucket(cursor)
+    while swept < MAX_BUCKETS_PER_RUN and bucket_start(bucket).timestamp() <= horizon:
+        bucket_released, bucket_waiting = sweep_bucket(bucket, now)
+        released += bucket_released
+        waiting += bucket_waiting
+        swept += 1
+        if bucket_waiting:
+            # The cursor stays before this bucket so the next run retries what is left
+            break
+        write_cursor(bucket)
+        cursor = bucket
+        bucket = next_bucket(bucket)
+    
+    # How far the cursor is behind the current minute, e.g. after an outage
+    lag = max(0.0, now - bucket_start(cursor).timestamp() - BUCKET_SECONDS)
+    logger.info("Released %d scheduled notifications from %d buckets, %d left", released, swept, waiting)
+    emit_metrics(
+        {'ScheduledReleased': released, 'ScheduledFailed': waiting, 'ScheduleLag': lag},
+        dimensions={'Function': 'scheduler'},
+        units={'ScheduledReleased': 'Count', 'ScheduledFailed': 'Count', 'ScheduleLag': 'Seconds'}
+    )
+    return {'released': released, 'buckets': swept, 'failed': waiting}
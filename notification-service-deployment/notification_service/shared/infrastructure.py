@@ -0,0 +1,20 @@
+import os
+from aws_cdk import (
+    aws_lambda as lambda_,
+)
+from constructs import Construct
+
+
+class SharedRuntimeComponent(Construct):
+    """Lambda layer with the runtime modules shared by the notification functions"""
+
+    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+        super().__init__(scope, id)
+        
+        # Layer content is installed under /opt/python, importable as notification_common
+        self.layer = lambda_.LayerVersion(
+            self, "SharedRuntimeLayer",
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_9],
+            description="Shared runtime modules of the notification service (clients, metrics, delivery)",
+        )
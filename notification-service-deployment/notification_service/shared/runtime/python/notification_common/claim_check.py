@@ -0,0 +1,58 @@
+import json
+import re
+
+# Payloads whose SQS body would exceed this many bytes are stored in S3 and enqueued as a
+# reference (SQS accepts 262144 bytes per message, and per SendMessageBatch call)
+DEFAULT_THRESHOLD = 200000
+
+# Objects of notifications scheduled beyond the SQS delay are stored under this prefix,
+# which the bucket lifecycle keeps for as long as a notification can be scheduled ahead
+SCHEDULED_PREFIX = 'scheduled/'
+
+# Payload fields kept in the reference, for routing and logging before the object is read
+REFERENCE_FIELDS = ('id', 'timestamp', 'type', 'priority', 'status', 'sendAt')
+
+# Characters kept in the object key of an attachment; the filename itself travels in the payload
+UNSAFE_KEY_CHARACTERS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def object_key(kind, notification_id, name, scheduled=False):
+    """Key of a payload or attachment object, e.g. payloads/<id>.json"""
+    prefix = SCHEDULED_PREFIX if scheduled else ''
+    return f"{prefix}{kind}/{notification_id}/{name}"
+
+
+def store_payload(s3, bucket, payload, scheduled=False):
+    """Store a payload in S3 and return the reference enqueued in its place"""
+    key = object_key('payloads', payload['id'], 'payload.json', scheduled)
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(payload).encode('utf-8'),
+        ContentType='application/json'
+    )
+    reference = {field: payload[field] for field in REFERENCE_FIELDS if field in payload}
+    reference['payloadRef'] = {'bucket': bucket, 'key': key}
+    return reference
+
+
+def load_payload(s3, reference):
+    """Payload of an enqueued reference, parsed from the S3 object as it is read"""
+    location = reference['payloadRef']
+    response = s3.get_object(Bucket=location['bucket'], Key=location['key'])
+    return json.load(response['Body'])
+
+
+def store_attachment(s3, bucket, notification_id, index, attachment, data, scheduled=False):
+    """Store the decoded content of an attachment and return its entry of the payload"""
+    name = UNSAFE_KEY_CHARACTERS.sub('_', attachment['filename'])[-100:] or 'attachment'
+    key = object_key('attachments', notification_id, f"{index}-{name}", scheduled)
+    content_type = attachment.get('contentType') or 'application/octet-stream'
+    s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+    return {
+        'filename': attachment['filename'],
+        'contentType': content_type,
+        'size': len(data),
+        'bucket': bucket,
+        'key': key
+    }
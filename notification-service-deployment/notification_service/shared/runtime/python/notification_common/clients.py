@@ -0,0 +1,34 @@
+import threading
+
+from .coldstart import init_metrics
+
+with init_metrics.measure('import.boto3'):
+    import boto3
+    from botocore.config import Config
+
+# Low-level clients created on first use and kept for the life of the container
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(service_name, **config):
+    """Return the cached boto3 client of a service, creating it on first use.
+    
+    Low-level clients are thread-safe and much cheaper to build than the
+    resource layer. The botocore config options only apply on creation.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                with init_metrics.measure(f'client.{service_name}'):
+                    client = boto3.client(service_name, config=Config(**config))
+                _clients[service_name] = client
+    return client
+
+
+def set_client(service_name, client):
+    """Use the given client for a service, e.g. a local stand-in"""
+    with _lock:
+        _clients[service_name] = client
@@ -0,0 +1,63 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import emit_metrics
+
+
+class InitMetrics:
+    """Init-phase timings of a Lambda container, emitted once on the cold start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.init_duration = None
+        self.timings = {}
+        self.cold = True
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, phase):
+        """Time a step of the container initialisation (imports, client creation)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.cold:
+                with self._lock:
+                    self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def report_cold_start(self, function_name):
+        """Decorate a handler so its first invocation emits the init metrics.
+        
+        The module-level init duration is taken when the handler is decorated,
+        i.e. at the end of the import of the function module.
+        """
+        self.init_duration = time.perf_counter() - self.started
+        
+        def decorator(function):
+            @functools.wraps(function)
+            def handler(event, context):
+                try:
+                    return function(event, context)
+                finally:
+                    if self.cold:
+                        self.emit(function_name)
+            return handler
+        
+        return decorator
+
+    def emit(self, function_name):
+        """Emit InitDuration and one InitDuration.<phase> metric per measured step"""
+        with self._lock:
+            if not self.cold:
+                return
+            self.cold = False
+            metrics = {'InitDuration': (self.init_duration or 0.0) * 1000}
+            for phase, duration in self.timings.items():
+                metrics[f'InitDuration.{phase}'] = duration * 1000
+        emit_metrics(metrics, dimensions={'Function': function_name})
+
+
+# Shared by every module of the container; created on the first import
+init_metrics = InitMetrics()
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# Worker pool kept across warm invocations so threads are not re-created per batch
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers):
+    """Return the shared worker pool, (re)creating it if the size changed"""
+    global _executor, _executor_size
+    with _executor_lock:
+        if _executor is None or _executor_size != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="delivery"
+            )
+            _executor_size = max_workers
+        return _executor
+
+
+def deliver_batch(records, process_record, max_workers=1):
+    """Apply process_record to every record with at most max_workers in flight.
+    
+    Results are returned in the same order as the records. process_record is
+    expected to handle its own errors and return a result for every record.
+    """
+    if max_workers <= 1 or len(records) <= 1:
+        return [process_record(record) for record in records]
+    
+    executor = get_executor(max_workers)
+    return list(executor.map(process_record, records))
@@ -0,0 +1,164 @@
+import logging
+import math
+import random
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger()
+
+# ChangeMessageVisibilityBatch accepts at most 10 entries per call
+SQS_BATCH_LIMIT = 10
+
+# Longest visibility timeout SQS accepts, in seconds (12 hours)
+MAX_VISIBILITY_TIMEOUT = 43200
+
+# Error codes a retry cannot fix: the message or the sender configuration is wrong.
+# Any other code (throttling, service errors, paused sending...) is retried.
+PERMANENT_CODES = {
+    'MessageRejected',
+    'MailFromDomainNotVerifiedException',
+    'ConfigurationSetDoesNotExistException',
+    'InvalidParameterValue',
+    'ValidationError',
+    'NoSuchKey',
+}
+
+
+def classify(exception):
+    """Return (retryable, reason) for the exception that failed a message"""
+    if isinstance(exception, ClientError):
+        code = exception.response.get('Error', {}).get('Code', 'Unknown')
+        return code not in PERMANENT_CODES, code
+    if isinstance(exception, BotoCoreError):
+        # Connection errors and timeouts
+        return True, type(exception).__name__
+    if isinstance(exception, ValueError):
+        # Bodies that are not JSON or not in a known wire format
+        return False, 'InvalidMessage'
+    # Unexpected errors are retried, so a fix deployed meanwhile still delivers the message
+    return True, type(exception).__name__
+
+
+def backoff_delay(receive_count, base_delay, max_delay, rng=random):
+    """Seconds before a retry: exponential in the receive count, with equal jitter"""
+    delay = min(max_delay, base_delay * 2 ** max(0, receive_count - 1))
+    return int(delay / 2 + rng.uniform(0, delay / 2))
+
+
+def queue_url(queue_arn):
+    """URL of the queue of an SQS event source ARN"""
+    _, partition, _, region, account, name = queue_arn.split(':', 5)
+    domain = 'amazonaws.com.cn' if partition == 'aws-cn' else 'amazonaws.com'
+    return f"https://sqs.{region}.{domain}/{account}/{name}"
+
+
+def message_attributes(record):
+    """Message attributes of an SQS event record, in the form SendMessage takes"""
+    attributes = {}
+    for name, attribute in (record.get('messageAttributes') or {}).items():
+        value = {'DataType': attribute['dataType']}
+        if attribute.get('stringValue') is not None:
+            value['StringValue'] = attribute['stringValue']
+        if attribute.get('binaryValue') is not None:
+            value['BinaryValue'] = attribute['binaryValue']
+        attributes[name] = value
+    return attributes
+
+
+class FailureRouter:
+    """Decides when a failed message is received again.
+    
+    Retryable failures are hidden for an exponential backoff with jitter
+    instead of the queue visibility timeout; permanent ones are moved to
+    the dead-letter queue at once, with the failure reason and the queue
+    they came from as message attributes.
+    """
+
+    def __init__(self, get_sqs_client, dead_letter_queue_url, base_delay, max_delay):
+        self.get_sqs_client = get_sqs_client
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def route(self, records, results, message_logs):
+        """Handle the records of a batch that failed, returning the ones to report as batch item failures.
+        
+        A record failed when its result is false; its message log tells
+        whether it is retryable and why, and may hold the retryAfter seconds
+        its retry must wait at least, e.g. until a claim held elsewhere
+        expires, which can exceed max_delay. A status that could not be written
+        does not fail its record: redelivering a message SES already accepted
+        would send it again.
+        """
+        retries = []
+        for record, delivered in zip(records, results):
+            if delivered:
+                continue
+            message_log = message_logs[record['messageId']]
+            if not delivered and message_log.properties.get('retryable') is False:
+                if self.dead_letter(record, message_log.properties['failureReason']):
+                    message_log.set(deadLettered=True)
+                    continue
+            retries.append(record)
+        
+        if retries:
+            min_delays = {
+                record['messageId']: message_logs[record['messageId']].properties.get('retryAfter') or 0
+                for record in retries
+            }
+            for message_id, delay in self.back_off(retries, min_delays).items():
+                message_logs[message_id].set(retryDelay=delay)
+        return retries
+
+    def dead_letter(self, record, reason):
+        """Send a record to the dead-letter queue, returning True when it can be acknowledged"""
+        if not self.dead_letter_queue_url:
+            return False
+        attributes = message_attributes(record)
+        attributes['FailureReason'] = {'DataType': 'String', 'StringValue': reason}
+        attributes['SourceQueueArn'] = {'DataType': 'String', 'StringValue': record['eventSourceARN']}
+        try:
+            self.get_sqs_client().send_message(
+                QueueUrl=self.dead_letter_queue_url,
+                MessageBody=record['body'],
+                MessageAttributes=attributes
+            )
+        except Exception as e:
+            logger.error(f"Error moving message {record['messageId']} to the dead-letter queue: {str(e)}")
+            return False
+        return True
+
+    def back_off(self, records, min_delays=None):
+        """Hide records for their backoff delay, at least min_delays[message id], returning the delay of each"""
+        delays = {}
+        lanes = {}
+        for record in records:
+            receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+            delay = backoff_delay(receive_count, self.base_delay, self.max_delay)
+            min_delay = math.ceil((min_delays or {}).get(record['messageId'], 0))
+            delays[record['messageId']] = min(MAX_VISIBILITY_TIMEOUT, max(delay, min_delay))
+            lanes.setdefault(queue_url(record['eventSourceARN']), []).append(record)
+        
+        # A record whose visibility cannot be changed is simply received again after the visibility timeout
+        for url, lane in lanes.items():
+            for start in range(0, len(lane), SQS_BATCH_LIMIT):
+                chunk = lane[start:start + SQS_BATCH_LIMIT]
+                try:
+                    response = self.get_sqs_client().change_message_visibility_batch(
+                        QueueUrl=url,
+                        Entries=[
+                            {
+                                'Id': str(index),
+                                'ReceiptHandle': record['receiptHandle'],
+                                'VisibilityTimeout': delays[record['messageId']]
+                            }
+                            for index, record in enumerate(chunk)
+                        ]
+                    )
+                except Exception as e:
+                    logger.error(f"Error setting the retry delay of {len(chunk)} messages: {str(e)}")
+                    continue
+                if response.get('Failed'):
+                    codes = sorted({entry['Code'] for entry in response['Failed']})
+                    logger.error(f"Error setting the retry delay of {len(response['Failed'])} messages: {', '.join(codes)}")
+        return delays
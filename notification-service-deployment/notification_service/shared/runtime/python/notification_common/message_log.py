@@ -0,0 +1,74 @@
+import os
+import random
+import time
+import traceback
+from contextlib import contextmanager
+
+from .metrics import emit_metrics
+
+# Fraction of messages whose record also carries the verbose fields (errors always do)
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+
+class MessageLog:
+    """Structured log record of one message, written as a single EMF line.
+
+    Stage timings become StageDuration.<stage> metrics and are extracted by
+    CloudWatch from the record itself. Small identifying fields are always
+    logged; verbose fields only for a sample of the messages, so the hot
+    path does not pay for serialising and ingesting them every time.
+    """
+
+    def __init__(self, function_name, sample_rate=None, **properties):
+        self.function_name = function_name
+        self.sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.sampled = random.random() < self.sample_rate
+        self.properties = properties
+        self.verbose_properties = {}
+        self.timings = {}
+        self.metrics = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a processing stage; repeated stages add up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(name, time.perf_counter() - start)
+
+    def add_timing(self, name, seconds):
+        """Add a duration measured elsewhere, e.g. a write shared by the whole batch"""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def metric(self, name, milliseconds):
+        """Add a duration metric that is not a processing stage, e.g. a queue dwell time"""
+        self.metrics[name] = milliseconds
+
+    def set(self, **properties):
+        """Fields logged with every record"""
+        self.properties.update(properties)
+
+    def verbose(self, **properties):
+        """Fields logged with sampled records only"""
+        self.verbose_properties.update(properties)
+
+    def error(self, exception):
+        """Record a failure; failed messages are always logged in full"""
+        self.sampled = True
+        self.properties['error'] = str(exception)
+        self.verbose_properties['traceback'] = traceback.format_exc()
+
+    def emit(self, **properties):
+        """Write the record with the total duration and the duration of each stage"""
+        self.properties.update(properties)
+        metrics = {'MessageDuration': (time.perf_counter() - self.started) * 1000}
+        for name, seconds in self.timings.items():
+            metrics[f'StageDuration.{name}'] = seconds * 1000
+        metrics.update(self.metrics)
+
+        record = dict(self.properties)
+        if self.sampled:
+            record.update(self.verbose_properties)
+        emit_metrics(metrics, dimensions={'Function': self.function_name}, properties=record)
@@ -0,0 +1,42 @@
+import json
+import time
+
+# CloudWatch namespace of the metrics emitted by the notification functions
+NAMESPACE = "NotificationService"
+
+# Where EMF records are written; stdout is shipped to CloudWatch Logs by Lambda
+_sink = print
+
+
+def set_sink(sink):
+    """Send EMF records to another callable (e.g. to silence them locally)"""
+    global _sink
+    _sink = sink
+
+
+def emit_metrics(metrics, dimensions=None, units=None, properties=None, namespace=NAMESPACE):
+    """Write metrics as one CloudWatch Embedded Metric Format (EMF) record.
+    
+    CloudWatch extracts the metrics from the log line itself, so no
+    PutMetricData call is made. The record is printed rather than logged:
+    the Lambda log formatter would prefix it and break the JSON.
+    """
+    dimensions = dimensions or {}
+    units = units or {}
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [
+                    {'Name': name, 'Unit': units.get(name, 'Milliseconds')}
+                    for name in metrics
+                ]
+            }]
+        },
+        **(properties or {}),
+        **dimensions,
+        **metrics,
+    }
+    _sink(json.dumps(record))
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+# Scheduled notifications are indexed by the minute they are due in
+BUCKET_SECONDS = 60
+BUCKET_FORMAT = '%Y-%m-%dT%H:%M'
+
+# Longest delay SQS applies to a message itself (DelaySeconds)
+MAX_DELAY_SECONDS = 900
+
+
+def parse_send_at(value):
+    """Parse an ISO 8601 sendAt into an aware UTC datetime (naive values are taken as UTC)"""
+    if not isinstance(value, str):
+        raise ValueError('sendAt must be an ISO 8601 date and time')
+    try:
+        send_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('sendAt must be an ISO 8601 date and time') from None
+    if send_at.tzinfo is None:
+        return send_at.replace(tzinfo=timezone.utc)
+    return send_at.astimezone(timezone.utc)
+
+
+def format_time(moment):
+    """Naive UTC ISO 8601 text, the format of the payload timestamps"""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def bucket_of(moment):
+    """Schedule bucket (minute) of an aware datetime"""
+    return moment.astimezone(timezone.utc).strftime(BUCKET_FORMAT)
+
+
+def bucket_start(bucket):
+    """Aware UTC datetime at which a schedule bucket starts"""
+    return datetime.strptime(bucket, BUCKET_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def next_bucket(bucket):
+    return bucket_of(bucket_start(bucket) + timedelta(seconds=BUCKET_SECONDS))
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from .delivery import deliver_batch
+
+logger = logging.getLogger()
+
+# Key of the status items, which the updates leave alone
+KEY_ATTRIBUTES = ('id', 'timestamp')
+
+# Lease of a delivery claim (see the mailing idempotency guard), ended by any status written here
+CLAIM_ATTRIBUTE = 'claimedUntil'
+
+
+class StatusWriter:
+    """Buffers notification status transitions for a batch and writes them at the end.
+    
+    Only the last transition recorded for a notification is written, so a
+    delivered message costs a single item write instead of one update per
+    status. Each write is an UpdateItem setting the attributes of the
+    transition only, so those written earlier (e.g. by the API for a
+    scheduled notification, or a digestKey) are kept; the writes of a batch
+    run up to max_workers at a time. Items get an expiresAt TTL from the
+    retention of their status (seconds, statuses without retention never
+    expire).
+    """
+
+    def __init__(self, client, table_name, retention=None, max_attempts=4, base_delay=0.05, max_workers=1):
+        self.client = client
+        self.table_name = table_name
+        self.retention = retention or {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_workers = max_workers
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def record(self, record_id, body, status, **attributes):
+        """Buffer a status transition for the notification carried by an SQS record"""
+        item = {
+            'id': {'S': body['id']},
+            'timestamp': {'S': body['timestamp']},
+            'status': {'S': status},
+            'updatedAt': {'S': datetime.utcnow().isoformat()},
+        }
+        for name in ('to', 'subject', 'sendAt'):
+            if isinstance(body.get(name), str):
+                item[name] = {'S': body[name]}
+        for name, value in attributes.items():
+            item[name] = {'S': value}
+        if status in self.retention:
+            item['expiresAt'] = {'N': str(int(time.time() + self.retention[status]))}
+        
+        with self._lock:
+            self._items[(body['id'], body['timestamp'])] = (record_id, item)
+
+    def flush(self):
+        """Write every buffered transition, returning the SQS record ids whose status could not be written"""
+        with self._lock:
+            pending = list(self._items.values())
+            self._items = {}
+        
+        written = deliver_batch(pending, self._write_item, max_workers=self.max_workers)
+        return {record_id for (record_id, _), ok in zip(pending, written) if not ok}
+
+    def _write_item(self, entry):
+        """Update one status item, retrying throttled writes with exponential backoff"""
+        record_id, item = entry
+        key = {name: item[name] for name in KEY_ATTRIBUTES}
+        names = {}
+        values = {}
+        assignments = []
+        for index, (name, value) in enumerate(item.items()):
+            if name in KEY_ATTRIBUTES:
+                continue
+            names[f'#a{index}'] = name
+            values[f':v{index}'] = value
+            assignments.append(f'#a{index} = :v{index}')
+        update_expression = 'SET ' + ', '.join(assignments)
+        
+        # A status without retention must not keep the TTL of an earlier one
+        removals = [CLAIM_ATTRIBUTE] + (['expiresAt'] if 'expiresAt' not in item else [])
+        for name in removals:
+            names[f'#{name}'] = name
+        update_expression += ' REMOVE ' + ', '.join(f'#{name}' for name in removals)
+        
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.base_delay * (2 ** (attempt - 1)))
+            try:
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key=key,
+                    UpdateExpression=update_expression,
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values
+                )
+                return True
+            except ClientError as e:
+                logger.error(f"Error writing the status of notification {key['id']['S']}: {str(e)}")
+        
+        logger.error(f"Could not write the status of notification {key['id']['S']} (message {record_id})")
+        return False
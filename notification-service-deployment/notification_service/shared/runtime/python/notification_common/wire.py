@@ -0,0 +1,86 @@
+import base64
+import json
+import zlib
+
+# Version of the compact format, written after its marker: c1: is compact JSON and z1:
+# zlib-compressed compact JSON in base64 (SQS bodies must be text)
+WIRE_VERSION = 1
+COMPACT_MARKER = 'c'
+COMPRESSED_MARKER = 'z'
+
+# Bodies whose compact JSON is longer than this many bytes are compressed, when it helps
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+# Short key of each payload field; fields not listed here are kept under their own name
+SHORT_KEYS = {
+    'id': 'i',
+    'timestamp': 't',
+    'type': 'y',
+    'to': 'r',
+    'recipients': 'rs',
+    'subject': 's',
+    'message': 'm',
+    'from': 'f',
+    'buttonText': 'b',
+    'priority': 'p',
+    'status': 'st',
+    'sendAt': 'at',
+    'digestKey': 'dk',
+    'digestWindow': 'dw',
+    'digestSubject': 'ds',
+    'attachments': 'a',
+    'payloadRef': 'ref',
+}
+LONG_KEYS = {short: name for name, short in SHORT_KEYS.items()}
+
+# Values left out of the body, and restored by the decoder, when a payload has them
+DEFAULTS = {
+    'type': 'email',  # Also sent as the NotificationType message attribute
+    'status': 'QUEUED',
+    'priority': 'normal',
+}
+
+# Optional fields the API always sets, left out when empty
+OPTIONAL_FIELDS = ('from', 'buttonText')
+
+# Fields a decoded payload starts from, before the ones of the body
+DECODED_DEFAULTS = dict(DEFAULTS, **dict.fromkeys(OPTIONAL_FIELDS))
+
+
+def encode(payload, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """Compact, versioned queue body of a notification payload"""
+    compact = {}
+    for name, value in payload.items():
+        if DEFAULTS.get(name, ()) == value or (value is None and name in OPTIONAL_FIELDS):
+            continue
+        compact[SHORT_KEYS.get(name, name)] = value
+    text = json.dumps(compact, separators=(',', ':'), ensure_ascii=False)
+    try:
+        data = text.encode('utf-8')
+    except UnicodeEncodeError:
+        # Lone surrogates cannot be sent raw; escaped, they decode to the same strings
+        text = json.dumps(compact, separators=(',', ':'))
+        data = text.encode('utf-8')
+    
+    if len(data) > compress_threshold:
+        compressed = base64.b64encode(zlib.compress(data)).decode('ascii')
+        if len(compressed) < len(data):
+            return f"{COMPRESSED_MARKER}{WIRE_VERSION}:{compressed}"
+    return f"{COMPACT_MARKER}{WIRE_VERSION}:{text}"
+
+
+def decode(body):
+    """Payload of a queue body, in the compact format or the plain JSON of earlier releases"""
+    if body.startswith('{'):
+        return json.loads(body)
+    
+    marker, separator, data = body.partition(':')
+    if not separator or marker[1:] != str(WIRE_VERSION) or marker[:1] not in (COMPACT_MARKER, COMPRESSED_MARKER):
+        raise ValueError(f"Unsupported queue body format: {marker[:8]!r}")
+    if marker[:1] == COMPRESSED_MARKER:
+        data = zlib.decompress(base64.b64decode(data))
+    compact = json.loads(data)
+    
+    payload = DECODED_DEFAULTS.copy()
+    payload.update((LONG_KEYS.get(key, key), value) for key, value in compact.items())
+    return payload
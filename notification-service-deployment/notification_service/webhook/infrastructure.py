@@ -0,0 +1,144 @@
+import json
+import math
+import os
+from typing import Dict, Optional, Sequence
+from aws_cdk import (
+    Duration,
+    aws_lambda as lambda_,
+    aws_sqs as sqs,
+    aws_dynamodb as dynamodb,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_logs as logs,
+    aws_secretsmanager as secretsmanager,
+    CfnOutput,
+)
+from constructs import Construct
+from ..mailing.profiles import VISIBILITY_TIMEOUT_MULTIPLE
+
+# Seconds added to the worst-case request time of a batch for decoding, signing and the status writes
+TIMEOUT_MARGIN = 10
+
+
+class WebhookComponent(Construct):
+    """Webhook delivery component for notification service"""
+
+    def __init__(
+        self, 
+        scope: Construct, 
+        id: str, 
+        webhook_queue: sqs.Queue, 
+        notification_table: dynamodb.Table, 
+        shared_layer: lambda_.ILayerVersion, 
+        dead_letter_queue: Optional[sqs.IQueue] = None,
+        allowed_hosts: Sequence[str] = (),
+        batch_size: int = 10,
+        max_batching_window: Duration = Duration.seconds(1),
+        max_concurrency: Optional[int] = 5,
+        concurrency: int = 10,
+        max_connections_per_host: int = 4,
+        connect_timeout: Duration = Duration.seconds(2),
+        read_timeout: Duration = Duration.seconds(5),
+        log_sample_rate: float = 0.01,
+        status_retention: Optional[Dict[str, Duration]] = None,
+        retry_base_delay: Duration = Duration.seconds(5),
+        retry_max_delay: Duration = Duration.minutes(5),
+        **kwargs
+    ) -> None:
+        super().__init__(scope, id)
+        
+        if not 1 <= batch_size <= 10:
+            raise ValueError("batch_size must be between 1 and 10")
+        if concurrency < 1 or max_connections_per_host < 1:
+            raise ValueError("concurrency and max_connections_per_host must be at least 1")
+        
+        # Retries are delayed with ChangeMessageVisibility, which allows 12 hours at most
+        if not 0 < retry_base_delay.to_seconds() <= retry_max_delay.to_seconds() <= 43200:
+            raise ValueError("retry delays must satisfy 0 < retry_base_delay <= retry_max_delay <= 12 hours")
+        
+        # Worst case: the whole batch targets one host, so it is sent max_connections_per_host
+        # requests at a time, each taking up to the connect and read timeouts
+        request_seconds = connect_timeout.to_seconds() + read_timeout.to_seconds()
+        rounds = math.ceil(batch_size / min(concurrency, max_connections_per_host))
+        self.timeout = Duration.seconds(math.ceil(rounds * request_seconds) + TIMEOUT_MARGIN)
+        self._check_visibility_timeout(webhook_queue, max_batching_window)
+        
+        # Time each status stays in the table before expiring into the archive
+        if status_retention is None:
+            status_retention = {
+                "SENT": Duration.days(30),
+                "ERROR": Duration.days(90),
+            }
+        
+        # Secret every request is signed with (HMAC-SHA256), shared with the receivers
+        self.signing_secret = secretsmanager.Secret(
+            self, "WebhookSigningSecret",
+            description="Key signing the webhook requests of the notification service",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                exclude_punctuation=True,
+                password_length=64
+            )
+        )
+        
+        environment = {
+            "NOTIFICATION_TABLE": notification_table.table_name,
+            "WEBHOOK_SECRET_ARN": self.signing_secret.secret_arn,  # Read once per container
+            "WEBHOOK_ALLOWED_HOSTS": ",".join(allowed_hosts),  # Checked again before each request
+            "WEBHOOK_CONCURRENCY": str(concurrency),  # Webhooks of a batch delivered in parallel
+            "WEBHOOK_MAX_CONNECTIONS_PER_HOST": str(max_connections_per_host),  # Keep-alive pool size per host
+            "WEBHOOK_CONNECT_TIMEOUT": str(connect_timeout.to_seconds()),  # Seconds to open a connection
+            "WEBHOOK_READ_TIMEOUT": str(read_timeout.to_seconds()),  # Seconds to wait for the response
+            "LOG_SAMPLE_RATE": str(log_sample_rate),  # Messages logged with their verbose fields
+            "RETRY_BASE_DELAY": str(int(retry_base_delay.to_seconds())),  # Backoff of the first retry, doubled per receive
+            "RETRY_MAX_DELAY": str(int(retry_max_delay.to_seconds())),  # Longest backoff between receives
+            "STATUS_RETENTION": json.dumps({  # Seconds before each status expires (TTL)
+                status: int(retention.to_seconds()) for status, retention in status_retention.items()
+            }),
+        }
+        if dead_letter_queue:
+            environment["DEAD_LETTER_QUEUE_URL"] = dead_letter_queue.queue_url  # Permanent failures, moved at once
+        
+        # Lambda function to process messages from the webhook queue and POST them to their URL
+        self.lambda_function = lambda_.Function(
+            self, "WebhookHandler",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "runtime")),
+            handler="lambda_function.handler",
+            layers=[shared_layer],  # notification_common modules
+            environment=environment,
+            timeout=self.timeout,
+            memory_size=256,
+            log_retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        # Grant permissions to the Lambda function
+        notification_table.grant_read_write_data(self.lambda_function)
+        self.signing_secret.grant_read(self.lambda_function)
+        if dead_letter_queue:
+            dead_letter_queue.grant_send_messages(self.lambda_function)  # Permanent failures
+        
+        # max_concurrency bounds the containers, so a host gets at most
+        # max_concurrency * max_connections_per_host requests at once
+        self.lambda_function.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                webhook_queue,
+                batch_size=batch_size,
+                max_batching_window=max_batching_window,
+                max_concurrency=max_concurrency,
+                report_batch_item_failures=True,  # Enable partial batch responses
+            )
+        )
+        
+        # Outputs
+        CfnOutput(self, "WebhookLambdaArn", value=self.lambda_function.function_arn)
+        CfnOutput(self, "WebhookSigningSecretArn", value=self.signing_secret.secret_arn)
+
+    def _check_visibility_timeout(self, queue: sqs.Queue, max_batching_window: Duration) -> None:
+        """Reject a queue that could redeliver webhooks still being sent"""
+        cfn_queue = queue.node.default_child
+        visibility_timeout = getattr(cfn_queue, "visibility_timeout", None)
+        required = VISIBILITY_TIMEOUT_MULTIPLE * self.timeout.to_seconds() + max_batching_window.to_seconds()
+        if visibility_timeout is not None and visibility_timeout < required:
+            raise ValueError(
+                f"Queue {queue.node.path} has a visibility timeout of {visibility_timeout}s, "
+                f"the webhook consumer needs at least {required}s"
+            )
@@ -0,0 +1,199 @@
+from notification_common.coldstart import init_metrics
+import json
+import os
+import logging
+import threading
+from urllib.parse import urlsplit
+from notification_common.clients import get_client
+from notification_common.delivery import deliver_batch
+from notification_common.failures import FailureRouter, classify
+from notification_common.message_log import MessageLog
+from notification_common.metrics import emit_metrics
+from notification_common.status_writer import StatusWriter
+from notification_common.wire import decode
+
+with init_metrics.measure('import.modules'):
+    from http_client import WebhookClient, is_retryable_status, target_error
+    from signing import signature_headers
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Number of webhooks of a batch delivered in parallel
+WEBHOOK_CONCURRENCY = max(1, int(os.environ.get('WEBHOOK_CONCURRENCY', '10')))
+
+# Keep-alive connections per host, which is also the most requests in flight to one host,
+# hosts with a pool kept open, and request timeouts in seconds
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS_PER_HOST', '4'))
+MAX_HOSTS = int(os.environ.get('WEBHOOK_MAX_HOSTS', '16'))
+CONNECT_TIMEOUT = float(os.environ.get('WEBHOOK_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('WEBHOOK_READ_TIMEOUT', '5'))
+
+# Hosts webhooks may be sent to, as the API checks them too (comma-separated), and URL schemes
+ALLOWED_HOSTS = {host.strip().lower() for host in os.environ.get('WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()}
+ALLOWED_SCHEMES = tuple(os.environ.get('WEBHOOK_SCHEMES', 'https').split(','))
+
+# Secrets Manager secret whose value signs every request (HMAC-SHA256)
+WEBHOOK_SECRET_ARN = os.environ.get('WEBHOOK_SECRET_ARN')
+
+# Seconds each status is kept in the table before expiring (TTL), e.g. {"SENT": 2592000}
+STATUS_RETENTION = json.loads(os.environ.get('STATUS_RETENTION', '{}'))
+
+# Retryable failures are received again after RETRY_BASE_DELAY * 2^(receives - 1) seconds,
+# at most RETRY_MAX_DELAY, with jitter; permanent ones go to the dead-letter queue at once
+RETRY_BASE_DELAY = int(os.environ.get('RETRY_BASE_DELAY', '5'))
+RETRY_MAX_DELAY = int(os.environ.get('RETRY_MAX_DELAY', '300'))
+DEAD_LETTER_QUEUE_URL = os.environ.get('DEAD_LETTER_QUEUE_URL')
+
+table_name = os.environ['NOTIFICATION_TABLE']
+
+def dynamodb_client():
+    """DynamoDB client writing the webhook statuses"""
+    return get_client('dynamodb')
+
+def sqs_client():
+    """SQS client used to schedule retries"""
+    return get_client('sqs')
+
+# Read on first use and kept for the life of the container
+_signing_secret = None
+_signing_secret_lock = threading.Lock()
+
+def signing_secret():
+    """Value of the signing secret, None when webhooks are not signed"""
+    global _signing_secret
+    if _signing_secret is None and WEBHOOK_SECRET_ARN:
+        with _signing_secret_lock:
+            if _signing_secret is None:
+                response = get_client('secretsmanager').get_secret_value(SecretId=WEBHOOK_SECRET_ARN)
+                _signing_secret = response['SecretString']
+    return _signing_secret
+
+# Keep-alive connection pools, kept across warm invocations
+webhook_client = WebhookClient(
+    max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    max_hosts=MAX_HOSTS
+)
+
+# Retry delays and dead-lettering of the records that failed
+failure_router = FailureRouter(
+    sqs_client,
+    DEAD_LETTER_QUEUE_URL,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY
+)
+
+def request_body(body):
+    """JSON document POSTed to the webhook URL"""
+    return json.dumps({
+        'id': body['id'],
+        'event': body['event'],
+        'timestamp': body['timestamp'],
+        'data': body.get('data')
+    }, separators=(',', ':')).encode('utf-8')
+
+def process_record(record, status_writer, message_log):
+    """Deliver a single webhook, returning True when it can be acknowledged"""
+    message_id = record['messageId']
+    body = None
+    
+    try:
+        with message_log.stage('parse'):
+            body = decode(record['body'])
+        message_log.set(notificationId=body.get('id'), event=body.get('event'))
+        
+        # Retrying cannot fix an invalid message: it goes to the dead-letter queue at once
+        missing_fields = [field for field in ('id', 'timestamp', 'url', 'event') if field not in body]
+        error = (
+            f"Missing required fields: {', '.join(missing_fields)}" if missing_fields
+            else target_error(body['url'], ALLOWED_HOSTS, ALLOWED_SCHEMES)
+        )
+        if error:
+            message_log.set(status='INVALID', error=error, retryable=False, failureReason='InvalidMessage')
+            if not missing_fields:
+                status_writer.record(message_id, body, 'ERROR', errorMessage=error)
+            return False
+        message_log.set(host=urlsplit(body['url']).hostname)
+        
+        # Receivers deduplicate redeliveries by X-Notification-Id and check the signature
+        content = request_body(body)
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Notification-Id': body['id'],
+            'X-Notification-Event': body['event'],
+        }
+        secret = signing_secret()
+        if secret:
+            headers.update(signature_headers(secret, content))
+        
+        with message_log.stage('http'):
+            status, response_text = webhook_client.post(body['url'], content, headers)
+        message_log.set(responseStatus=status)
+        
+        if 200 <= status < 300:
+            message_log.set(status='SENT')
+            status_writer.record(message_id, body, 'SENT', responseStatus=str(status))
+            return True
+        
+        # 5xx, 408, 425 and 429 are retried later; other statuses will not change by themselves
+        error = f"HTTP {status}: {response_text[:200]}"
+        message_log.set(status='ERROR', error=error, retryable=is_retryable_status(status), failureReason=f"HTTP{status}")
+        status_writer.record(message_id, body, 'ERROR', errorMessage=error)
+        return False
+    
+    except Exception as e:
+        # Connection errors and timeouts are retried, bodies that cannot be read are not
+        retryable, reason = classify(e)
+        message_log.set(status='ERROR', retryable=retryable, failureReason=reason)
+        message_log.error(e)
+        if isinstance(body, dict) and 'id' in body and 'timestamp' in body:
+            status_writer.record(message_id, body, 'ERROR', errorMessage=str(e))
+        return False
+
+@init_metrics.report_cold_start('webhook')
+def handler(event, context):
+    """Lambda handler function for delivering webhook notifications"""
+    records = event.get('Records', [])
+    status_writer = StatusWriter(
+        dynamodb_client(),
+        table_name,
+        retention=STATUS_RETENTION,
+        max_workers=WEBHOOK_CONCURRENCY
+    )
+    
+    # One structured log record per message, emitted once its status is written
+    message_logs = {
+        record['messageId']: MessageLog('webhook', sqsMessageId=record['messageId'])
+        for record in records
+    }
+    
+    def deliver(record):
+        return process_record(record, status_writer, message_logs[record['messageId']])
+    
+    # Deliver the webhooks of the batch, up to WEBHOOK_CONCURRENCY at a time
+    results = deliver_batch(records, deliver, max_workers=WEBHOOK_CONCURRENCY)
+    
+    # Write the final status of every webhook of the batch; one that cannot be written is
+    # only logged (statusWritten false), as retrying the message would deliver it again
+    unwritten_message_ids = status_writer.flush()
+    
+    # Permanent failures are moved to the dead-letter queue, the others retried after their backoff
+    retries = failure_router.route(records, results, message_logs)
+    for record_id, message_log in message_logs.items():
+        message_log.emit(statusWritten=record_id not in unwritten_message_ids)
+    
+    # Requests sent and connections opened, whose ratio shows how often keep-alive pays off
+    counters = webhook_client.drain_counters()
+    if counters['WebhookRequests']:
+        emit_metrics(
+            counters,
+            dimensions={'Function': 'webhook'},
+            units=dict.fromkeys(counters, 'Count')
+        )
+    
+    return {
+        'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in retries]
+    }
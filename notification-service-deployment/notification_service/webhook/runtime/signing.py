@@ -0,0 +1,33 @@
+import hashlib
+import hmac
+import time
+
+# Header carrying the signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">
+SIGNATURE_HEADER = 'X-Notification-Signature'
+
+# Signatures older than this many seconds are rejected by verify (replayed requests)
+DEFAULT_TOLERANCE = 300
+
+
+def compute_signature(secret, timestamp, body):
+    """Hex HMAC-SHA256 of a request body, bound to the time it was signed"""
+    message = str(timestamp).encode('ascii') + b'.' + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def signature_headers(secret, body, timestamp=None):
+    """Headers signing a webhook request body with the shared secret"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return {SIGNATURE_HEADER: f"t={timestamp},v1={compute_signature(secret, timestamp, body)}"}
+
+
+def verify(secret, header, body, tolerance=DEFAULT_TOLERANCE, now=None):
+    """Check a signature header against a received body, as a receiver does"""
+    fields = dict(part.split('=', 1) for part in (header or '').split(',') if '=' in part)
+    try:
+        timestamp = int(fields['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs((time.time() if now is None else now) - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(fields.get('v1', ''), compute_signature(secret, timestamp, body))
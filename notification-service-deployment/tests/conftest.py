@@ -0,0 +1,14 @@
+"""Puts the repository root and the Lambda runtime directories on the import path"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.runtime import RUNTIME_DIRS, SHARED_RUNTIME_DIR  # noqa: E402
+
+# The shared layer is mounted under /opt/python in Lambda, next to each function's code
+for path in (SHARED_RUNTIME_DIR, RUNTIME_DIRS['mailing']):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,123 @@
+"""Duplicate suppression of the mailing function with claims held by other deliveries"""
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.fakes import FakeDynamoDB, FakeSES, FakeSQS
+from benchmarks.runtime import DEFAULT_ENVIRONMENT, load_runtime, make_notification, make_sqs_event, use_clients
+from idempotency import IdempotencyGuard
+
+TABLE = DEFAULT_ENVIRONMENT['NOTIFICATION_TABLE']
+LEASE = 900
+
+
+class RecordingSQS(FakeSQS):
+    """SQS stand-in keeping the retry delay set for each receipt handle"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.retry_delays = {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        for entry in Entries:
+            self.retry_delays[entry['ReceiptHandle']] = entry['VisibilityTimeout']
+        return super().change_message_visibility_batch(QueueUrl, Entries)
+
+
+class FailingStatusWrites(FakeDynamoDB):
+    """DynamoDB stand-in failing the status writes (unconditional updates) while failing is set"""
+    
+    failing = False
+
+    def update_item(self, **kwargs):
+        if self.failing and 'ConditionExpression' not in kwargs:
+            raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'Injected failure'}}, 'UpdateItem')
+        return super().update_item(**kwargs)
+
+
+@pytest.fixture
+def clients():
+    ses, sqs, dynamodb = FakeSES(), RecordingSQS(), FailingStatusWrites()
+    use_clients(ses=ses, sqs=sqs, dynamodb=dynamodb)
+    return ses, sqs, dynamodb
+
+
+def mailing():
+    """A fresh mailing container"""
+    return load_runtime('mailing', {'STATUS_CLAIM_LEASE': str(LEASE)})
+
+
+def status_item(dynamodb, payload):
+    key = {'id': {'S': payload['id']}, 'timestamp': {'S': payload['timestamp']}}
+    return dynamodb.get_item(TableName=TABLE, Key=key)['Item']
+
+
+def receive(container, event, receive_count):
+    """Deliver the same SQS message again, as SQS would after its visibility timeout"""
+    for record in event['Records']:
+        record['attributes']['ApproximateReceiveCount'] = str(receive_count)
+    return container.handler(event, None)
+
+
+def failed_ids(result):
+    return [failure['itemIdentifier'] for failure in result['batchItemFailures']]
+
+
+def test_copy_claimed_elsewhere_is_retried_after_the_lease(clients):
+    ses, sqs, dynamodb = clients
+    payload = make_notification()
+    event = make_sqs_event([payload])
+    record = event['Records'][0]
+    
+    # Another container received the same message and holds the claim
+    other = IdempotencyGuard(lambda: dynamodb, TABLE, claim_lease=LEASE)
+    assert other.claim(payload) == (True, {})
+    
+    container = mailing()
+    result = receive(container, event, 1)
+    assert failed_ids(result) == [record['messageId']]
+    assert not ses.sent
+    assert sqs.retry_delays[record['receiptHandle']] >= LEASE - 5
+    assert status_item(dynamodb, payload)['status']['S'] == 'PROCESSING'
+    
+    # The other delivery fails; the retry lands on this container, which did not remember the copy
+    dynamodb.update_item(
+        TableName=TABLE,
+        Key={'id': {'S': payload['id']}, 'timestamp': {'S': payload['timestamp']}},
+        UpdateExpression='SET #status = :error REMOVE claimedUntil',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={':error': {'S': 'ERROR'}}
+    )
+    result = receive(container, event, 2)
+    assert failed_ids(result) == []
+    assert [sent['Destination']['ToAddresses'] for sent in ses.sent] == [[payload['to']]]
+    assert status_item(dynamodb, payload)['status']['S'] == 'SENT'
+
+
+def test_retry_after_a_lost_error_status_waits_for_the_lease(clients):
+    ses, sqs, dynamodb = clients
+    payload = make_notification()
+    event = make_sqs_event([payload])
+    record = event['Records'][0]
+    container = mailing()
+    
+    # SES fails and so does the ERROR status write: the item keeps its PROCESSING claim
+    ses.error_rate, dynamodb.failing = 1.0, True
+    result = receive(container, event, 1)
+    assert failed_ids(result) == [record['messageId']]
+    assert 'claimedUntil' in status_item(dynamodb, payload)
+    
+    # Received again inside the lease: retried later, not acknowledged as a duplicate
+    ses.error_rate, dynamodb.failing = 0.0, False
+    result = receive(container, event, 2)
+    assert failed_ids(result) == [record['messageId']]
+    assert not ses.sent
+    assert sqs.retry_delays[record['receiptHandle']] >= LEASE - 5
+    
+    # Once the lease has run out the notification is sent
+    item = status_item(dynamodb, payload)
+    item['claimedUntil'] = {'N': '0'}
+    dynamodb.put_item(TableName=TABLE, Item=item)
+    result = receive(container, event, 3)
+    assert failed_ids(result) == []
+    assert len(ses.sent) == 1
+    assert status_item(dynamodb, payload)['status']['S'] == 'SENT'
@@ -0,0 +1,95 @@
+"""SES send-rate token bucket shared through the notification table"""
+import threading
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeDynamoDB
+from rate_limiter import BUCKET_KEY, RateLimitExceeded, SendRateLimiter
+
+TABLE = 'NotificationTable'
+
+
+def limiter(dynamodb, **kwargs):
+    return SendRateLimiter(lambda: dynamodb, TABLE, **kwargs)
+
+
+def test_sends_up_to_capacity_at_once_then_waits():
+    dynamodb = FakeDynamoDB()
+    bucket = limiter(dynamodb, rate=10, lease_size=5, max_wait=0.1)
+    
+    started = time.monotonic()
+    bucket.acquire(10)
+    assert time.monotonic() - started < 0.1
+    
+    # The bucket is empty; the next block of 5 takes half a second to refill
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire()
+
+
+def test_leases_blocks_of_tokens():
+    dynamodb = FakeDynamoDB()
+    bucket = limiter(dynamodb, rate=100, lease_size=10)
+    bucket.acquire(30)
+    
+    # One read and one conditional write per block of 10 sends
+    assert dynamodb.calls['GetItem'] == 3
+    assert dynamodb.calls['UpdateItem'] == 3
+    item = dynamodb.get_item(TableName=TABLE, Key=BUCKET_KEY)['Item']
+    assert float(item['tokens']['N']) < 100 - 30 + 1
+
+
+def test_containers_share_the_rate():
+    dynamodb = FakeDynamoDB(latency=0.002)
+    rate, duration = 20, 1.5
+    limiters = [limiter(dynamodb, rate=rate, lease_size=2, max_wait=duration) for _ in range(4)]
+    sends = []
+    lock = threading.Lock()
+    start = time.monotonic()
+    
+    def consume(bucket):
+        while True:
+            try:
+                bucket.acquire()
+            except RateLimitExceeded:
+                return
+            if time.monotonic() - start >= duration:
+                return
+            with lock:
+                sends.append(time.monotonic())
+    
+    threads = [threading.Thread(target=consume, args=(bucket,)) for bucket in limiters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # A full bucket (one second of sends) plus the refill over the run, and most of it used
+    assert len(sends) <= limiters[0].capacity + rate * duration
+    assert len(sends) >= rate * duration / 2
+
+
+def test_paces_locally_while_the_bucket_is_unavailable():
+    dynamodb = FakeDynamoDB(error_rate=1.0)
+    bucket = limiter(dynamodb, rate=100, fallback_rate=20)
+    
+    started = time.monotonic()
+    bucket.acquire(5)
+    
+    # 1/20s apart, the first one at once; the bucket is not tried again during the backoff
+    assert time.monotonic() - started >= 4 / 20 - 0.01
+    assert dynamodb.calls['GetItem'] == 1
+
+
+def test_lease_round_trips_do_not_hold_the_token_lock():
+    dynamodb = FakeDynamoDB(latency=0.3)
+    bucket = limiter(dynamodb, rate=10, lease_size=5)
+    leasing = threading.Thread(target=bucket.acquire)
+    leasing.start()
+    time.sleep(0.05)
+    
+    try:
+        assert bucket._lock.acquire(timeout=0.1)
+        bucket._lock.release()
+    finally:
+        leasing.join()
@@ -0,0 +1,101 @@
+"""Selection and deletion of the dead-letter queue messages redriven"""
+import json
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.fakes import FakeSQS
+from tools.redrive import Redriver
+
+DLQ_URL = 'https://sqs.eu-west-1.amazonaws.com/123456789012/NotificationDLQ'
+QUEUE_URL = 'https://sqs.eu-west-1.amazonaws.com/123456789012/NotificationQueue'
+SOURCE_ARN = 'arn:aws:sqs:eu-west-1:123456789012:NotificationQueue'
+
+
+def add_failed(sqs, to, reason, enqueued=None):
+    """Put a notification moved to the DLQ by the mailing function, returning its id"""
+    enqueued = enqueued or datetime.now(timezone.utc)
+    body = {'id': f'n-{to}', 'timestamp': enqueued.isoformat(), 'type': 'email', 'to': to, 'priority': 'normal'}
+    sqs.add_message(
+        DLQ_URL,
+        json.dumps(body),
+        Attributes={'SentTimestamp': str(int(enqueued.timestamp() * 1000))},
+        MessageAttributes={
+            'Priority': {'DataType': 'String', 'StringValue': 'normal'},
+            'FailureReason': {'DataType': 'String', 'StringValue': reason},
+            'SourceQueueArn': {'DataType': 'String', 'StringValue': SOURCE_ARN}
+        }
+    )
+    return body['id']
+
+
+def redrive(sqs, **filters):
+    redriver = Redriver(sqs, DLQ_URL, rate=0, workers=2, wait_time=0, empty_receives=1, **filters)
+    return redriver.run()
+
+
+def ids_in(sqs, queue_url):
+    return sorted(json.loads(message['Body'])['id'] for message in sqs.queues.get(queue_url, []))
+
+
+def test_redrives_the_matching_messages_and_deletes_them():
+    sqs = FakeSQS()
+    throttled = add_failed(sqs, 'a@example.com', 'An error occurred (Throttling) when calling SendEmail')
+    rejected = add_failed(sqs, 'b@example.com', 'An error occurred (MessageRejected) when calling SendEmail')
+    
+    summary = redrive(sqs, error='Throttling')
+    
+    assert summary['received'] == 2
+    assert summary['redriven'] == 1
+    assert summary['errorTypes'] == {'Throttling': 1, 'MessageRejected': 1}
+    assert ids_in(sqs, QUEUE_URL) == [throttled]
+    assert ids_in(sqs, DLQ_URL) == [rejected]
+    
+    # The failure attributes are dropped; the message left out is visible again
+    assert list(sqs.queues[QUEUE_URL][0]['MessageAttributes']) == ['Priority']
+    assert sqs.receive_message(QueueUrl=DLQ_URL)['Messages']
+
+
+def test_filters_on_recipient_and_enqueue_time():
+    sqs = FakeSQS()
+    now = datetime.now(timezone.utc)
+    recent = add_failed(sqs, 'a@example.org', 'Throttling', enqueued=now)
+    add_failed(sqs, 'b@example.org', 'Throttling', enqueued=now - timedelta(days=2))
+    add_failed(sqs, 'c@example.com', 'Throttling', enqueued=now)
+    
+    summary = redrive(sqs, recipient='*@EXAMPLE.org', since=now - timedelta(hours=1))
+    
+    assert (summary['matched'], summary['skipped']) == (1, 2)
+    assert ids_in(sqs, QUEUE_URL) == [recent]
+    assert len(ids_in(sqs, DLQ_URL)) == 2
+
+
+def test_dry_run_sends_and_deletes_nothing():
+    sqs = FakeSQS()
+    for index in range(15):
+        add_failed(sqs, f'{index}@example.com', 'Throttling')
+    
+    summary = redrive(sqs, dry_run=True)
+    
+    assert (summary['received'], summary['matched'], summary['redriven']) == (15, 15, 0)
+    assert QUEUE_URL not in sqs.queues
+    assert sqs.queue_length(DLQ_URL) == 15
+    assert sqs.calls['SendMessageBatch'] == sqs.calls['DeleteMessageBatch'] == 0
+
+
+def test_keeps_the_messages_that_could_not_be_sent():
+    sqs = FakeSQS()
+    first = add_failed(sqs, 'a@example.com', 'Throttling')
+    second = add_failed(sqs, 'b@example.com', 'Throttling')
+    send_message_batch = sqs.send_message_batch
+    
+    def fail_second(QueueUrl, Entries):
+        response = send_message_batch(QueueUrl, [entry for entry in Entries if second not in entry['MessageBody']])
+        failed = [entry for entry in Entries if second in entry['MessageBody']]
+        response['Failed'] = [{'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError'} for entry in failed]
+        return response
+    sqs.send_message_batch = fail_second
+    
+    summary = redrive(sqs)
+    
+    assert (summary['redriven'], summary['failed']) == (1, 1)
+    assert ids_in(sqs, QUEUE_URL) == [first]
+    assert ids_in(sqs, DLQ_URL) == [second]
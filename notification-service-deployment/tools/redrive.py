@@ -0,0 +1,472 @@
+"""Inspect and redrive the messages of the notification dead-letter queue.
+
+Several workers drain the DLQ with long-polling ReceiveMessage calls (10
+messages each). Every message is classified by error type (the
+FailureReason message attribute, else the errorMessage of its status item),
+recipient and enqueue time; the ones matching the filters are sent back to
+the queue they failed from with SendMessageBatch, under a rate ceiling, and
+then deleted from the DLQ. Messages left out stay hidden until the drain is
+over, then are made visible again. A message redriven but not deleted (e.g.
+the delete call failed) is delivered twice; the mailing function's
+idempotency guard drops the duplicate.
+
+Usage:
+    python -m tools.redrive --dlq-url URL --dry-run
+    python -m tools.redrive --dlq-url URL --error 'Throttling|ServiceUnavailable' --since 2025-06-12T08:00 --rate 20
+    python -m tools.redrive --dlq-url URL --recipient '*@example.com' --target-url URL --max-messages 500
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Message bodies are decoded with the modules of the shared Lambda layer
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_RUNTIME_DIR = os.path.join(ROOT, 'notification_service', 'shared', 'runtime', 'python')
+if SHARED_RUNTIME_DIR not in sys.path:
+    sys.path.insert(0, SHARED_RUNTIME_DIR)
+
+from notification_common.claim_check import load_payload
+from notification_common.wire import decode
+
+# SQS batch APIs take at most 10 entries
+SQS_BATCH_LIMIT = 10
+
+# Code of an AWS error message, e.g. "An error occurred (Throttling) when calling ..."
+ERROR_CODE = re.compile(r'\((\w+)\)')
+
+# Attributes of the messages the mailing function moved to the DLQ itself, dropped on redrive
+FAILURE_ATTRIBUTES = ('FailureReason', 'SourceQueueArn')
+
+
+class RateLimiter:
+    """Token bucket shared by the workers: at most rate messages per second, in bursts of one batch"""
+
+    def __init__(self, rate, burst=SQS_BATCH_LIMIT):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count):
+        """Wait until count messages may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_time(value):
+    """Aware UTC datetime of an ISO 8601 argument (naive values are taken as UTC)"""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def error_type(error_message):
+    """Short error type of a failure: its AWS error code, or the first words of the message"""
+    if not error_message:
+        return 'Unknown'
+    match = ERROR_CODE.search(error_message)
+    if match:
+        return match.group(1)
+    return ' '.join(error_message.split()[:4])
+
+
+def source_arn(message):
+    """ARN of the queue a message failed from: set by SQS on redrive, or by the mailing function"""
+    return (
+        message['Attributes'].get('DeadLetterQueueSourceArn')
+        or (message.get('MessageAttributes') or {}).get('SourceQueueArn', {}).get('StringValue')
+    )
+
+
+def recipients_of(body):
+    """Addresses a notification body is sent to"""
+    if isinstance(body.get('to'), str):
+        return [body['to']]
+    return [recipient['to'] for recipient in body.get('recipients') or [] if isinstance(recipient, dict)]
+
+
+class Redriver:
+    """Drains a dead-letter queue, redriving the messages that match the filters"""
+
+    def __init__(
+        self,
+        sqs,
+        dlq_url,
+        target_url=None,
+        dynamodb=None,
+        table_name=None,
+        s3=None,
+        error=None,
+        recipient=None,
+        since=None,
+        until=None,
+        rate=10.0,
+        dry_run=False,
+        workers=8,
+        wait_time=20,
+        empty_receives=2,
+        visibility_timeout=900,
+        max_messages=None
+    ):
+        self.sqs = sqs
+        self.dlq_url = dlq_url
+        self.target_url = target_url
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.s3 = s3
+        self.error = re.compile(error, re.IGNORECASE) if error else None
+        self.recipient = recipient.lower() if recipient else None
+        self.since = since
+        self.until = until
+        self.limiter = RateLimiter(rate) if rate > 0 else None
+        self.dry_run = dry_run
+        self.workers = workers
+        self.wait_time = wait_time
+        self.empty_receives = empty_receives
+        self.visibility_timeout = visibility_timeout
+        self.max_messages = max_messages
+        
+        self.counts = Counter()
+        self.error_types = Counter()
+        self.sources = Counter()
+        self.oldest = None
+        self.newest = None
+        self._seen = set()
+        self._held = []  # Receipt handles of the messages left out, released at the end
+        self._queue_urls = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, progress=None, interval=1.0):
+        """Drain the queue and return the summary; progress(summary) is called every interval seconds"""
+        started = time.monotonic()
+        next_report = started + interval
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='redrive') as executor:
+            futures = [executor.submit(self._drain) for _ in range(self.workers)]
+            while not all(future.done() for future in futures):
+                time.sleep(min(interval, 0.1))
+                if progress and time.monotonic() >= next_report:
+                    next_report += interval
+                    progress(self.summary(time.monotonic() - started))
+            for future in futures:
+                future.result()
+        self._release()
+        return self.summary(time.monotonic() - started)
+
+    def summary(self, elapsed):
+        with self._lock:
+            return {
+                'dryRun': self.dry_run,
+                'elapsed': elapsed,
+                'received': self.counts['received'],
+                'matched': self.counts['matched'],
+                'redriven': self.counts['redriven'],
+                'failed': self.counts['failed'],
+                'skipped': self.counts['received'] - self.counts['matched'],
+                'rate': self.counts['redriven'] / elapsed if elapsed else 0.0,
+                'errorTypes': dict(self.error_types.most_common()),
+                'sources': dict(self.sources.most_common()),
+                'oldest': self.oldest,
+                'newest': self.newest,
+            }
+
+    def _drain(self):
+        """Worker loop: receive, classify and redrive until the queue looks empty"""
+        empty = 0
+        while not self._stop.is_set() and empty < self.empty_receives:
+            response = self.sqs.receive_message(
+                QueueUrl=self.dlq_url,
+                MaxNumberOfMessages=SQS_BATCH_LIMIT,
+                WaitTimeSeconds=self.wait_time,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=['All'],
+                MessageAttributeNames=['All']
+            )
+            messages = self._first_receives(response.get('Messages', []))
+            if not messages:
+                empty += 1
+                continue
+            empty = 0
+            
+            matched, held = self._classify(messages)
+            if self.dry_run:
+                held += matched
+            elif matched:
+                self._redrive(matched)
+            with self._lock:
+                self._held.extend(message['ReceiptHandle'] for message in held)
+
+    def _first_receives(self, messages):
+        """Messages not seen yet in this run, counting them against max_messages"""
+        with self._lock:
+            fresh = []
+            for message in messages:
+                limit_reached = self.max_messages and self.counts['received'] + len(fresh) >= self.max_messages
+                if message['MessageId'] in self._seen or limit_reached:
+                    # Received again after its visibility timeout, or beyond the limit: release it
+                    self._held.append(message['ReceiptHandle'])
+                    continue
+                self._seen.add(message['MessageId'])
+                fresh.append(message)
+            self.counts['received'] += len(fresh)
+            if self.max_messages and self.counts['received'] >= self.max_messages:
+                self._stop.set()
+            return fresh
+
+    def _classify(self, messages):
+        """Split messages into (matched, held), recording their error type, source and age"""
+        bodies = [self._decode(message['Body']) for message in messages]
+        errors = self._error_messages(messages, bodies)
+        matched, held = [], []
+        for message, body, error in zip(messages, bodies, errors):
+            kind = 'Unparseable' if body is None else error_type(error)
+            sent = datetime.fromtimestamp(int(message['Attributes'].get('SentTimestamp', '0')) / 1000, timezone.utc)
+            source = (source_arn(message) or '').rsplit(':', 1)[-1] or 'unknown'
+            if self._matches(body, kind, error, sent):
+                matched.append(message)
+            else:
+                held.append(message)
+            with self._lock:
+                self.error_types[kind] += 1
+                self.sources[source] += 1
+                self.oldest = min(self.oldest or sent, sent)
+                self.newest = max(self.newest or sent, sent)
+        with self._lock:
+            self.counts['matched'] += len(matched)
+        return matched, held
+
+    def _matches(self, body, kind, error, sent):
+        if self.since and sent < self.since:
+            return False
+        if self.until and sent >= self.until:
+            return False
+        if self.error and not (self.error.search(kind) or (error and self.error.search(error))):
+            return False
+        if self.recipient:
+            addresses = recipients_of(self._resolve(body)) if body is not None else []
+            if not any(fnmatch.fnmatch(address.lower(), self.recipient) for address in addresses):
+                return False
+        return True
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return decode(text)
+        except (ValueError, TypeError):
+            return None
+
+    def _resolve(self, body):
+        """Payload of a body, read from S3 when it was enqueued as a reference"""
+        if 'payloadRef' not in body or self.s3 is None:
+            return body
+        return load_payload(self.s3, body)
+
+    def _error_messages(self, messages, bodies):
+        """Failure of each message: its FailureReason attribute, else the errorMessage of its status item"""
+        errors = [
+            (message.get('MessageAttributes') or {}).get('FailureReason', {}).get('StringValue')
+            for message in messages
+        ]
+        keys = {
+            (body['id'], body['timestamp'])
+            for body, error in zip(bodies, errors)
+            if error is None and body is not None and 'id' in body and 'timestamp' in body
+        }
+        if not keys or self.dynamodb is None:
+            return errors
+        
+        found = {}
+        request = {self.table_name: {
+            'Keys': [{'id': {'S': id_}, 'timestamp': {'S': timestamp}} for id_, timestamp in keys],
+            'ProjectionExpression': 'id, #timestamp, errorMessage',
+            'ExpressionAttributeNames': {'#timestamp': 'timestamp'}
+        }}
+        while request:
+            response = self.dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(self.table_name, []):
+                if 'errorMessage' in item:
+                    found[(item['id']['S'], item['timestamp']['S'])] = item['errorMessage']['S']
+            request = response.get('UnprocessedKeys') or None
+        return [
+            error if error is not None or body is None else found.get((body.get('id'), body.get('timestamp')))
+            for body, error in zip(bodies, errors)
+        ]
+
+    def _target(self, message):
+        """Queue a message is sent back to: the queue it failed from, unless a target is given"""
+        if self.target_url:
+            return self.target_url
+        arn = source_arn(message)
+        if not arn:
+            return None
+        with self._lock:
+            queue_url = self._queue_urls.get(arn)
+        if queue_url is None:
+            _, _, _, _, account, name = arn.split(':', 5)
+            queue_url = self.sqs.get_queue_url(QueueName=name, QueueOwnerAWSAccountId=account)['QueueUrl']
+            with self._lock:
+                self._queue_urls[arn] = queue_url
+        return queue_url
+
+    def _redrive(self, messages):
+        """Send messages back to their queues, deleting from the DLQ the ones sent"""
+        lanes = {}
+        for message in messages:
+            lanes.setdefault(self._target(message), []).append(message)
+        unroutable = lanes.pop(None, [])
+        if unroutable:
+            with self._lock:
+                self.counts['failed'] += len(unroutable)
+                self._held.extend(message['ReceiptHandle'] for message in unroutable)
+        
+        for queue_url, lane in lanes.items():
+            if self.limiter:
+                self.limiter.acquire(len(lane))
+            response = self.sqs.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {
+                        'Id': str(index),
+                        'MessageBody': message['Body'],
+                        'MessageAttributes': {
+                            name: {key: value for key, value in attribute.items() if key in ('DataType', 'StringValue', 'BinaryValue')}
+                            for name, attribute in (message.get('MessageAttributes') or {}).items()
+                            if name not in FAILURE_ATTRIBUTES
+                        }
+                    }
+                    for index, message in enumerate(lane)
+                ]
+            )
+            sent = [lane[int(entry['Id'])] for entry in response.get('Successful', [])]
+            unsent = [lane[int(entry['Id'])] for entry in response.get('Failed', [])]
+            if sent:
+                self.sqs.delete_message_batch(
+                    QueueUrl=self.dlq_url,
+                    Entries=[
+                        {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']}
+                        for index, message in enumerate(sent)
+                    ]
+                )
+            with self._lock:
+                self.counts['redriven'] += len(sent)
+                self.counts['failed'] += len(unsent)
+                self._held.extend(message['ReceiptHandle'] for message in unsent)
+
+    def _release(self):
+        """Make the messages left in the DLQ visible again"""
+        handles = self._held
+        self._held = []
+        for start in range(0, len(handles), SQS_BATCH_LIMIT):
+            self.sqs.change_message_visibility_batch(
+                QueueUrl=self.dlq_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': handle, 'VisibilityTimeout': 0}
+                    for index, handle in enumerate(handles[start:start + SQS_BATCH_LIMIT])
+                ]
+            )
+
+
+def print_progress(summary, out=sys.stderr):
+    action = 'would redrive' if summary['dryRun'] else 'redriven'
+    count = summary['matched'] if summary['dryRun'] else summary['redriven']
+    out.write(
+        f"\r{summary['elapsed']:6.1f}s received {summary['received']}, matched {summary['matched']}, "
+        f"{action} {count}, failed {summary['failed']} ({summary['rate']:.1f} msg/s)"
+    )
+    out.flush()
+
+
+def print_summary(summary, out=sys.stdout):
+    def moment(value):
+        return value.isoformat(timespec='seconds') if value else '-'
+    
+    if summary['dryRun']:
+        print(f"Dry run: {summary['matched']} of {summary['received']} messages would be redriven", file=out)
+    else:
+        print(f"Redriven {summary['redriven']} of {summary['matched']} matching messages "
+              f"({summary['received']} received, {summary['failed']} failed) "
+              f"in {summary['elapsed']:.1f}s, {summary['rate']:.1f} msg/s", file=out)
+    print(f"Enqueued between {moment(summary['oldest'])} and {moment(summary['newest'])}", file=out)
+    print("Error types:", file=out)
+    for kind, count in summary['errorTypes'].items():
+        print(f"  {count:>8}  {kind}", file=out)
+    print("Source queues:", file=out)
+    for source, count in summary['sources'].items():
+        print(f"  {count:>8}  {source}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dlq-url', required=True, help="URL of the dead-letter queue (NotificationQueueDlqUrl output)")
+    parser.add_argument('--target-url', help="Queue to send the messages to (default: the queue each one failed from)")
+    parser.add_argument('--table', default=os.environ.get('NOTIFICATION_TABLE'),
+                        help="Notification table, to read the error of each message from its status")
+    parser.add_argument('--error', help="Only messages whose error type or message matches this regular expression")
+    parser.add_argument('--recipient', help="Only messages to an address matching this pattern, e.g. '*@example.com'")
+    parser.add_argument('--since', type=parse_time, help="Only messages enqueued at or after this ISO 8601 time")
+    parser.add_argument('--until', type=parse_time, help="Only messages enqueued before this ISO 8601 time")
+    parser.add_argument('--rate', type=float, default=10.0, help="Messages redriven per second at most (0: no limit)")
+    parser.add_argument('--workers', type=int, default=8, help="Parallel receivers")
+    parser.add_argument('--wait-time', type=int, default=20, help="Long polling wait of each receive, in seconds")
+    parser.add_argument('--empty-receives', type=int, default=2, help="Empty receives after which a worker stops")
+    parser.add_argument('--visibility-timeout', type=int, default=900,
+                        help="Seconds received messages stay hidden; longer than the whole drain")
+    parser.add_argument('--max-messages', type=int, help="Stop after receiving this many messages")
+    parser.add_argument('--dry-run', action='store_true', help="Only summarize; nothing is sent or deleted")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    args = parser.parse_args()
+    if args.error and not args.table:
+        print("Warning: without --table only messages with a FailureReason attribute have an error type",
+              file=sys.stderr)
+    
+    import boto3
+    
+    redriver = Redriver(
+        boto3.client('sqs'),
+        args.dlq_url,
+        target_url=args.target_url,
+        dynamodb=boto3.client('dynamodb') if args.table else None,
+        table_name=args.table,
+        s3=boto3.client('s3') if args.recipient else None,
+        error=args.error,
+        recipient=args.recipient,
+        since=args.since,
+        until=args.until,
+        rate=args.rate,
+        dry_run=args.dry_run,
+        workers=args.workers,
+        wait_time=args.wait_time,
+        empty_receives=args.empty_receives,
+        visibility_timeout=args.visibility_timeout,
+        max_messages=args.max_messages
+    )
+    interactive = sys.stderr.isatty()
+    summary = redriver.run(progress=print_progress if interactive else None)
+    if interactive:
+        print(file=sys.stderr)
+    if args.json:
+        print(json.dumps(summary, default=str, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()